@@ -2,14 +2,21 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from arthasutra.db.session import create_db_and_tables
 from arthasutra.api.routers.portfolios import router as portfolios_router
 from arthasutra.api.routers.data import router as data_router
+from arthasutra.api.routers.backtests import router as backtests_router
+from arthasutra.api.routers.alerts import router as alerts_router
+from arthasutra.api.routers.admin import router as admin_router
 from arthasutra.db.session import session_scope
-from arthasutra.db.models import Security, Holding
-from arthasutra.services.marketdata.yfinance_client import fetch_ltp_batch
-from arthasutra.services.live import upsert_ltp
+from arthasutra.services.alerts import alert_engine
+from arthasutra.services.live_poller import poller_from_env
+from arthasutra.services.metrics import METRICS_ENABLED, MetricsMiddleware, registry
+from arthasutra.services.overlay import overlay_engine
+from arthasutra.services.profiler import ProfileMiddleware
+from arthasutra.services.quote_store import quote_store
 from arthasutra.services.kite_client import maybe_start_kite_ws
 from arthasutra.version import __version__
 
@@ -25,6 +32,29 @@ def _get_cors_origins() -> list[str]:
 async def lifespan(app: FastAPI):
     # Startup
     create_db_and_tables()
+    # Live quotes are served from memory and persisted write-behind
+    try:
+        with session_scope() as s:
+            quote_store.warm(s)
+        quote_store.start(session_scope)
+    except Exception:
+        pass
+    # Overlay triggers run on every accepted quote, in memory; checkpoints are periodic
+    try:
+        with session_scope() as s:
+            overlay_engine.reload(s)
+        quote_store.add_listener(overlay_engine.on_quotes)
+        overlay_engine.start(session_scope)
+    except Exception:
+        pass
+    # Price alerts: sorted level indexes checked per tick; fired rows are written behind
+    try:
+        with session_scope() as s:
+            alert_engine.reload(s)
+        quote_store.add_listener(alert_engine.on_quotes)
+        alert_engine.start(session_scope)
+    except Exception:
+        pass
     # Start background polling for live quotes using yfinance (optional)
     import os
     provider = os.getenv("LIVE_PROVIDER", "yf").lower()
@@ -39,42 +69,36 @@ async def lifespan(app: FastAPI):
     elif provider == "yf":
         try:
             from apscheduler.schedulers.background import BackgroundScheduler
-            from sqlalchemy import text
 
             scheduler = BackgroundScheduler(daemon=True)
-
-            def poll_live_quotes():
-                with session_scope() as s:
-                    # unique (symbol, exchange) from current holdings
-                    rows = s.exec(text(
-                        """
-                        SELECT DISTINCT se.symbol, se.exchange, se.id
-                        FROM holding h
-                        JOIN security se ON se.id = h.security_id
-                        """
-                    )).fetchall()
-                    pairs = [(r[0], r[1]) for r in rows]
-                    mapping = fetch_ltp_batch(s, pairs)
-                    # upsert
-                    for (sym, ex), ltp in mapping.items():
-                        se = s.exec(text("SELECT id FROM security WHERE symbol = :sym AND exchange = :ex"), {"sym": sym, "ex": ex}).first()
-                        if se:
-                            upsert_ltp(s, se[0], ltp, source="yf")
+            # Polls held tickers during market hours only, plus one post-close pass
+            poller = poller_from_env(session_scope)
+            app.state.live_poller = poller
 
             interval = int(os.getenv("LIVE_POLL_SECONDS", "60"))
-            scheduler.add_job(poll_live_quotes, "interval", seconds=interval, id="yf_live_poll", replace_existing=True)
+            scheduler.add_job(poller.tick, "interval", seconds=interval, id="yf_live_poll", replace_existing=True)
             scheduler.start()
             app.state._scheduler = scheduler
         except Exception:
             pass
     yield
     # Shutdown
+    mgr = getattr(app.state, "kite_mgr", None)
+    if mgr:
+        # Stops the socket and flushes any buffered ticks
+        mgr.stop()
     sched = getattr(app.state, "_scheduler", None)
     if sched:
         try:
             sched.shutdown(wait=False)
         except Exception:
             pass
+    # Final flush of quotes, overlay checkpoints and fired alerts not yet persisted
+    quote_store.remove_listener(overlay_engine.on_quotes)
+    quote_store.remove_listener(alert_engine.on_quotes)
+    overlay_engine.stop()
+    alert_engine.stop()
+    quote_store.stop()
 
 
 app = FastAPI(title="ArthaSutra API", version="0.1.0", lifespan=lifespan)
@@ -86,6 +110,17 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+# Opt-in: PROFILE_ENABLED plus an X-Profile header or ?profile=1 on the request
+app.add_middleware(ProfileMiddleware)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> PlainTextResponse:
+    """Prometheus text exposition: per-route latency and SQL, background jobs."""
+    if not METRICS_ENABLED:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/healthz")
@@ -95,6 +130,9 @@ def healthz() -> dict:
 
 app.include_router(portfolios_router, prefix="/portfolios", tags=["portfolios"])
 app.include_router(data_router, prefix="/data", tags=["data"])
+app.include_router(backtests_router, prefix="/backtests", tags=["backtests"])
+app.include_router(alerts_router, prefix="/alerts", tags=["alerts"])
+app.include_router(admin_router, prefix="/admin", tags=["admin"])
 
 
 @app.get("/version")
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from arthasutra.services.profiler import profiler
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Profiling disabled")
+    if profiler.admin_token is None:
+        raise HTTPException(status_code=403, detail="ADMIN_TOKEN is not configured")
+    if not profiler.authorized(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiles")
+def list_profiles() -> list[dict]:
+    """Stored request profiles, newest first."""
+    return profiler.list()
+
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str) -> dict:
+    """Timings, top SQL statements and hottest frames of one profile."""
+    data = profiler.load(profile_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return data
+
+
+@router.get("/profiles/{profile_id}/folded", response_class=PlainTextResponse)
+def get_profile_folded(profile_id: str) -> PlainTextResponse:
+    """Collapsed stacks (``frame;frame;... count``) for flamegraph.pl or speedscope."""
+    text = profiler.folded(profile_id)
+    if text is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(text)
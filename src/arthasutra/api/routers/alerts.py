@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlmodel import Session, select
+
+from arthasutra.db.models import PriceAlert, Security
+from arthasutra.db.session import get_read_session, get_session
+from arthasutra.services.alerts import ALERT_STREAM_POLL, alert_engine, build_alerts, stream_events
+from arthasutra.services.live import parse_symbol
+
+
+router = APIRouter()
+
+
+class AlertCreate(BaseModel):
+    symbol: Optional[str] = None  # EXCHANGE:SYMBOL; or pass security_id
+    security_id: Optional[int] = None
+    portfolio_id: Optional[int] = None
+    rule: str = "price_move"
+    level: Optional[float] = None
+    pct: Optional[float] = None
+    direction: Optional[str] = None
+    mult: float = 2.0
+    note: Optional[str] = None
+
+
+@router.post("", response_model=list[PriceAlert])
+def create_alert(payload: AlertCreate, session: Session = Depends(get_session)) -> list[PriceAlert]:
+    if payload.security_id is not None:
+        sec = session.get(Security, payload.security_id)
+    elif payload.symbol:
+        ex, sym = parse_symbol(payload.symbol)
+        sec = session.exec(select(Security).where(Security.symbol == sym, Security.exchange == ex)).first()
+    else:
+        raise HTTPException(status_code=400, detail="symbol or security_id is required")
+    if sec is None:
+        raise HTTPException(status_code=404, detail="Security not found")
+    try:
+        alerts = build_alerts(
+            session, sec.id, rule=payload.rule, level=payload.level, pct=payload.pct,
+            direction=payload.direction, mult=payload.mult, portfolio_id=payload.portfolio_id, note=payload.note,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    session.add_all(alerts)
+    session.commit()
+    for a in alerts:
+        session.refresh(a)
+    alert_engine.add(alerts, {sec.id: alerts[0].ref_price} if alerts[0].ref_price is not None else None)
+    return alerts
+
+
+@router.get("", response_model=list[PriceAlert])
+def list_alerts(
+    status: Optional[str] = Query("active", description="active | fired | cancelled; empty for all"),
+    security_id: Optional[int] = None,
+    portfolio_id: Optional[int] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    session: Session = Depends(get_read_session),
+) -> list[PriceAlert]:
+    stmt = select(PriceAlert)
+    if status:
+        stmt = stmt.where(PriceAlert.status == status)
+    if security_id is not None:
+        stmt = stmt.where(PriceAlert.security_id == security_id)
+    if portfolio_id is not None:
+        stmt = stmt.where(PriceAlert.portfolio_id == portfolio_id)
+    return list(session.exec(stmt.order_by(PriceAlert.id.desc()).limit(limit)).all())
+
+
+@router.get("/events")
+def list_alert_events(
+    after_seq: int = Query(0, ge=0, description="Only events with a larger sequence number"),
+    portfolio_id: Optional[int] = None,
+    security_id: Optional[int] = None,
+) -> dict:
+    """Recently fired alerts, served from memory (bounded by ``ALERT_EVENT_BUFFER``)."""
+    return {
+        "seq": alert_engine.seq,
+        "events": [e.to_dict() for e in alert_engine.events(after_seq, portfolio_id, security_id)],
+    }
+
+
+@router.get("/stream")
+async def stream_alerts_sse(after_seq: Optional[int] = Query(None, ge=0)) -> StreamingResponse:
+    """Server-sent ``alert`` events as alerts fire; ``after_seq`` replays buffered ones first."""
+    start = alert_engine.seq if after_seq is None else after_seq
+
+    async def events():
+        async for ev in stream_events(alert_engine, start, ALERT_STREAM_POLL):
+            yield f"event: alert\nid: {ev.seq}\ndata: {json.dumps(ev.to_dict())}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.websocket("/ws")
+async def stream_alerts_ws(websocket: WebSocket, after_seq: Optional[int] = None) -> None:
+    """WebSocket variant of the alert stream; one JSON frame per fired alert."""
+    await websocket.accept()
+    start = alert_engine.seq if after_seq is None else after_seq
+    try:
+        async for ev in stream_events(alert_engine, start, ALERT_STREAM_POLL):
+            await websocket.send_json(ev.to_dict())
+    except WebSocketDisconnect:
+        pass
+
+
+@router.delete("/{alert_id}", response_model=PriceAlert)
+def cancel_alert(alert_id: int, session: Session = Depends(get_session)) -> PriceAlert:
+    alert = session.get(PriceAlert, alert_id)
+    if alert is None:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    if alert.status == "active":
+        alert_engine.remove(alert_id)
+        alert.status = "cancelled"
+        session.add(alert)
+        session.commit()
+        session.refresh(alert)
+    return alert
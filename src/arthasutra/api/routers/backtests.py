@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import datetime as dt
+from typing import Any, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlmodel import Session, select
+
+from arthasutra.db.models import Holding, Portfolio, Security
+from arthasutra.db.session import get_read_session
+from arthasutra.services.backfill import resolve_universe
+from arthasutra.services.backtest import BacktestParams, load_price_matrix, run_backtest, run_sweep
+
+
+router = APIRouter()
+
+
+class BacktestRequest(BaseModel):
+    start: dt.date
+    end: dt.date
+    portfolio_id: Optional[int] = None  # securities held in this portfolio; else `universe`
+    universe: str = "holdings"  # holdings | all
+    params: dict[str, Any] = {}
+    max_trades: int = 1000
+
+
+class SweepRequest(BacktestRequest):
+    grid: dict[str, list[Any]]
+    max_workers: Optional[int] = None
+
+
+def _params(raw: dict[str, Any]) -> BacktestParams:
+    try:
+        return BacktestParams(**raw)
+    except TypeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _universe(session: Session, req: BacktestRequest) -> list[Security]:
+    if req.portfolio_id is not None:
+        if not session.get(Portfolio, req.portfolio_id):
+            raise HTTPException(status_code=404, detail="Portfolio not found")
+        held = select(Holding.security_id).where(Holding.portfolio_id == req.portfolio_id)
+        return list(session.exec(select(Security).where(Security.id.in_(held)).order_by(Security.id)).all())
+    if req.universe not in ("holdings", "all"):
+        raise HTTPException(status_code=400, detail="universe must be holdings or all")
+    return resolve_universe(session, req.universe)
+
+
+@router.post("/run")
+def run(req: BacktestRequest, session: Session = Depends(get_read_session)) -> dict:
+    params = _params(req.params)
+    matrix = load_price_matrix(session, _universe(session, req), req.start, req.end, warmup_bars=params.sma_slow)
+    return run_backtest(matrix, params, start=req.start).to_dict(max_trades=req.max_trades)
+
+
+@router.post("/sweep")
+def sweep(req: SweepRequest, session: Session = Depends(get_read_session)) -> dict:
+    base = _params(req.params)
+    slow = max([base.sma_slow, *req.grid.get("sma_slow", [])])
+    matrix = load_price_matrix(session, _universe(session, req), req.start, req.end, warmup_bars=int(slow))
+    try:
+        results = run_sweep(matrix, req.grid, base=base, start=req.start, max_workers=req.max_workers)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"points": len(results), "results": results}
@@ -1,15 +1,25 @@
 from __future__ import annotations
 
-import csv
-from datetime import datetime
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, Query, Request
+from pydantic import BaseModel
 from sqlmodel import Session, select
 
-from arthasutra.db.models import Security, PriceEOD, QuoteLive, Holding
-from arthasutra.db.session import get_session
-from arthasutra.services.marketdata.yfinance_client import fetch_eod_to_db
+from arthasutra.db.models import Security, Holding
+from arthasutra.db.async_session import run_read
+from arthasutra.db.session import get_session, session_scope
+from arthasutra.services.backfill import (
+    YFinanceProvider,
+    get_job as get_backfill_job,
+    plan_backfill,
+    run_backfill,
+    start_backfill_job,
+)
+from arthasutra.services.eod_csv_import import import_eod_csv
+from arthasutra.services.live import lookup_quotes, parse_symbol, split_symbols
+from arthasutra.services.quote_store import quote_store
+from arthasutra.services.overlay import overlay_engine
 from arthasutra.services.kite_client import (
     maybe_start_kite_ws,
     bulk_map_tokens,
@@ -22,73 +32,116 @@ router = APIRouter()
 
 
 @router.post("/prices-eod/import-csv")
-def import_prices_eod(file: UploadFile, session: Session = Depends(get_session)) -> dict:
-    content = file.file.read()
-    text = content.decode("utf-8")
-    reader = csv.DictReader(text.splitlines())
-    count = 0
-    for row in reader:
-        symbol = (row.get("symbol") or row.get("Symbol") or "").strip()
-        exchange = (row.get("exchange") or row.get("Exchange") or "NSE").strip()
-        date_s = (row.get("date") or row.get("Date") or "").strip()
-        if not symbol or not date_s:
-            continue
-        sec = session.exec(select(Security).where(Security.symbol == symbol, Security.exchange == exchange)).first()
-        if not sec:
-            sec = Security(symbol=symbol, exchange=exchange, name=symbol)
-            session.add(sec)
-            session.flush()
-        dt = datetime.fromisoformat(date_s)
-        o = float(row.get("open") or row.get("Open") or 0)
-        h = float(row.get("high") or row.get("High") or 0)
-        l = float(row.get("low") or row.get("Low") or 0)
-        c = float(row.get("close") or row.get("Close") or 0)
-        v = row.get("volume") or row.get("Volume")
-        pe = PriceEOD(security_id=sec.id, date=dt.date(), open=o, high=h, low=l, close=c, volume=float(v) if v else None)
-        session.add(pe)
-        count += 1
-    session.commit()
-    return {"status": "ok", "rows": count}
+def import_prices_eod(
+    file: UploadFile,
+    force: bool = Query(False, description="Re-import even if this exact file was ingested before"),
+    on_conflict: str = Query("update", pattern="^(update|nothing)$", description="update | nothing"),
+    session: Session = Depends(get_session),
+) -> dict:
+    # Streams the upload (plain or gzipped); re-importing overwrites bars instead of duplicating them
+    report = import_eod_csv(session, file.file, filename=file.filename, on_conflict=on_conflict, force=force)
+    return report.to_dict()
+
+
+def _eod_provider(request: Request):
+    # Tests and offline runs can plug a stub provider in via app.state.eod_provider
+    return getattr(request.app.state, "eod_provider", None) or YFinanceProvider()
 
 
 @router.post("/prices-eod/yf")
 def import_prices_yfinance(
+    request: Request,
     symbols: str = Query(..., description="Comma-separated list, e.g., NSE:HDFCBANK,BSE:BSE"),
     start: str = Query(..., description="YYYY-MM-DD"),
     end: str = Query(..., description="YYYY-MM-DD"),
+    max_workers: int = Query(4, ge=1, le=16),
     session: Session = Depends(get_session),
 ) -> dict:
     from datetime import date
 
     start_d = date.fromisoformat(start)
     end_d = date.fromisoformat(end)
-    total = 0
-    for token in symbols.split(","):
-        token = token.strip()
-        if ":" in token:
-            ex, sym = token.split(":", 1)
-        else:
-            ex, sym = "NSE", token
-        total += fetch_eod_to_db(session, sym, ex, start_d, end_d)
-    return {"status": "ok", "rows": total}
+    secs: list[Security] = []
+    for token in split_symbols(symbols):
+        ex, sym = parse_symbol(token)
+        sec = session.exec(select(Security).where(Security.symbol == sym, Security.exchange == ex)).first()
+        if not sec:
+            sec = Security(symbol=sym, exchange=ex, name=sym)
+            session.add(sec)
+            session.flush()
+        secs.append(sec)
+    session.commit()
+    # Only the ranges before each symbol's first and after its last stored bar are downloaded
+    tasks, results = plan_backfill(session, secs, start_d, end_d, fill_head=True)
+    results += run_backfill(session, tasks, provider=_eod_provider(request), max_workers=max_workers)
+    return {"status": "ok", "rows": sum(r.rows for r in results), "results": [r.to_dict() for r in results]}
+
+
+@router.post("/prices-eod/backfill")
+def backfill_prices_eod(
+    request: Request,
+    universe: str = Query("holdings", pattern="^(holdings|all)$", description="holdings | all"),
+    start: Optional[str] = Query(None, description="YYYY-MM-DD; default 5 years ago"),
+    end: Optional[str] = Query(None, description="YYYY-MM-DD (exclusive); default tomorrow"),
+    max_workers: int = Query(4, ge=1, le=16),
+    rate_per_sec: float = Query(2.0, gt=0),
+) -> dict:
+    from datetime import date, timedelta
+
+    start_d = date.fromisoformat(start) if start else date.today() - timedelta(days=5 * 365)
+    end_d = date.fromisoformat(end) if end else date.today() + timedelta(days=1)
+    job = start_backfill_job(
+        session_scope,
+        start_d,
+        end_d,
+        universe=universe,
+        provider=_eod_provider(request),
+        # An explicit start also fills history older than what is stored
+        fill_head=start is not None,
+        max_workers=max_workers,
+        rate_per_sec=rate_per_sec,
+    )
+    return job.to_dict()
+
+
+@router.get("/prices-eod/backfill/{job_id}")
+def backfill_status(job_id: str) -> dict:
+    job = get_backfill_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Backfill job not found")
+    return job.to_dict()
 
 
 @router.get("/quotes")
-def get_quotes(symbols: str = Query(..., description="Comma-separated list, e.g., NSE:HDFCBANK,BSE:BSE"), session: Session = Depends(get_session)) -> dict:
-    out = {}
-    for token in symbols.split(","):
-        token = token.strip()
-        if ":" in token:
-            ex, sym = token.split(":", 1)
-        else:
-            ex, sym = "NSE", token
-        sec = session.exec(select(Security).where(Security.symbol == sym, Security.exchange == ex)).first()
-        if not sec:
-            out[token] = None
-            continue
-        q = session.exec(select(QuoteLive).where(QuoteLive.security_id == sec.id)).first()
-        out[token] = {"ltp": q.ltp, "ts": q.ts.isoformat()} if q else None
-    return {"quotes": out}
+async def get_quotes(
+    symbols: str = Query(..., description="Comma-separated list, e.g., NSE:HDFCBANK,BSE:BSE"),
+    include_prev: bool = Query(False, description="Add prev_close, change and pct_change"),
+) -> dict:
+    return {"quotes": await run_read(lookup_quotes, split_symbols(symbols), include_prev=include_prev)}
+
+
+class QuotesRequest(BaseModel):
+    symbols: list[str]
+    include_prev: bool = False
+
+
+@router.post("/quotes")
+async def post_quotes(payload: QuotesRequest) -> dict:
+    """Same as GET /quotes for watchlists too long for a query string."""
+    return {"quotes": await run_read(lookup_quotes, payload.symbols, include_prev=payload.include_prev)}
+
+
+@router.get("/live/status")
+def live_status(request: Request) -> dict:
+    import os
+
+    poller = getattr(request.app.state, "live_poller", None)
+    return {
+        "provider": os.getenv("LIVE_PROVIDER", "yf").lower(),
+        "poller": poller.stats() if poller else None,
+        "quote_store": quote_store.stats(),
+        "overlay": overlay_engine.stats(),
+    }
 
 
 @router.post("/kite/tokens")
@@ -96,10 +149,7 @@ def set_kite_tokens(payload: dict[str, int], request: Request, session: Session
     # payload: { "NSE:HDFCBANK": 12345, ... }
     updated = 0
     for key, token in payload.items():
-        if ":" in key:
-            ex, sym = key.split(":", 1)
-        else:
-            ex, sym = "NSE", key
+        ex, sym = parse_symbol(key)
         sec = session.exec(select(Security).where(Security.symbol == sym, Security.exchange == ex)).first()
         if sec:
             sec.kite_token = int(token)
@@ -1,23 +1,35 @@
 from __future__ import annotations
 
+import json
 from typing import Any, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy import delete
 from sqlmodel import Session, select
 
 from arthasutra.db.models import (
     Portfolio,
-    Security,
     Holding,
     Lot,
-    PriceEOD,
     ConfigText,
+    OverlayCheckpoint,
+    PriceAlert,
 )
-from arthasutra.db.session import get_session
-from arthasutra.services.analytics import portfolio_equity_and_pnl, compute_position_stats
-from arthasutra.services.decision_engine import propose_actions
+from arthasutra.db.async_session import run_read
+from arthasutra.db.session import get_read_session, get_session
+from arthasutra.services.alerts import alert_engine
+from arthasutra.services.analytics import PositionStats, value_context
+from arthasutra.services.decision_engine import context_actions
+from arthasutra.services.indicator_state import IncrementalIndicators, fold_histories, read_indicator_states
+from arthasutra.services.overlay import overlay_engine
+from arthasutra.services.price_cache import PriceHistory
+from arthasutra.services.valuation import ValuationContext, load_valuation_context
 from arthasutra.services.csv_importer import parse_positions_csv
+from arthasutra.services.positions_import import import_positions
+from arthasutra.services.portfolio_stream import STREAM_MIN_INTERVAL, stream_hub
 
 
 router = APIRouter()
@@ -41,6 +53,20 @@ class PositionItem(BaseModel):
     price_source: str | None = None
 
 
+def _position_item(stats: PositionStats) -> PositionItem:
+    return PositionItem(
+        symbol=stats.symbol,
+        exchange=stats.exchange,
+        qty=stats.qty,
+        avg_price=stats.avg_price,
+        last_price=stats.last_price,
+        prev_close=stats.prev_close,
+        pct_today=stats.pct_today,
+        pnl_inr=stats.pnl_inr,
+        price_source=stats.price_source,
+    )
+
+
 class DashboardResponse(BaseModel):
     portfolio_id: int
     portfolio_name: str
@@ -50,13 +76,17 @@ class DashboardResponse(BaseModel):
     actions: list[dict[str, Any]]
 
 
+def _list_portfolios(session: Session) -> list[Portfolio]:
+    return list(session.exec(select(Portfolio).order_by(Portfolio.id.asc())).all())
+
+
 @router.get("", response_model=list[Portfolio])
-def list_portfolios(session: Session = Depends(get_session)) -> list[Portfolio]:
-    return session.exec(select(Portfolio).order_by(Portfolio.id.asc())).all()
+async def list_portfolios() -> list[Portfolio]:
+    return await run_read(_list_portfolios)
 
 
 @router.get("/{portfolio_id}", response_model=Portfolio)
-def get_portfolio(portfolio_id: int, session: Session = Depends(get_session)) -> Portfolio:
+def get_portfolio(portfolio_id: int, session: Session = Depends(get_read_session)) -> Portfolio:
     pf = session.get(Portfolio, portfolio_id)
     if not pf:
         raise HTTPException(status_code=404, detail="Portfolio not found")
@@ -76,6 +106,7 @@ def create_portfolio(payload: PortfolioCreate, session: Session = Depends(get_se
 def import_csv(
     portfolio_id: int,
     file: UploadFile,
+    prune: bool = Query(False, description="Remove holdings that are not in the file"),
     session: Session = Depends(get_session),
 ) -> dict:
     portfolio = session.get(Portfolio, portfolio_id)
@@ -83,120 +114,127 @@ def import_csv(
         raise HTTPException(status_code=404, detail="Portfolio not found")
 
     rows = parse_positions_csv(file.file)
-    # Upsert securities and set holdings to CSV snapshot; create a lot per row
-    from datetime import date as _date
-    today = _date.today()
-    for r in rows:
-        symbol = r.symbol
-        exchange = r.exchange
-        qty = float(r.qty)
-        avg_price = float(r.avg_price)
-        sector = r.sector
-
-        sec = session.exec(
-            select(Security).where(Security.symbol == symbol, Security.exchange == exchange)
-        ).first()
-        if not sec:
-            sec = Security(symbol=symbol, exchange=exchange, name=r.name or symbol, sector=sector)
-            session.add(sec)
-            session.flush()
-        else:
-            # Update security details if provided
-            if r.name and not sec.name:
-                sec.name = r.name
-            if sector and not sec.sector:
-                sec.sector = sector
-
-        holding = session.exec(
-            select(Holding).where(Holding.portfolio_id == portfolio_id, Holding.security_id == sec.id)
-        ).first()
-        if not holding:
-            holding = Holding(portfolio_id=portfolio_id, security_id=sec.id, qty_total=qty, avg_price=avg_price)
-            session.add(holding)
-            session.flush()
-        else:
-            # Snapshot import: overwrite with provided quantities and avg price
-            holding.qty_total = qty
-            holding.avg_price = avg_price
-
-        lot = Lot(holding_id=holding.id, qty=qty, price=avg_price, account="main", tax_status="unknown")
-        session.add(lot)
-
-        # If LTP is present, seed a PriceEOD for today if missing to enable immediate KPIs
-        if r.ltp is not None:
-            exists = session.exec(
-                select(PriceEOD).where(PriceEOD.security_id == sec.id, PriceEOD.date == today)
-            ).first()
-            if not exists:
-                pe = PriceEOD(security_id=sec.id, date=today, open=r.ltp, high=r.ltp, low=r.ltp, close=r.ltp)
-                session.add(pe)
-
+    # Snapshot import: holdings are set to the file's quantities, diffed in bulk
+    result = import_positions(session, portfolio_id, rows, prune=prune)
     session.commit()
-    return {"status": "ok", "rows": len(rows)}
+    # Overlay states carry each holding's units and anchor
+    overlay_engine.reload_portfolio(session, portfolio_id)
+    return {"status": "ok", **result.to_dict()}
 
 
-@router.get("/{portfolio_id}/dashboard", response_model=DashboardResponse)
-def get_dashboard(portfolio_id: int, session: Session = Depends(get_session)) -> DashboardResponse:
+def _load_dashboard(
+    session: Session, portfolio_id: int
+) -> tuple[Portfolio, ValuationContext, dict[int, IncrementalIndicators], dict[int, PriceHistory]]:
     portfolio = session.get(Portfolio, portfolio_id)
     if not portfolio:
         raise HTTPException(status_code=404, detail="Portfolio not found")
 
-    holdings = session.exec(select(Holding).where(Holding.portfolio_id == portfolio_id)).all()
-    positions: list[PositionItem] = []
-    total_equity, total_pnl = portfolio_equity_and_pnl(session, portfolio_id)
-    for h in holdings:
-        stats = compute_position_stats(session, h)
-        if not stats:
-            continue
-        positions.append(
-            PositionItem(
-                symbol=stats.symbol,
-                exchange=stats.exchange,
-                qty=stats.qty,
-                avg_price=stats.avg_price,
-                last_price=stats.last_price,
-                prev_close=stats.prev_close,
-                pct_today=stats.pct_today,
-                pnl_inr=stats.pnl_inr,
-                price_source=stats.price_source,
-            )
-        )
+    # Load holdings, last/prev closes and quotes once; valuation and actions both read from it
+    ctx = load_valuation_context(session, portfolio_id)
+    states, pending = read_indicator_states(session, [sec.id for _, sec in ctx.holdings])
+    return portfolio, ctx, states, pending
+
+
+def _build_dashboard(
+    portfolio: Portfolio,
+    ctx: ValuationContext,
+    states: dict[int, IncrementalIndicators],
+    pending: dict[int, PriceHistory],
+) -> DashboardResponse:
+    valuation = value_context(ctx)
+    positions = [_position_item(stats) for stats in valuation.positions]
+    actions = context_actions(ctx, {**states, **fold_histories(pending)})
 
     return DashboardResponse(
         portfolio_id=portfolio.id,
         portfolio_name=portfolio.name,
-        equity_value=total_equity,
-        pnl_inr=total_pnl,
+        equity_value=valuation.equity_value,
+        pnl_inr=valuation.pnl_inr,
         positions=positions,
-        actions=propose_actions(session, portfolio_id),
+        actions=actions,
     )
 
 
-@router.get("/{portfolio_id}/positions", response_model=list[PositionItem])
-def list_positions(portfolio_id: int, session: Session = Depends(get_session)) -> list[PositionItem]:
+@router.get("/{portfolio_id}/dashboard", response_model=DashboardResponse)
+async def get_dashboard(portfolio_id: int) -> DashboardResponse:
+    # Hot read path: the queries are awaited instead of holding a threadpool worker;
+    # valuation, rules and any indicator folding run in the threadpool, off the event loop
+    loaded = await run_read(_load_dashboard, portfolio_id)
+    return await anyio.to_thread.run_sync(_build_dashboard, *loaded)
+
+
+@router.get("/{portfolio_id}/overlay")
+def get_overlay(
+    portfolio_id: int,
+    after_seq: int = Query(0, ge=0, description="Only events with a larger sequence number"),
+    session: Session = Depends(get_read_session),
+) -> dict:
+    """Live overlay state per holding plus recent trigger events, served from memory."""
+    if not session.get(Portfolio, portfolio_id):
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+    return {
+        "portfolio_id": portfolio_id,
+        "seq": overlay_engine.seq,
+        "states": overlay_engine.states(portfolio_id),
+        "events": [e.to_dict() for e in overlay_engine.events(portfolio_id, after_seq)],
+    }
+
+
+def _load_positions(session: Session, portfolio_id: int) -> ValuationContext:
     portfolio = session.get(Portfolio, portfolio_id)
     if not portfolio:
         raise HTTPException(status_code=404, detail="Portfolio not found")
-    items: list[PositionItem] = []
-    holdings = session.exec(select(Holding).where(Holding.portfolio_id == portfolio_id)).all()
-    for h in holdings:
-        stats = compute_position_stats(session, h)
-        if not stats:
-            continue
-        items.append(
-            PositionItem(
-                symbol=stats.symbol,
-                exchange=stats.exchange,
-                qty=stats.qty,
-                avg_price=stats.avg_price,
-                last_price=stats.last_price,
-                prev_close=stats.prev_close,
-                pct_today=stats.pct_today,
-                pnl_inr=stats.pnl_inr,
-                price_source=stats.price_source,
-            )
-        )
-    return items
+    return load_valuation_context(session, portfolio_id)
+
+
+def _position_items(ctx: ValuationContext) -> list[PositionItem]:
+    return [_position_item(stats) for stats in value_context(ctx).positions]
+
+
+@router.get("/{portfolio_id}/positions", response_model=list[PositionItem])
+async def list_positions(portfolio_id: int) -> list[PositionItem]:
+    ctx = await run_read(_load_positions, portfolio_id)
+    return await anyio.to_thread.run_sync(_position_items, ctx)
+
+
+def _portfolio_exists(session: Session, portfolio_id: int) -> bool:
+    return session.get(Portfolio, portfolio_id) is not None
+
+
+def _stream_interval(min_interval_ms: Optional[int]) -> float:
+    # Clients may ask for slower updates, never faster than the server minimum
+    if min_interval_ms is None:
+        return STREAM_MIN_INTERVAL
+    return max(min_interval_ms / 1000.0, STREAM_MIN_INTERVAL)
+
+
+@router.get("/{portfolio_id}/stream")
+async def stream_dashboard_sse(
+    portfolio_id: int, min_interval_ms: Optional[int] = Query(None, ge=0)
+) -> StreamingResponse:
+    """Server-sent events: a ``snapshot`` event, then coalesced ``delta`` events."""
+    if not await run_read(_portfolio_exists, portfolio_id):
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+
+    async def events():
+        async for msg in stream_hub.stream(portfolio_id, _stream_interval(min_interval_ms)):
+            yield f"event: {msg['type']}\ndata: {json.dumps(msg)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.websocket("/{portfolio_id}/stream")
+async def stream_dashboard_ws(websocket: WebSocket, portfolio_id: int, min_interval_ms: Optional[int] = None) -> None:
+    """WebSocket variant of the dashboard stream; same messages as JSON frames."""
+    if not await run_read(_portfolio_exists, portfolio_id):
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+    try:
+        async for msg in stream_hub.stream(portfolio_id, _stream_interval(min_interval_ms)):
+            await websocket.send_json(msg)
+    except WebSocketDisconnect:
+        pass
 
 
 @router.delete("/{portfolio_id}")
@@ -215,6 +253,12 @@ def delete_portfolio(portfolio_id: int, session: Session = Depends(get_session))
     cfgs = session.exec(select(ConfigText).where(ConfigText.portfolio_id == portfolio_id)).all()
     for c in cfgs:
         session.delete(c)
+    # Overlay: drop the in-memory states first so no pending checkpoint is written back
+    overlay_engine.forget(portfolio_id)
+    session.execute(delete(OverlayCheckpoint).where(OverlayCheckpoint.portfolio_id == portfolio_id))
+    # Alerts: unindex them so they stop firing, then delete the rows
+    alert_engine.forget(portfolio_id)
+    session.execute(delete(PriceAlert).where(PriceAlert.portfolio_id == portfolio_id))
     session.delete(pf)
     session.commit()
     return {"status": "deleted", "id": portfolio_id}
@@ -0,0 +1,341 @@
+"""Benchmark suite for the API and service hot paths.
+
+Seeds a synthetic dataset (:mod:`arthasutra.services.synthetic`) at a configurable
+scale (portfolios x holdings x years of daily bars), then times each scenario and
+counts the SQL statements it issues. A run is a JSON report; saved as a baseline, later runs at the same scale are compared
+against it and fail when p95 latency or statements per call regress past the
+configured thresholds (the statement count is what catches an N+1).
+
+The database is whatever ``arthasutra.db.session`` is bound to, so set
+``DATABASE_URL`` (``arthasutra bench`` defaults to a temporary SQLite file) before
+importing this module.
+"""
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import io
+import json
+import platform
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from arthasutra.api.main import app
+from arthasutra.db.models import Portfolio, Security
+from arthasutra.db.async_session import async_engine, async_read_engine
+from arthasutra.db.session import create_db_and_tables, engine, read_engine, session_scope
+from arthasutra.services.decision_engine import propose_actions
+from arthasutra.services.eod_csv_import import import_eod_csv
+from arthasutra.services.quote_store import quote_store
+from arthasutra.services.synthetic import SeedSpec, seed_database
+
+
+TOKEN_BASE = 500_000
+
+
+@dataclass(frozen=True)
+class BenchScale:
+    portfolios: int = 2
+    holdings: int = 50
+    years: int = 2
+    repeat: int = 20
+    seed: int = 7
+
+    @property
+    def securities(self) -> int:
+        # Portfolios overlap: the universe is twice one portfolio's size
+        return max(self.holdings * 2, 1)
+
+    def key(self) -> str:
+        return f"{self.portfolios}x{self.holdings}x{self.years}y"
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    calls: int
+    p50_ms: float
+    p95_ms: float
+    mean_ms: float
+    max_ms: float
+    queries: int  # most statements issued by one call
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class BenchContext:
+    scale: BenchScale
+    client: TestClient
+    portfolio_ids: list[int]
+    security_ids: list[int]
+    symbols: list[str]
+    end: dt.date
+
+
+# -- fixture -----------------------------------------------------------------
+def build_fixture(scale: BenchScale, client: TestClient) -> BenchContext:
+    """Seed a synthetic dataset (bulk inserts, snapshots and indicator state included)."""
+    create_db_and_tables()
+    end = dt.date(2024, 12, 31)
+    spec = SeedSpec(
+        securities=scale.securities, years=scale.years, portfolios=scale.portfolios, holdings=scale.holdings,
+        seed=scale.seed, end=end, prefix=f"B{scale.seed}S", kite_token_base=TOKEN_BASE,
+    )
+    with session_scope() as s:
+        report = seed_database(s, spec)
+        symbols = [f"NSE:{sym}" for sym in s.exec(select(Security.symbol).where(Security.id.in_(report.security_ids)).order_by(Security.id)).all()]
+    return BenchContext(scale, client, report.portfolio_ids, report.security_ids, symbols, end)
+
+
+# -- measurement -------------------------------------------------------------
+@contextmanager
+def count_statements() -> Iterator[list[str]]:
+    statements: list[str] = []
+
+    def _count(conn, cursor, statement, params, context, executemany):  # noqa: ANN001
+        statements.append(statement)
+
+    # Read routes may use their own pool (STORAGE_PROFILE=production) and async engines
+    engines = {engine, read_engine, *(e.sync_engine for e in (async_engine, async_read_engine) if e is not None)}
+    for e in engines:
+        event.listen(e, "before_cursor_execute", _count)
+    try:
+        yield statements
+    finally:
+        for e in engines:
+            event.remove(e, "before_cursor_execute", _count)
+
+
+def measure(name: str, fn: Callable[[int], None], repeat: int) -> ScenarioResult:
+    """Time ``fn(i)`` for ``repeat`` calls after one untimed warm-up call."""
+    fn(-1)
+    times: list[float] = []
+    queries = 0
+    for i in range(repeat):
+        with count_statements() as statements:
+            t0 = time.perf_counter()
+            fn(i)
+            times.append((time.perf_counter() - t0) * 1000.0)
+        queries = max(queries, len(statements))
+    arr = np.asarray(times)
+    return ScenarioResult(
+        name, repeat, float(np.percentile(arr, 50)), float(np.percentile(arr, 95)), float(arr.mean()), float(arr.max()), queries
+    )
+
+
+def _ok(resp) -> None:  # noqa: ANN001
+    if resp.status_code != 200:
+        raise RuntimeError(f"{resp.request.method} {resp.request.url.path} -> {resp.status_code}: {resp.text[:200]}")
+
+
+# -- scenarios ---------------------------------------------------------------
+def _dashboard(ctx: BenchContext) -> Callable[[int], None]:
+    pids = ctx.portfolio_ids
+    return lambda i: _ok(ctx.client.get(f"/portfolios/{pids[i % len(pids)]}/dashboard"))
+
+
+def _positions(ctx: BenchContext) -> Callable[[int], None]:
+    pids = ctx.portfolio_ids
+    return lambda i: _ok(ctx.client.get(f"/portfolios/{pids[i % len(pids)]}/positions"))
+
+
+def _propose_actions(ctx: BenchContext) -> Callable[[int], None]:
+    pids = ctx.portfolio_ids
+
+    def run(i: int) -> None:
+        with Session(engine) as s:
+            propose_actions(s, pids[i % len(pids)])
+
+    return run
+
+
+def _quotes(ctx: BenchContext) -> Callable[[int], None]:
+    now = dt.datetime.now(dt.UTC)
+    quote_store.put_many({sid: (100.0 + k, now) for k, sid in enumerate(ctx.security_ids)}, persist=False)
+    symbols = ",".join(ctx.symbols[: max(ctx.scale.holdings, 1)])
+    return lambda i: _ok(ctx.client.get("/data/quotes", params={"symbols": symbols, "include_prev": "true"}))
+
+
+def _import_positions(ctx: BenchContext) -> Callable[[int], None]:
+    with session_scope() as s:
+        pf = Portfolio(name=f"Bench import {ctx.scale.seed}")
+        s.add(pf)
+        s.flush()
+        pid = pf.id
+    symbols = ctx.symbols[: ctx.scale.holdings]
+
+    def payload(i: int) -> bytes:
+        buf = io.StringIO()
+        w = csv.writer(buf)
+        w.writerow(["Instrument", "Qty.", "Avg. cost"])
+        for k, sym in enumerate(symbols):
+            # Quantities change every call so each import updates holdings
+            w.writerow([sym, 10 + (k + i) % 7, f"{100 + k:.2f}"])
+        return buf.getvalue().encode()
+
+    files = [payload(i) for i in range(-1, ctx.scale.repeat)]
+    return lambda i: _ok(ctx.client.post(f"/portfolios/{pid}/import-csv", files={"file": ("positions.csv", files[i + 1], "text/csv")}))
+
+
+def _import_eod(ctx: BenchContext) -> Callable[[int], None]:
+    symbols = [sym.split(":", 1) for sym in ctx.symbols[: ctx.scale.holdings]]
+
+    def payload(i: int) -> bytes:
+        # One new trading day per call for every security, after the fixture's history
+        day = np.busday_offset(ctx.end, i + 2, roll="forward").astype("datetime64[D]").item()
+        buf = io.StringIO()
+        w = csv.writer(buf)
+        w.writerow(["symbol", "exchange", "date", "open", "high", "low", "close", "volume"])
+        for k, (ex, sym) in enumerate(symbols):
+            px = 100.0 + k + i * 0.5
+            w.writerow([sym, ex, day.isoformat(), px, px * 1.01, px * 0.99, px, 1000])
+        return buf.getvalue().encode()
+
+    files = [payload(i) for i in range(-1, ctx.scale.repeat)]
+
+    def run(i: int) -> None:
+        with Session(engine) as s:
+            import_eod_csv(s, io.BytesIO(files[i + 1]), filename="bench.csv")
+
+    return run
+
+
+class _FakeTicker:
+    MODE_LTP = "ltp"
+
+    def __init__(self, *args, **kwargs) -> None:  # noqa: ANN002, ANN003
+        self.subscribed: list[int] = []
+
+    def subscribe(self, tokens: list[int]) -> None:
+        self.subscribed = list(tokens)
+
+    def set_mode(self, mode: str, tokens: list[int]) -> None:
+        pass
+
+    def connect(self, threaded: bool = False) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def _ticks(ctx: BenchContext) -> Callable[[int], None]:
+    from arthasutra.services import kite_client
+
+    real = kite_client.KiteTicker
+    kite_client.KiteTicker = _FakeTicker
+    try:
+        with Session(engine) as s:
+            mgr = kite_client.KiteWSManager("bench", "bench", s)
+    finally:
+        kite_client.KiteTicker = real
+    mgr.subscribe_portfolio_tokens()
+    tokens = [TOKEN_BASE + k for k in range(len(ctx.security_ids))]
+    # Several ticks per instrument per batch, as the socket delivers them
+    batches = [
+        [{"instrument_token": t, "last_price": 100.0 + (i * 3 + r) * 0.05} for r in range(3) for t in tokens]
+        for i in range(-1, ctx.scale.repeat)
+    ]
+
+    def run(i: int) -> None:
+        mgr._on_ticks(mgr._kt, batches[i + 1])
+        mgr.pipeline.flush()
+
+    return run
+
+
+SCENARIOS: dict[str, Callable[[BenchContext], Callable[[int], None]]] = {
+    "dashboard": _dashboard,
+    "positions": _positions,
+    "propose_actions": _propose_actions,
+    "quotes": _quotes,
+    "ticks": _ticks,
+    # Writers last so the read scenarios see the fixture as built
+    "import_positions": _import_positions,
+    "import_eod": _import_eod,
+}
+
+
+def run_suite(scale: BenchScale, only: Optional[list[str]] = None) -> dict:
+    unknown = set(only or []) - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    t0 = time.perf_counter()
+    ctx = build_fixture(scale, TestClient(app))
+    setup_s = time.perf_counter() - t0
+    results = {}
+    for name, factory in SCENARIOS.items():
+        if only and name not in only:
+            continue
+        results[name] = measure(name, factory(ctx), scale.repeat).to_dict()
+    return {
+        "scale": asdict(scale),
+        "scale_key": scale.key(),
+        "setup_s": round(setup_s, 3),
+        "python": platform.python_version(),
+        "created_at": dt.datetime.now(dt.UTC).isoformat(),
+        "results": results,
+    }
+
+
+# -- baselines ---------------------------------------------------------------
+def load_baseline(path: str) -> dict:
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def save_baseline(path: str, report: dict) -> None:
+    """Store ``report`` under its scale, keeping baselines recorded at other scales."""
+    try:
+        data = load_baseline(path)
+    except FileNotFoundError:
+        data = {}
+    data[report["scale_key"]] = report
+    with open(path, "w") as fh:
+        json.dump(data, fh, indent=2, sort_keys=True)
+        fh.write("\n")
+
+
+def compare(
+    report: dict,
+    baseline: dict,
+    max_latency_regression: float = 0.5,
+    min_latency_delta_ms: float = 2.0,
+    max_query_increase: int = 0,
+) -> list[str]:
+    """Regressions of ``report`` against the baseline recorded at the same scale.
+
+    p95 latency regresses when it grows by more than ``max_latency_regression`` (a
+    fraction) and by more than ``min_latency_delta_ms``; statements per call regress
+    when they grow by more than ``max_query_increase``.
+    """
+    base = baseline.get(report["scale_key"])
+    if base is None:
+        return []
+    problems = []
+    for name, cur in report["results"].items():
+        ref = base["results"].get(name)
+        if ref is None:
+            continue
+        if cur["queries"] > ref["queries"] + max_query_increase:
+            problems.append(f"{name}: {cur['queries']} statements per call (baseline {ref['queries']})")
+        limit = ref["p95_ms"] * (1.0 + max_latency_regression)
+        if cur["p95_ms"] > limit and cur["p95_ms"] - ref["p95_ms"] > min_latency_delta_ms:
+            problems.append(f"{name}: p95 {cur['p95_ms']:.2f} ms (baseline {ref['p95_ms']:.2f} ms, limit {limit:.2f} ms)")
+    return problems
+
+
+def format_report(report: dict) -> str:
+    lines = [f"scale {report['scale_key']} (setup {report['setup_s']:.1f}s)", f"{'scenario':<18}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'queries':>9}"]
+    for name, r in report["results"].items():
+        lines.append(f"{name:<18}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['max_ms']:>10.2f}{r['queries']:>9}")
+    return "\n".join(lines)
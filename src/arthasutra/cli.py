@@ -1,15 +1,19 @@
 from __future__ import annotations
 
 import argparse
+import datetime as dt
+import json
 import os
+import secrets
+import sys
 from pathlib import Path
 
 import uvicorn
 from arthasutra.version import __version__
 
 
-def serve() -> None:
-    parser = argparse.ArgumentParser(description=f"ArthaSutra API (v{__version__})")
+def serve(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="arthasutra-api", description=f"ArthaSutra API (v{__version__})")
     parser.add_argument("--host", default=os.getenv("ARTHASUTRA_HOST", "127.0.0.1"))
     parser.add_argument("--port", type=int, default=int(os.getenv("ARTHASUTRA_PORT", "8000")))
     parser.add_argument(
@@ -32,7 +36,7 @@ def serve() -> None:
     )
     parser.set_defaults(reload=True)
     parser.add_argument("--version", action="store_true", help="Print version and exit")
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     if args.version:
         print(__version__)
@@ -58,5 +62,287 @@ def serve() -> None:
     )
 
 
+def rebuild_snapshots(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="arthasutra rebuild-snapshots",
+        description="Rebuild the last/prev close snapshot table from prices_eod",
+    )
+    parser.parse_args(argv)
+
+    from arthasutra.db.session import create_db_and_tables, session_scope
+    from arthasutra.services.price_snapshot import rebuild_snapshots as _rebuild
+
+    create_db_and_tables()
+    with session_scope() as s:
+        n = _rebuild(s)
+    print(f"rebuilt {n} price snapshots")
+
+
+def rebuild_indicators(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="arthasutra rebuild-indicators",
+        description="Rebuild the incremental indicator state table from prices_eod",
+    )
+    parser.parse_args(argv)
+
+    from arthasutra.db.session import create_db_and_tables, session_scope
+    from arthasutra.services.indicator_state import rebuild_all_states
+
+    create_db_and_tables()
+    with session_scope() as s:
+        n = rebuild_all_states(s)
+    print(f"rebuilt {n} indicator states")
+
+
+def build_columnar(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="arthasutra build-columnar",
+        description="Export prices_eod into the memory-mapped columnar store",
+    )
+    parser.add_argument("--dir", default=os.getenv("COLUMNAR_STORE_DIR"), help="Store directory (default: COLUMNAR_STORE_DIR)")
+    args = parser.parse_args(argv)
+    if not args.dir:
+        parser.error("--dir or COLUMNAR_STORE_DIR is required")
+
+    from arthasutra.db.session import create_db_and_tables, session_scope
+    from arthasutra.services.columnar_store import ColumnarPriceStore, rebuild_from_db
+
+    create_db_and_tables()
+    with session_scope() as s:
+        n = rebuild_from_db(s, ColumnarPriceStore(args.dir))
+    print(f"wrote {n} bars to {args.dir}")
+
+
+def import_eod(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="arthasutra import-eod",
+        description="Stream EOD CSV files (plain or .gz) into prices_eod",
+    )
+    parser.add_argument("paths", nargs="+", help="CSV files with symbol, exchange, date, open, high, low, close, volume; '-' for stdin")
+    parser.add_argument("--force", action="store_true", help="Re-import files already ingested (matched by content hash)")
+    parser.add_argument("--on-conflict", choices=["update", "nothing"], default="update", help="Existing bars: overwrite or keep")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    from arthasutra.db.session import create_db_and_tables, session_scope
+    from arthasutra.services.eod_csv_import import import_eod_csv
+
+    create_db_and_tables()
+    for path in args.paths:
+        with session_scope() as s:
+            if path == "-":
+                report = import_eod_csv(s, sys.stdin.buffer, filename="<stdin>", on_conflict=args.on_conflict, batch_size=args.batch_size, force=args.force)
+            else:
+                with open(path, "rb") as fh:
+                    report = import_eod_csv(s, fh, filename=Path(path).name, on_conflict=args.on_conflict, batch_size=args.batch_size, force=args.force)
+        if report.status == "skipped":
+            print(f"{path}: skipped (already imported)")
+            continue
+        print(
+            f"{path}: {report.rows} rows, {report.written} written, {report.duplicates} duplicates, "
+            f"{report.rejects} rejects in {report.elapsed_s:.2f}s ({report.rows_per_sec:,.0f} rows/s)"
+        )
+        for sample in report.reject_samples[:5]:
+            print(f"  line {sample['line']}: {sample['reason']}")
+
+
+def seed(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="arthasutra seed",
+        description="Generate synthetic securities, EOD history and portfolios for load testing",
+    )
+    parser.add_argument("--securities", type=int, default=500)
+    parser.add_argument("--years", type=int, default=5, help="Years of daily bars per security (252 trading days each)")
+    parser.add_argument("--portfolios", type=int, default=3)
+    parser.add_argument("--holdings", type=int, default=40, help="Holdings per portfolio")
+    parser.add_argument("--max-lots", type=int, default=3, help="Lots per holding (1..N)")
+    parser.add_argument("--quotes", action="store_true", help="Also write a quotelive row per security")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed; the same options give the same data")
+    parser.add_argument("--end", type=lambda v: dt.date.fromisoformat(v), default=None, help="Last bar date, YYYY-MM-DD (default: today)")
+    parser.add_argument("--prefix", default="SYN", help="Symbol prefix (must not already exist)")
+    parser.add_argument("--kite-token-base", type=int, default=None, help="Assign kite_token base+i to security i")
+    parser.add_argument("--no-derived", dest="derived", action="store_false", help="Skip price snapshots and indicator states")
+    args = parser.parse_args(argv)
+
+    from arthasutra.db.session import create_db_and_tables, session_scope
+    from arthasutra.services.synthetic import SeedSpec, seed_database
+
+    spec = SeedSpec(
+        securities=args.securities, years=args.years, portfolios=args.portfolios, holdings=args.holdings,
+        max_lots=args.max_lots, quotes=args.quotes, seed=args.seed, end=args.end or dt.date.today(),
+        prefix=args.prefix, kite_token_base=args.kite_token_base, derived=args.derived,
+    )
+
+    def progress(done: int, total: int) -> None:
+        print(f"\r{done}/{total} securities", end="", file=sys.stderr, flush=True)
+
+    create_db_and_tables()
+    with session_scope() as s:
+        try:
+            report = seed_database(s, spec, progress=progress)
+        except ValueError as e:
+            raise SystemExit(str(e))
+    print(file=sys.stderr)
+    print(
+        f"seeded {report.securities} securities, {report.bars:,} bars, {report.portfolios} portfolios, "
+        f"{report.holdings} holdings, {report.lots} lots, {report.quotes} quotes "
+        f"in {report.elapsed_s:.1f}s ({report.bars_per_sec:,.0f} bars/s)"
+    )
+
+
+def bench(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="arthasutra bench",
+        description="Time API and service hot paths on a synthetic dataset and compare against a JSON baseline",
+    )
+    parser.add_argument("--portfolios", type=int, default=2)
+    parser.add_argument("--holdings", type=int, default=50, help="Holdings per portfolio")
+    parser.add_argument("--years", type=int, default=2, help="Years of daily bars per security")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed calls per scenario")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--only", help="Comma-separated scenarios (default: all)")
+    parser.add_argument("--database-url", help="Database to build the dataset in (default: a temporary SQLite file)")
+    parser.add_argument("--baseline", default="bench-baseline.json", help="Baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="Record this run as the baseline for its scale")
+    parser.add_argument("--check", action="store_true", help="Exit non-zero when a scenario regresses against the baseline")
+    parser.add_argument("--max-latency-regression", type=float, default=0.5, help="Allowed p95 growth as a fraction")
+    parser.add_argument("--max-query-increase", type=int, default=0, help="Allowed extra statements per call")
+    parser.add_argument("--json", dest="json_out", help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    # The engine binds DATABASE_URL at import, so choose the database first
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        import tempfile
+
+        tmp = tempfile.NamedTemporaryFile(prefix="arthasutra-bench-", suffix=".db", delete=False)
+        tmp.close()
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp.name}"
+
+    from arthasutra import bench as _bench
+
+    scale = _bench.BenchScale(args.portfolios, args.holdings, args.years, args.repeat, args.seed)
+    only = [n.strip() for n in args.only.split(",") if n.strip()] if args.only else None
+    report = _bench.run_suite(scale, only)
+    print(_bench.format_report(report))
+    if args.json_out:
+        with open(args.json_out, "w") as fh:
+            json.dump(report, fh, indent=2)
+    if args.check:
+        try:
+            baseline = _bench.load_baseline(args.baseline)
+        except FileNotFoundError:
+            raise SystemExit(f"no baseline at {args.baseline}; run with --save first")
+        if scale.key() not in baseline:
+            raise SystemExit(f"{args.baseline} has no baseline for scale {scale.key()}")
+        problems = _bench.compare(
+            report, baseline, max_latency_regression=args.max_latency_regression, max_query_increase=args.max_query_increase
+        )
+        for p in problems:
+            print(f"REGRESSION {p}")
+        if problems:
+            raise SystemExit(1)
+        print(f"no regressions against {args.baseline}")
+    if args.save:
+        _bench.save_baseline(args.baseline, report)
+        print(f"saved baseline for {scale.key()} to {args.baseline}")
+
+
+def profile(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="arthasutra profile",
+        description="Run one API request in-process under the request profiler and print its hot spots",
+    )
+    parser.add_argument("target", nargs="*", help="[METHOD] PATH, e.g. GET '/portfolios/1/dashboard?x=1'")
+    parser.add_argument("--from", dest="recorded", help="Replay the request recorded in a profile (its id or .json path)")
+    parser.add_argument("--body", help="File sent as the JSON request body")
+    parser.add_argument("--dir", help="Profile directory (default: PROFILE_DIR)")
+    parser.add_argument("--interval-ms", type=float, default=None, help="Sampling interval (default: PROFILE_INTERVAL_MS or 5)")
+    parser.add_argument("--repeat", type=int, default=1, help="Calls to make; the last is profiled, earlier ones warm caches")
+    parser.add_argument("--top", type=int, default=10, help="SQL statements and frames to print")
+    args = parser.parse_args(argv)
+
+    from fastapi.testclient import TestClient
+
+    from arthasutra.api.main import app
+    from arthasutra.services.profiler import profiler
+
+    if args.dir:
+        profiler.directory = Path(args.dir)
+    if args.interval_ms:
+        profiler.interval = args.interval_ms / 1000.0
+    if args.recorded:
+        src = Path(args.recorded)
+        data = json.loads(src.read_text()) if src.suffix == ".json" else profiler.load(args.recorded)
+        if data is None:
+            raise SystemExit(f"no recorded profile {args.recorded} in {profiler.directory}")
+        req = data.get("request", data)
+        method, path = req["method"], req["path"] + (f"?{req['query']}" if req.get("query") else "")
+    elif args.target:
+        method, path = ("GET", args.target[0]) if len(args.target) == 1 else (args.target[0].upper(), args.target[1])
+    else:
+        parser.error("give a PATH or --from")
+    body = Path(args.body).read_bytes() if args.body else None
+    # Forced on for this process only; the server's settings are untouched
+    profiler.enabled, profiler.sample_rate = True, 1.0
+    profiler.admin_token = profiler.admin_token or secrets.token_urlsafe(16)
+    headers = {"x-admin-token": profiler.admin_token}
+    if body is not None:
+        headers["content-type"] = "application/json"
+    client = TestClient(app)
+    for _ in range(max(args.repeat, 1) - 1):
+        client.request(method, path, content=body, headers=headers)
+    resp = client.request(method, path, content=body, headers={**headers, "x-profile": "1"})
+    prof_id = resp.headers.get("x-profile-id")
+    summary = profiler.load(prof_id) if prof_id else None
+    if summary is None:
+        raise SystemExit(
+            f"{method} {path} -> {resp.status_code}, but no profile was saved "
+            f"(is {profiler.directory} writable, and does the route exist?)"
+        )
+    print(
+        f"{method} {path} -> {resp.status_code} in {summary['duration_ms']:.1f} ms; "
+        f"{summary['samples']} samples, {summary['sql_statements']} SQL statements ({summary['sql_ms']:.1f} ms)"
+    )
+    if summary["top_sql"]:
+        print(f"{'count':>6}{'total ms':>10}{'max ms':>9}  statement")
+        for row in summary["top_sql"][: args.top]:
+            stmt = row["statement"] if len(row["statement"]) <= 100 else row["statement"][:97] + "..."
+            print(f"{row['count']:>6}{row['total_ms']:>10.2f}{row['max_ms']:>9.2f}  {stmt}")
+    if summary["hot_frames"]:
+        print(f"{'self':>6}{'total':>7}  frame")
+        for row in summary["hot_frames"][: args.top]:
+            print(f"{row['self']:>6}{row['total']:>7}  {row['frame']}")
+    print(f"profile {summary['id']}: {profiler.directory / (summary['id'] + '.folded')}")
+
+
+COMMANDS = {
+    "serve": serve,
+    "rebuild-snapshots": rebuild_snapshots,
+    "rebuild-indicators": rebuild_indicators,
+    "build-columnar": build_columnar,
+    "import-eod": import_eod,
+    "seed": seed,
+    "bench": bench,
+    "profile": profile,
+}
+
+
+def main(argv: list[str] | None = None) -> None:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if argv and argv[0] in {"-h", "--help"}:
+        print(f"usage: arthasutra {{{','.join(COMMANDS)}}} [options]")
+        return
+    # No sub-command (or bare options) keeps the historical behaviour of serving the API
+    if not argv or argv[0].startswith("-"):
+        serve(argv)
+        return
+    cmd = COMMANDS.get(argv[0])
+    if cmd is None:
+        raise SystemExit(f"unknown command: {argv[0]} (choose from {', '.join(COMMANDS)})")
+    cmd(argv[1:])
+
+
 if __name__ == "__main__":
-    serve()
+    main()
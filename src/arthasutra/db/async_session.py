@@ -0,0 +1,126 @@
+"""Async database access for the hot read routes.
+
+With the ``async`` extra installed (``sqlalchemy[asyncio]`` plus aiosqlite, or
+asyncpg when ``DATABASE_URL`` is Postgres), :func:`run_read` runs a route's sync
+service code through ``AsyncSession.run_sync``: the ORM code is unchanged, but each
+statement is awaited on the async driver, so a request waiting on the database
+holds no threadpool worker and concurrency is bounded by the connection pools
+(same ``STORAGE_PROFILE`` tuning and read pool as the sync engines).
+
+``run_sync`` executes the function itself on the event-loop thread, so pass only the
+loading step; CPU-heavy work on the loaded data (valuation, rules, indicator
+folding) belongs in ``anyio.to_thread.run_sync`` afterwards.
+
+Without the extra, for in-memory SQLite, or with ``ASYNC_DB=0``, :func:`run_read`
+runs the same function on a :class:`ReadSession` in the threadpool, as the sync
+routes do.
+"""
+from __future__ import annotations
+
+import functools
+import importlib.util
+import os
+from typing import Any, Callable, Optional, TypeVar
+
+import anyio
+from sqlalchemy.engine import Engine
+
+from arthasutra.db.session import (
+    ReadSession,
+    StorageProfile,
+    engine,
+    instrument,
+    is_memory_url,
+    read_engine,
+    read_pragmas,
+    set_pragmas,
+    storage,
+)
+
+
+T = TypeVar("T")
+
+# dialect -> async DBAPI driver
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+ASYNC_DB = os.getenv("ASYNC_DB", "1").lower() not in {"0", "false", "no"}
+
+
+def async_url(url: str) -> Optional[str]:
+    """``url`` with its dialect's async driver, e.g. ``sqlite+aiosqlite:///x.db``; None if unsupported."""
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        return None
+    dialect = scheme.split("+", 1)[0]
+    if dialect == "postgres":
+        dialect = "postgresql"
+    driver = ASYNC_DRIVERS.get(dialect)
+    return f"{dialect}+{driver}://{rest}" if driver else None
+
+
+def async_available(url: str) -> bool:
+    """Whether ``url`` can be served by an async engine in this environment."""
+    aurl = async_url(url)
+    if aurl is None or is_memory_url(url):
+        return False
+    driver = ASYNC_DRIVERS[aurl.split("+", 1)[0]]
+    return all(importlib.util.find_spec(mod) is not None for mod in ("greenlet", driver))
+
+
+def create_async_engines(url: str, profile: StorageProfile, read_url: Optional[str] = None):  # noqa: ANN201
+    """``(async_engine, async_read_engine)`` mirroring :func:`create_engines` for ``url``.
+
+    ``read_url`` defaults to ``url``; pass the sync read engine's URL when it differs.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    aurl = async_url(url)
+    if aurl is None:
+        raise ValueError(f"no async driver for {url.partition('://')[0]!r}")
+    sqlite = aurl.startswith("sqlite")
+    write = create_async_engine(aurl)
+    if sqlite:
+        set_pragmas(write.sync_engine, profile.pragmas)
+    if profile.read_pool_size <= 0:
+        return write, write
+    read = create_async_engine(
+        async_url(read_url or url), pool_size=profile.read_pool_size, max_overflow=profile.read_max_overflow
+    )
+    if sqlite:
+        set_pragmas(read.sync_engine, read_pragmas(profile))
+    return write, read
+
+
+def _url(engine: Engine) -> str:
+    return engine.url.render_as_string(hide_password=False)
+
+
+# Built from the sync engines' URLs (not DATABASE_URL again) so both paths share one database
+if ASYNC_DB and async_available(_url(engine)):
+    async_engine, async_read_engine = create_async_engines(_url(engine), storage, _url(read_engine))
+    instrument(async_engine.sync_engine)
+    instrument(async_read_engine.sync_engine)
+else:
+    async_engine = async_read_engine = None
+
+
+def _in_read_session(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    with ReadSession() as session:
+        return fn(session, *args, **kwargs)
+
+
+async def run_read(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """``fn(session, *args, **kwargs)`` on a read session, without a threadpool worker when async is available.
+
+    The session is a :class:`ReadSession` either way, so ``fn`` may flush and commit
+    (writes go to the write engine). On the async path ``fn`` runs on the event loop:
+    keep it to queries and hand computation to the threadpool.
+    """
+    if async_engine is None:
+        return await anyio.to_thread.run_sync(functools.partial(_in_read_session, fn, *args, **kwargs))
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    async with AsyncSession(
+        async_engine, sync_session_class=ReadSession, read_bind=async_read_engine.sync_engine
+    ) as session:
+        return await session.run_sync(fn, *args, **kwargs)
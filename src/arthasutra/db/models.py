@@ -3,6 +3,7 @@ from __future__ import annotations
 import datetime as dt
 from typing import Optional
 
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field
 
 
@@ -44,6 +45,9 @@ class Lot(SQLModel, table=True):
 
 
 class PriceEOD(SQLModel, table=True):
+    # One bar per security per day; bulk ingest upserts against this index
+    __table_args__ = (Index("ix_priceeod_security_date", "security_id", "date", unique=True),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     security_id: int = Field(index=True, foreign_key="security.id")
     date: dt.date = Field(index=True)
@@ -54,6 +58,36 @@ class PriceEOD(SQLModel, table=True):
     volume: Optional[float] = None
 
 
+class PriceSnapshot(SQLModel, table=True):
+    # Materialized latest/previous close per security, maintained by the EOD ingest paths
+    security_id: int = Field(primary_key=True, foreign_key="security.id")
+    last_close: Optional[float] = None
+    last_date: Optional[dt.date] = None
+    prev_close: Optional[float] = None
+    prev_date: Optional[dt.date] = None
+    updated_at: dt.datetime = Field(default_factory=lambda: dt.datetime.now(dt.UTC))
+
+
+class IndicatorState(SQLModel, table=True):
+    # Incremental indicator accumulators per security, folded forward one EOD bar at a time
+    security_id: int = Field(primary_key=True, foreign_key="security.id")
+    as_of: Optional[dt.date] = None
+    bars: int = 0
+    params: str = ""  # indicator windows the state was built for; a mismatch forces a rebuild
+    state_json: str = "{}"
+    updated_at: dt.datetime = Field(default_factory=lambda: dt.datetime.now(dt.UTC))
+
+
+class ImportedFile(SQLModel, table=True):
+    # Content hashes of ingested bulk files, so re-uploads of the same file are skipped
+    sha256: str = Field(primary_key=True)
+    kind: str = Field(default="prices_eod")
+    filename: Optional[str] = None
+    bytes: int = 0
+    rows: int = 0
+    imported_at: dt.datetime = Field(default_factory=lambda: dt.datetime.now(dt.UTC))
+
+
 class ConfigText(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     portfolio_id: int = Field(index=True, foreign_key="portfolio.id")
@@ -62,9 +96,36 @@ class ConfigText(SQLModel, table=True):
 
 
 class QuoteLive(SQLModel, table=True):
+    # Latest quote per security; tick ingestion upserts against this index
+    __table_args__ = (Index("ix_quotelive_security_unique", "security_id", unique=True),)
+
     id: int | None = Field(default=None, primary_key=True)
-    security_id: int = Field(index=True, foreign_key="security.id")
+    security_id: int = Field(foreign_key="security.id")
     ts: dt.datetime = Field(default_factory=lambda: dt.datetime.now(dt.UTC), index=True)
     ltp: float
     source: str = Field(default="yf")
     updated_at: dt.datetime = Field(default_factory=lambda: dt.datetime.now(dt.UTC))
+
+
+class OverlayCheckpoint(SQLModel, table=True):
+    # Periodic snapshot of the in-memory overlay state machine per (portfolio, security)
+    portfolio_id: int = Field(primary_key=True, foreign_key="portfolio.id")
+    security_id: int = Field(primary_key=True, foreign_key="security.id")
+    state_json: str = "{}"
+    updated_at: dt.datetime = Field(default_factory=lambda: dt.datetime.now(dt.UTC))
+
+
+class PriceAlert(SQLModel, table=True):
+    # Threshold alert on one security; active ones are held in the in-memory level index
+    id: Optional[int] = Field(default=None, primary_key=True)
+    security_id: int = Field(index=True, foreign_key="security.id")
+    portfolio_id: Optional[int] = Field(default=None, index=True, foreign_key="portfolio.id")
+    rule: str = "price_move"  # price_move | atr_band
+    direction: str  # up: fires when price rises to >= level; down: falls to <= level
+    level: float
+    ref_price: Optional[float] = None
+    note: Optional[str] = None
+    status: str = Field(default="active", index=True)  # active | fired | cancelled
+    created_at: dt.datetime = Field(default_factory=lambda: dt.datetime.now(dt.UTC))
+    fired_at: Optional[dt.datetime] = None
+    fired_price: Optional[float] = None
@@ -2,11 +2,16 @@ from __future__ import annotations
 
 import os
 from contextlib import contextmanager
-from typing import Iterator
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
 
 from dotenv import load_dotenv
 from sqlmodel import SQLModel, Session, create_engine
-from sqlalchemy import text
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.dml import UpdateBase
+
+from arthasutra.services import metrics, profiler
 
 
 load_dotenv()
@@ -22,7 +27,140 @@ def _engine_kwargs(url: str) -> dict:
     return {}
 
 
-engine = create_engine(get_database_url(), **_engine_kwargs(get_database_url()))
+@dataclass(frozen=True)
+class StorageProfile:
+    name: str
+    # SQLite PRAGMAs run on every new connection, in order
+    pragmas: dict[str, str | int] = field(default_factory=dict)
+    # A separate pool for read-only request paths; 0 shares the write engine's pool
+    read_pool_size: int = 0
+    read_max_overflow: int = 0
+
+
+STORAGE_PROFILES = {
+    # As before: the driver's defaults (rollback journal, 5 s busy timeout), one pool
+    "default": StorageProfile("default"),
+    "production": StorageProfile(
+        "production",
+        pragmas={
+            # Readers no longer block the writer (or each other) and commits append to the WAL
+            "journal_mode": "WAL",
+            # With WAL, fsync at checkpoints only; a power loss can drop the last commits, not corrupt
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,
+            "cache_size": -16384,  # KiB, per connection
+            "mmap_size": 268435456,
+            "temp_store": "MEMORY",
+        },
+        read_pool_size=8,
+        read_max_overflow=8,
+    ),
+}
+
+
+def _parse_pragmas(spec: str) -> dict[str, str]:
+    out = {}
+    for part in spec.split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            out[k.strip().lower()] = v.strip()
+    return out
+
+
+def storage_profile(name: Optional[str] = None) -> StorageProfile:
+    """The profile named by ``name`` or ``STORAGE_PROFILE``, with ``SQLITE_PRAGMAS`` overrides.
+
+    ``SQLITE_PRAGMAS`` is a comma-separated ``name=value`` list, e.g. ``mmap_size=0``.
+    Raises ValueError for an unknown profile name.
+    """
+    name = (name or os.getenv("STORAGE_PROFILE") or "default").strip().lower()
+    base = STORAGE_PROFILES.get(name)
+    if base is None:
+        raise ValueError(f"unknown STORAGE_PROFILE {name!r}; choose from {', '.join(STORAGE_PROFILES)}")
+    overrides = _parse_pragmas(os.getenv("SQLITE_PRAGMAS", ""))
+    pool = os.getenv("DB_READ_POOL_SIZE")
+    return StorageProfile(
+        base.name,
+        {**base.pragmas, **overrides},
+        int(pool) if pool else base.read_pool_size,
+        base.read_max_overflow,
+    )
+
+
+def is_memory_url(url: str) -> bool:
+    return url.startswith("sqlite") and (url in {"sqlite://", "sqlite:///"} or ":memory:" in url or "mode=memory" in url)
+
+
+def set_pragmas(engine: Engine, pragmas: dict[str, str | int]) -> None:
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, _record) -> None:  # noqa: ANN001
+        cur = dbapi_conn.cursor()
+        try:
+            for k, v in pragmas.items():
+                cur.execute(f"PRAGMA {k}={v}")
+        finally:
+            cur.close()
+
+
+def read_pragmas(profile: StorageProfile) -> dict[str, str | int]:
+    # journal_mode is a property of the file; the write engine sets it
+    return {**{k: v for k, v in profile.pragmas.items() if k != "journal_mode"}, "query_only": "ON"}
+
+
+def create_engines(url: str, profile: StorageProfile) -> tuple[Engine, Engine]:
+    """``(engine, read_engine)`` for ``url``; the same engine twice without a read pool.
+
+    On SQLite the read pool's connections are ``query_only``, so a read path that
+    tries to write fails loudly instead of queueing for the write lock.
+    """
+    sqlite = url.startswith("sqlite")
+    write = create_engine(url, **_engine_kwargs(url))
+    if sqlite:
+        set_pragmas(write, profile.pragmas)
+    # An in-memory database exists once per connection; readers must share it
+    if profile.read_pool_size <= 0 or is_memory_url(url):
+        return write, write
+    read = create_engine(
+        url, pool_size=profile.read_pool_size, max_overflow=profile.read_max_overflow, **_engine_kwargs(url)
+    )
+    if sqlite:
+        set_pragmas(read, read_pragmas(profile))
+    return write, read
+
+
+def instrument(engine: Engine) -> None:
+    # Per-request / per-job SQL statement counts and time for /metrics
+    metrics.install_sql_hooks(engine)
+    # Statement timings for profiled requests (a context-variable check otherwise)
+    profiler.install_sql_hooks(engine)
+
+
+storage = storage_profile()
+engine, read_engine = create_engines(get_database_url(), storage)
+instrument(engine)
+instrument(read_engine)
+
+
+class ReadSession(Session):
+    """Session for read paths: queries use the read pool, writes the write engine.
+
+    Flushes and DML statements are routed to the write engine, and once the session
+    has written, every later statement follows so it reads its own writes.
+    """
+
+    def __init__(self, bind: Optional[Engine] = None, read_bind: Optional[Engine] = None, **kw) -> None:  # noqa: ANN003
+        super().__init__(bind or engine, **kw)
+        self.read_bind = read_bind or read_engine
+        self._wrote = False
+
+    def get_bind(self, mapper=None, *, clause=None, **kw):  # noqa: ANN001, ANN003, ANN201
+        if self._wrote or self._flushing or isinstance(clause, UpdateBase):
+            self._wrote = True
+            return super().get_bind(mapper, clause=clause, **kw)
+        return self.read_bind
 
 
 def create_db_and_tables() -> None:
@@ -42,6 +180,26 @@ def _run_light_migrations() -> None:
         if "kite_token" not in col_names:
             conn.execute(text("ALTER TABLE security ADD COLUMN kite_token INTEGER"))
             conn.commit()
+        # priceeod (security_id, date) uniqueness; drop duplicate bars first, keeping the newest row
+        indexes = {row[1] for row in conn.execute(text("PRAGMA index_list('priceeod')")).fetchall()}
+        if "ix_priceeod_security_date" not in indexes:
+            conn.execute(text(
+                "DELETE FROM priceeod WHERE id NOT IN (SELECT MAX(id) FROM priceeod GROUP BY security_id, date)"
+            ))
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_priceeod_security_date ON priceeod (security_id, date)"
+            ))
+            conn.commit()
+        # quotelive: one row per security; keep the most recently written quote
+        indexes = {row[1] for row in conn.execute(text("PRAGMA index_list('quotelive')")).fetchall()}
+        if "ix_quotelive_security_unique" not in indexes:
+            conn.execute(text(
+                "DELETE FROM quotelive WHERE id NOT IN (SELECT MAX(id) FROM quotelive GROUP BY security_id)"
+            ))
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_quotelive_security_unique ON quotelive (security_id)"
+            ))
+            conn.commit()
 
 
 def get_session() -> Iterator[Session]:
@@ -49,6 +207,12 @@ def get_session() -> Iterator[Session]:
         yield session
 
 
+def get_read_session() -> Iterator[Session]:
+    """Dependency for read-only routes: their queries never queue behind ingest writes."""
+    with ReadSession() as session:
+        yield session
+
+
 @contextmanager
 def session_scope() -> Iterator[Session]:
     session = Session(engine)
@@ -0,0 +1,389 @@
+"""Price-level alerts evaluated per tick against sorted level indexes.
+
+Active alerts live in memory, per security, in two sorted level lists: ``up`` alerts
+fire when the price rises to or through their level, ``down`` alerts when it falls to
+or through it. A tick bisects only the range between the previous and the new price,
+so its cost depends on how many alerts fire, not on how many exist. Alerts are
+one-shot: fired ones leave the index at once and are marked ``fired`` in
+``pricealert`` by a write-behind thread. Fired alerts are published as
+:class:`AlertEvent`\\ s.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Callable, ContextManager, Iterable, Mapping, Optional
+
+from sqlalchemy import bindparam, update
+from sqlmodel import Session, select
+
+from arthasutra.db.models import PriceAlert, PriceSnapshot
+from arthasutra.services.indicator_state import ATR_WINDOW, load_indicator_states
+from arthasutra.services.metrics import track_job
+from arthasutra.services.quote_store import LiveQuote, quote_store
+
+
+RULES = ("price_move", "atr_band")
+
+
+@dataclass(frozen=True)
+class AlertEvent:
+    seq: int
+    alert_id: int
+    security_id: int
+    portfolio_id: Optional[int]
+    rule: str
+    direction: str
+    level: float
+    price: float
+    ts: dt.datetime
+    note: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d["ts"] = self.ts.isoformat()
+        return d
+
+
+class _Levels:
+    """Sorted alert levels with their ids in a parallel list (bisect runs on plain floats)."""
+
+    __slots__ = ("levels", "ids")
+
+    def __init__(self) -> None:
+        self.levels: list[float] = []
+        self.ids: list[int] = []
+
+    def add(self, level: float, alert_id: int) -> None:
+        i = bisect_right(self.levels, level)
+        self.levels.insert(i, level)
+        self.ids.insert(i, alert_id)
+
+    def remove(self, level: float, alert_id: int) -> bool:
+        i = bisect_left(self.levels, level)
+        while i < len(self.levels) and self.levels[i] == level:
+            if self.ids[i] == alert_id:
+                del self.levels[i], self.ids[i]
+                return True
+            i += 1
+        return False
+
+    def take(self, lo: int, hi: int) -> list[int]:
+        if lo >= hi:
+            return []
+        ids = self.ids[lo:hi]
+        del self.levels[lo:hi], self.ids[lo:hi]
+        return ids
+
+    def __len__(self) -> int:
+        return len(self.levels)
+
+
+class _Book:
+    __slots__ = ("up", "down", "last")
+
+    def __init__(self) -> None:
+        self.up = _Levels()
+        self.down = _Levels()
+        self.last: Optional[float] = None
+
+    def cross(self, price: float) -> list[int]:
+        """Ids of alerts crossed moving from the last price to ``price``; they leave the book."""
+        prev, self.last = self.last, price
+        up, down = self.up, self.down
+        if prev is None:
+            # No reference yet: fire everything whose condition already holds
+            return up.take(0, bisect_right(up.levels, price)) + down.take(bisect_left(down.levels, price), len(down))
+        if price > prev:
+            return up.take(bisect_right(up.levels, prev), bisect_right(up.levels, price)) if up.levels else []
+        if price < prev:
+            return down.take(bisect_left(down.levels, price), bisect_left(down.levels, prev)) if down.levels else []
+        return []
+
+
+@dataclass(frozen=True)
+class _Meta:
+    security_id: int
+    portfolio_id: Optional[int]
+    rule: str
+    direction: str
+    level: float
+    note: Optional[str]
+
+
+class AlertEngine:
+    """In-memory alert index fed by quote-store listeners.
+
+    :meth:`on_quotes` costs one dict lookup per quote plus two bisects when the price
+    moved and the security has alerts on that side. Fired alerts are kept in a
+    bounded event buffer and queued for :meth:`flush` (see :meth:`start`).
+    """
+
+    def __init__(self, max_events: int = 1000) -> None:
+        self._books: dict[int, _Book] = {}
+        self._meta: dict[int, _Meta] = {}
+        self._pending: list[tuple[int, float, dt.datetime]] = []
+        self._events: deque[AlertEvent] = deque(maxlen=max_events)
+        self._listeners: tuple[Callable[[AlertEvent], None], ...] = ()
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._session_factory: Optional[Callable[[], ContextManager[Session]]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.interval = 1.0
+        self.ticks = 0
+        self.fired = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+    # -- index -----------------------------------------------------------
+    def _add(self, alert: PriceAlert, last_price: Optional[float]) -> None:
+        book = self._books.get(alert.security_id)
+        if book is None:
+            book = self._books[alert.security_id] = _Book()
+        if book.last is None:
+            # Seed the reference so only later crossings fire
+            book.last = last_price if last_price is not None else alert.ref_price
+        side = book.up if alert.direction == "up" else book.down
+        side.add(float(alert.level), alert.id)
+        self._meta[alert.id] = _Meta(
+            alert.security_id, alert.portfolio_id, alert.rule, alert.direction, float(alert.level), alert.note
+        )
+
+    def add(self, alerts: Iterable[PriceAlert], last_prices: Optional[Mapping[int, float]] = None) -> int:
+        """Index active alerts (they must have ids); ``last_prices`` seeds securities not yet ticked."""
+        n = 0
+        with self._lock:
+            for a in alerts:
+                if a.id is None or a.status != "active" or a.id in self._meta:
+                    continue
+                self._add(a, (last_prices or {}).get(a.security_id))
+                n += 1
+        return n
+
+    def _remove(self, alert_id: int) -> bool:
+        meta = self._meta.pop(alert_id, None)
+        if meta is None:
+            return False
+        book = self._books[meta.security_id]
+        (book.up if meta.direction == "up" else book.down).remove(meta.level, alert_id)
+        return True
+
+    def remove(self, alert_id: int) -> bool:
+        with self._lock:
+            return self._remove(alert_id)
+
+    def forget(self, portfolio_id: int) -> int:
+        """Drop a deleted portfolio's alerts and events from memory; returns alerts dropped."""
+        with self._lock:
+            ids = [aid for aid, meta in self._meta.items() if meta.portfolio_id == portfolio_id]
+            for aid in ids:
+                self._remove(aid)
+            self._events = deque((e for e in self._events if e.portfolio_id != portfolio_id), maxlen=self._events.maxlen)
+        return len(ids)
+
+    def reload(self, session: Session) -> int:
+        """Replace the index with every active alert in ``pricealert``."""
+        self.flush()
+        alerts = session.exec(select(PriceAlert).where(PriceAlert.status == "active")).all()
+        quotes = quote_store.get_many({a.security_id for a in alerts})
+        with self._lock:
+            self._books, self._meta = {}, {}
+        return self.add(alerts, {sid: q.ltp for sid, q in quotes.items()})
+
+    # -- ticks -----------------------------------------------------------
+    def on_quotes(self, quotes: Iterable[LiveQuote]) -> int:
+        """Check a batch of quotes; returns how many alerts fired."""
+        fired: list[AlertEvent] = []
+        with self._lock:
+            books = self._books
+            for q in quotes:
+                book = books.get(q.security_id)
+                if book is None:
+                    continue
+                self.ticks += 1
+                ids = book.cross(q.ltp)
+                for aid in ids:
+                    meta = self._meta.pop(aid)
+                    self._seq += 1
+                    fired.append(AlertEvent(
+                        self._seq, aid, meta.security_id, meta.portfolio_id, meta.rule, meta.direction,
+                        meta.level, q.ltp, q.ts, meta.note,
+                    ))
+                    self._pending.append((aid, q.ltp, q.ts))
+            self._events.extend(fired)
+            self.fired += len(fired)
+        for ev in fired:
+            for fn in self._listeners:
+                try:
+                    fn(ev)
+                except Exception as e:
+                    self.errors += 1
+                    self.last_error = str(e)
+        return len(fired)
+
+    def add_listener(self, fn: Callable[[AlertEvent], None]) -> None:
+        if fn not in self._listeners:
+            self._listeners = self._listeners + (fn,)
+
+    def remove_listener(self, fn: Callable[[AlertEvent], None]) -> None:
+        self._listeners = tuple(f for f in self._listeners if f is not fn)
+
+    # -- reads -----------------------------------------------------------
+    def events(
+        self, after_seq: int = 0, portfolio_id: Optional[int] = None, security_id: Optional[int] = None
+    ) -> list[AlertEvent]:
+        with self._lock:
+            return [
+                e for e in self._events
+                if e.seq > after_seq
+                and (portfolio_id is None or e.portfolio_id == portfolio_id)
+                and (security_id is None or e.security_id == security_id)
+            ]
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def __len__(self) -> int:
+        return len(self._meta)
+
+    # -- write-behind ----------------------------------------------------
+    def flush(self) -> int:
+        """Mark fired alerts in ``pricealert`` with one executemany UPDATE; returns rows queued."""
+        if self._session_factory is None:
+            return 0
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        t = PriceAlert.__table__
+        stmt = (
+            update(t)
+            .where(t.c.id == bindparam("alert_id"), t.c.status == "active")
+            .values(status="fired", fired_price=bindparam("price"), fired_at=bindparam("ts"))
+        )
+        try:
+            with track_job("alert_flush"), self._session_factory() as s:
+                s.connection().execute(stmt, [{"alert_id": aid, "price": px, "ts": ts} for aid, px, ts in batch])
+        except Exception as e:
+            with self._lock:
+                self._pending[:0] = batch
+                self.errors += 1
+                self.last_error = str(e)
+            return 0
+        return len(batch)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.flush()
+        self.flush()
+
+    def start(self, session_factory: Callable[[], ContextManager[Session]], interval: Optional[float] = None) -> None:
+        self._session_factory = session_factory
+        if interval is not None:
+            self.interval = interval
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="alert-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> dict[str, object]:
+        with self._lock:
+            return {
+                "active": len(self._meta),
+                "securities": len(self._books),
+                "pending": len(self._pending),
+                "seq": self._seq,
+                "ticks": self.ticks,
+                "fired": self.fired,
+                "errors": self.errors,
+                "last_error": self.last_error,
+            }
+
+
+def reference_price(session: Session, security_id: int) -> Optional[float]:
+    """Current LTP from the quote store, else the last EOD close."""
+    quote_store.ensure_warm(session)
+    q = quote_store.get(security_id)
+    if q is not None:
+        return float(q.ltp)
+    snap = session.get(PriceSnapshot, security_id)
+    return float(snap.last_close) if snap is not None and snap.last_close is not None else None
+
+
+def build_alerts(
+    session: Session,
+    security_id: int,
+    rule: str = "price_move",
+    level: Optional[float] = None,
+    pct: Optional[float] = None,
+    direction: Optional[str] = None,
+    mult: float = 2.0,
+    portfolio_id: Optional[int] = None,
+    note: Optional[str] = None,
+) -> list[PriceAlert]:
+    """Turn a rule spec into price-level alerts (not yet added to the session).
+
+    ``price_move``: an absolute ``level`` (direction inferred from the current price
+    unless given) or a ``pct`` move from it. ``atr_band``: two levels at
+    ``mult`` x ATR above and below the current price. Raises ValueError on bad specs.
+    """
+    if rule not in RULES:
+        raise ValueError(f"unsupported rule {rule!r}; expected one of {', '.join(RULES)}")
+    if direction is not None and direction not in ("up", "down"):
+        raise ValueError("direction must be 'up' or 'down'")
+    ref = reference_price(session, security_id)
+
+    def alert(dir_: str, lvl: float) -> PriceAlert:
+        return PriceAlert(
+            security_id=security_id, portfolio_id=portfolio_id, rule=rule, direction=dir_,
+            level=float(lvl), ref_price=ref, note=note,
+        )
+
+    if rule == "atr_band":
+        state = load_indicator_states(session, [security_id]).get(security_id)
+        atr = state.values()[f"atr{ATR_WINDOW}"] if state is not None else None
+        if ref is None or not atr:
+            raise ValueError("atr_band needs a reference price and ATR history")
+        return [alert("up", ref + mult * atr), alert("down", ref - mult * atr)]
+
+    if level is None:
+        if pct is None or ref is None:
+            raise ValueError("price_move needs a level, or a pct and a reference price")
+        level = ref * (1.0 + pct / 100.0)
+        direction = direction or ("up" if pct >= 0 else "down")
+    if direction is None:
+        if ref is None:
+            raise ValueError("direction is required when there is no reference price")
+        direction = "up" if level >= ref else "down"
+    return [alert(direction, level)]
+
+
+async def stream_events(engine: AlertEngine, after_seq: int, poll_interval: float) -> AsyncIterator[AlertEvent]:
+    """Yield events newer than ``after_seq`` as they fire (polls the engine's sequence)."""
+    seq = after_seq
+    while True:
+        if engine.seq > seq:
+            for ev in engine.events(after_seq=seq):
+                seq = ev.seq
+                yield ev
+        await asyncio.sleep(poll_interval)
+
+
+ALERT_STREAM_POLL = int(os.getenv("ALERT_STREAM_POLL_MS", "200")) / 1000.0
+
+alert_engine = AlertEngine(max_events=int(os.getenv("ALERT_EVENT_BUFFER", "1000")))
+alert_engine.interval = float(os.getenv("ALERT_FLUSH_SECONDS", "1"))
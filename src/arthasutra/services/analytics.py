@@ -1,12 +1,18 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import datetime as dt
+from dataclasses import dataclass, field
 from typing import Optional
 
 from sqlmodel import Session, select
 
-from arthasutra.db.models import Holding, Security, PriceEOD, QuoteLive
+from arthasutra.db.models import Holding, Security, PriceEOD, PriceSnapshot
 from arthasutra.services.live import get_fresh_ltp, is_market_session
+from arthasutra.services.quote_store import quote_store
+from arthasutra.services.valuation import ValuationContext, load_valuation_context
+
+
+FRESH_LTP_SECONDS = 120
 
 
 @dataclass
@@ -22,7 +28,17 @@ class PositionStats:
     price_source: str | None = None
 
 
+@dataclass
+class PortfolioValuation:
+    positions: list[PositionStats] = field(default_factory=list)
+    equity_value: float = 0.0
+    pnl_inr: float = 0.0
+
+
 def latest_and_prev_close(session: Session, security_id: int) -> tuple[Optional[float], Optional[float]]:
+    snap = session.get(PriceSnapshot, security_id)
+    if snap is not None and snap.last_close is not None:
+        return float(snap.last_close), float(snap.prev_close) if snap.prev_close is not None else None
     rows = session.exec(
         select(PriceEOD).where(PriceEOD.security_id == security_id).order_by(PriceEOD.date.desc()).limit(2)
     ).all()
@@ -33,29 +49,33 @@ def latest_and_prev_close(session: Session, security_id: int) -> tuple[Optional[
     return latest, prev
 
 
-def compute_position_stats(session: Session, holding: Holding) -> Optional[PositionStats]:
-    sec = session.get(Security, holding.security_id)
-    if not sec:
-        return None
-    last, prev = latest_and_prev_close(session, sec.id)
+def _is_fresh(ts: dt.datetime | None, now: dt.datetime, freshness_seconds: int = FRESH_LTP_SECONDS) -> bool:
+    if ts is None:
+        return False
+    # SQLite hands back naive datetimes; they are stored as UTC
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=dt.UTC)
+    return (now - ts).total_seconds() <= freshness_seconds
 
+
+def _position_stats(
+    holding: Holding,
+    sec: Security,
+    last: Optional[float],
+    prev: Optional[float],
+    fresh_ltp: Optional[float],
+    snapshot_ltp: Optional[float],
+) -> PositionStats:
     # Decide price source: live (fresh during session), snapshot (any quotes_live), else eod
-    price_source: str | None = None
-    ref_last: Optional[float] = None
-    # Try fresh LTP during session
-    fresh_ltp = get_fresh_ltp(session, sec.id) if is_market_session() else None
     if fresh_ltp is not None:
-        ref_last = fresh_ltp
+        ref_last: Optional[float] = fresh_ltp
         price_source = "live"
+    elif snapshot_ltp is not None:
+        ref_last = snapshot_ltp
+        price_source = "snapshot"
     else:
-        # Use any quotes_live snapshot regardless of session
-        qrow: QuoteLive | None = session.exec(select(QuoteLive).where(QuoteLive.security_id == sec.id)).first()
-        if qrow is not None and qrow.ltp is not None:
-            ref_last = float(qrow.ltp)
-            price_source = "snapshot"
-        else:
-            ref_last = last
-            price_source = "eod"
+        ref_last = last
+        price_source = "eod"
 
     last_price = float(ref_last) if ref_last is not None else float(holding.avg_price)
     pnl = float(holding.qty_total) * (last_price - float(holding.avg_price))
@@ -74,14 +94,52 @@ def compute_position_stats(session: Session, holding: Holding) -> Optional[Posit
     )
 
 
+def compute_position_stats(session: Session, holding: Holding) -> Optional[PositionStats]:
+    sec = session.get(Security, holding.security_id)
+    if not sec:
+        return None
+    last, prev = latest_and_prev_close(session, sec.id)
+
+    fresh_ltp = get_fresh_ltp(session, sec.id) if is_market_session() else None
+    snapshot_ltp: Optional[float] = None
+    if fresh_ltp is None:
+        # Use any live quote regardless of session
+        quote_store.ensure_warm(session)
+        q = quote_store.get(sec.id)
+        if q is not None:
+            snapshot_ltp = float(q.ltp)
+    return _position_stats(holding, sec, last, prev, fresh_ltp, snapshot_ltp)
+
+
+def context_position_stats(ctx: ValuationContext, holding: Holding, sec: Security) -> PositionStats:
+    """Stats for one holding of a loaded context, using its closes and quotes; no queries."""
+    last, prev = ctx.latest_and_prev_close(sec.id)
+    q = ctx.quotes.get(sec.id)
+    ltp = float(q.ltp) if q is not None and q.ltp is not None else None
+    fresh_ltp = ltp if (ctx.in_session and q is not None and _is_fresh(q.ts, ctx.now)) else None
+    return _position_stats(holding, sec, last, prev, fresh_ltp, None if fresh_ltp is not None else ltp)
+
+
+def value_context(ctx: ValuationContext) -> PortfolioValuation:
+    """Value every holding from an already loaded context; issues no queries."""
+    valuation = PortfolioValuation()
+    for holding, sec in ctx.holdings:
+        stats = context_position_stats(ctx, holding, sec)
+        valuation.positions.append(stats)
+        valuation.equity_value += stats.qty * stats.last_price
+        valuation.pnl_inr += stats.pnl_inr
+    return valuation
+
+
+def value_portfolio(session: Session, portfolio_id: int) -> PortfolioValuation:
+    """Value every holding of a portfolio in a fixed number of queries.
+
+    One query for holdings + securities, one windowed query for the latest two
+    closes per security; quotes come from the in-process quote store.
+    """
+    return value_context(load_valuation_context(session, portfolio_id))
+
+
 def portfolio_equity_and_pnl(session: Session, portfolio_id: int) -> tuple[float, float]:
-    holdings = session.exec(select(Holding).where(Holding.portfolio_id == portfolio_id)).all()
-    total_equity = 0.0
-    total_pnl = 0.0
-    for h in holdings:
-        stats = compute_position_stats(session, h)
-        if not stats:
-            continue
-        total_equity += stats.qty * stats.last_price
-        total_pnl += stats.pnl_inr
-    return total_equity, total_pnl
+    valuation = value_portfolio(session, portfolio_id)
+    return valuation.equity_value, valuation.pnl_inr
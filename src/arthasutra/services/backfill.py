@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import datetime as dt
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from typing import Callable, ContextManager, Iterable, Optional, Protocol
+
+import pandas as pd
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from arthasutra.db.models import Holding, PriceEOD, PriceSnapshot, Security
+from arthasutra.services.eod_ingest import EODBar, upsert_eod_bars
+from arthasutra.services.metrics import track_job
+
+
+RawBar = tuple  # (date, open, high, low, close, volume)
+
+
+class EODProvider(Protocol):
+    """Source of daily bars; ``end`` is exclusive, like yfinance."""
+
+    def fetch(self, symbol: str, exchange: str, start: dt.date, end: dt.date) -> list[RawBar]: ...
+
+
+class YFinanceProvider:
+    def fetch(self, symbol: str, exchange: str, start: dt.date, end: dt.date) -> list[RawBar]:
+        import yfinance as yf
+
+        from arthasutra.services.marketdata.yfinance_client import yahoo_symbol
+
+        hist = yf.Ticker(yahoo_symbol(symbol, exchange)).history(start=start, end=end, auto_adjust=False)
+        if hist is None or hist.empty:
+            return []
+        return [
+            (idx.date(), float(o), float(h), float(l), float(c), None if pd.isna(v) else float(v))
+            for idx, o, h, l, c, v in zip(
+                hist.index, hist["Open"], hist["High"], hist["Low"], hist["Close"], hist["Volume"]
+            )
+        ]
+
+
+@dataclass
+class BackfillTask:
+    security_id: int
+    symbol: str
+    exchange: str
+    start: dt.date
+    end: dt.date
+
+
+@dataclass
+class BackfillResult:
+    symbol: str
+    exchange: str
+    start: Optional[dt.date] = None
+    end: Optional[dt.date] = None
+    status: str = "pending"  # pending | ok | empty | up_to_date | error
+    rows: int = 0
+    attempts: int = 0
+    elapsed_ms: float = 0.0
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d["start"] = self.start.isoformat() if self.start else None
+        d["end"] = self.end.isoformat() if self.end else None
+        return d
+
+
+class RateLimiter:
+    """Spaces calls at least ``1 / rate_per_sec`` seconds apart across threads."""
+
+    def __init__(self, rate_per_sec: float) -> None:
+        self.interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def last_stored_dates(session: Session, security_ids: Iterable[int]) -> dict[int, dt.date]:
+    """Latest stored bar date per security: snapshot table first, MAX(date) for the rest."""
+    ids = list(set(security_ids))
+    out: dict[int, dt.date] = {}
+    for i in range(0, len(ids), 500):
+        chunk = ids[i : i + 500]
+        for sid, d in session.exec(
+            select(PriceSnapshot.security_id, PriceSnapshot.last_date).where(PriceSnapshot.security_id.in_(chunk))
+        ).all():
+            if d is not None:
+                out[sid] = d
+        rest = [sid for sid in chunk if sid not in out]
+        if rest:
+            for sid, d in session.exec(
+                select(PriceEOD.security_id, func.max(PriceEOD.date))
+                .where(PriceEOD.security_id.in_(rest))
+                .group_by(PriceEOD.security_id)
+            ).all():
+                out[sid] = d
+    return out
+
+
+def first_stored_dates(session: Session, security_ids: Iterable[int]) -> dict[int, dt.date]:
+    """Earliest stored bar date per security (MIN(date) on PriceEOD)."""
+    ids = list(set(security_ids))
+    out: dict[int, dt.date] = {}
+    for i in range(0, len(ids), 500):
+        for sid, d in session.exec(
+            select(PriceEOD.security_id, func.min(PriceEOD.date))
+            .where(PriceEOD.security_id.in_(ids[i : i + 500]))
+            .group_by(PriceEOD.security_id)
+        ).all():
+            out[sid] = d
+    return out
+
+
+def plan_backfill(
+    session: Session, securities: Iterable[Security], start: dt.date, end: dt.date, fill_head: bool = False
+) -> tuple[list[BackfillTask], list[BackfillResult]]:
+    """Work out the missing ranges per security: from the day after its last bar to ``end``.
+
+    With ``fill_head`` (the caller chose ``start``) the range from ``start`` to the
+    day before its first stored bar is planned too. Returns the tasks to fetch and
+    ``up_to_date`` results for securities with nothing missing.
+    """
+    secs = list(securities)
+    last = last_stored_dates(session, [s.id for s in secs])
+    first = first_stored_dates(session, [s.id for s in secs]) if fill_head else {}
+    tasks: list[BackfillTask] = []
+    skipped: list[BackfillResult] = []
+    for sec in secs:
+        f = first.get(sec.id)
+        head = f is not None and start < f
+        if head:
+            tasks.append(BackfillTask(sec.id, sec.symbol, sec.exchange, start, min(f, end)))
+        d = last.get(sec.id)
+        s = max(start, d + dt.timedelta(days=1)) if d else start
+        if s < end:
+            tasks.append(BackfillTask(sec.id, sec.symbol, sec.exchange, s, end))
+        elif not head:
+            skipped.append(BackfillResult(sec.symbol, sec.exchange, s, end, status="up_to_date"))
+    return tasks, skipped
+
+
+def _fetch_with_retry(
+    provider: EODProvider, task: BackfillTask, limiter: RateLimiter, retries: int, backoff: float
+) -> tuple[list[RawBar], BackfillResult]:
+    res = BackfillResult(task.symbol, task.exchange, task.start, task.end)
+    t0 = time.perf_counter()
+    for attempt in range(1, retries + 2):
+        res.attempts = attempt
+        limiter.wait()
+        try:
+            bars = provider.fetch(task.symbol, task.exchange, task.start, task.end)
+            res.status = "ok" if bars else "empty"
+            res.error = None
+            res.elapsed_ms = (time.perf_counter() - t0) * 1000.0
+            return bars, res
+        except Exception as e:  # provider/network errors are retried
+            res.status = "error"
+            res.error = str(e)
+            if attempt <= retries:
+                time.sleep(backoff * (2 ** (attempt - 1)))
+    res.elapsed_ms = (time.perf_counter() - t0) * 1000.0
+    return [], res
+
+
+def run_backfill(
+    session: Session,
+    tasks: list[BackfillTask],
+    provider: Optional[EODProvider] = None,
+    max_workers: int = 4,
+    rate_per_sec: float = 2.0,
+    retries: int = 2,
+    backoff: float = 1.0,
+    on_progress: Optional[Callable[[BackfillResult], None]] = None,
+) -> list[BackfillResult]:
+    """Fetch tasks on a bounded thread pool and upsert each symbol as it completes.
+
+    Network I/O happens on worker threads; all database writes stay on the calling
+    thread's session, committed per symbol so progress survives a failure mid-run.
+    """
+    provider = provider or YFinanceProvider()
+    limiter = RateLimiter(rate_per_sec)
+    results: list[BackfillResult] = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="eod-backfill") as pool:
+        futures = {pool.submit(_fetch_with_retry, provider, t, limiter, retries, backoff): t for t in tasks}
+        for fut in as_completed(futures):
+            task = futures[fut]
+            bars, res = fut.result()
+            if bars:
+                try:
+                    res.rows = upsert_eod_bars(
+                        session,
+                        (
+                            EODBar(task.security_id, b[0], b[1], b[2], b[3], b[4], b[5])
+                            for b in bars
+                            if task.start <= b[0] < task.end
+                        ),
+                        on_conflict="nothing",
+                    ).written
+                    session.commit()
+                except Exception as e:
+                    session.rollback()
+                    res.status, res.error, res.rows = "error", str(e), 0
+            results.append(res)
+            if on_progress:
+                on_progress(res)
+    return results
+
+
+def resolve_universe(session: Session, universe: str = "holdings") -> list[Security]:
+    """Securities to refresh: ``holdings`` (held in any portfolio) or ``all``."""
+    if universe == "all":
+        return list(session.exec(select(Security).order_by(Security.id)).all())
+    held = select(Holding.security_id).distinct()
+    return list(session.exec(select(Security).where(Security.id.in_(held)).order_by(Security.id)).all())
+
+
+@dataclass
+class BackfillJob:
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    status: str = "running"  # running | done | failed
+    total: int = 0
+    started_at: dt.datetime = field(default_factory=lambda: dt.datetime.now(dt.UTC))
+    finished_at: Optional[dt.datetime] = None
+    results: list[BackfillResult] = field(default_factory=list)
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        done = len(self.results)
+        return {
+            "id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "done": done,
+            "rows": sum(r.rows for r in self.results),
+            "errors": sum(1 for r in self.results if r.status == "error"),
+            "started_at": self.started_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error,
+            "results": [r.to_dict() for r in self.results],
+        }
+
+
+_jobs: dict[str, BackfillJob] = {}
+_MAX_JOBS = 20
+
+
+def get_job(job_id: str) -> Optional[BackfillJob]:
+    return _jobs.get(job_id)
+
+
+def start_backfill_job(
+    session_factory: Callable[[], ContextManager[Session]],
+    start: dt.date,
+    end: dt.date,
+    universe: str = "holdings",
+    provider: Optional[EODProvider] = None,
+    fill_head: bool = False,
+    **kwargs,
+) -> BackfillJob:
+    """Run a backfill of ``universe`` on a background thread; poll progress via :func:`get_job`."""
+    job = BackfillJob()
+    _jobs[job.id] = job
+    while len(_jobs) > _MAX_JOBS:
+        _jobs.pop(next(iter(_jobs)))
+
+    def _run() -> None:
+        try:
+            with track_job("eod_backfill"), session_factory() as s:
+                secs = resolve_universe(s, universe)
+                tasks, skipped = plan_backfill(s, secs, start, end, fill_head=fill_head)
+                # One result per planned range (a security may need two)
+                job.total = len(tasks) + len(skipped)
+                job.results.extend(skipped)
+                run_backfill(s, tasks, provider=provider, on_progress=job.results.append, **kwargs)
+            job.status = "done"
+        except Exception as e:
+            job.status, job.error = "failed", str(e)
+        finally:
+            job.finished_at = dt.datetime.now(dt.UTC)
+
+    threading.Thread(target=_run, name=f"eod-backfill-{job.id}", daemon=True).start()
+    return job
@@ -0,0 +1,316 @@
+"""Vectorized backtests of the decision-engine rules over stored EOD history.
+
+Prices are loaded once into a ``(securities x dates)`` close matrix; indicators,
+signals, position sizes, cash and equity are then whole-matrix numpy operations with
+no per-bar Python loop. The rules are :func:`decision_engine.rule_signals`, the same
+calculator the live dashboard uses.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, fields, replace
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+from sqlmodel import Session, select
+
+from arthasutra.db.models import PriceEOD, Security
+from arthasutra.services.columnar_store import get_columnar_store
+from arthasutra.services.decision_engine import ACTION_NAMES, ADD, EXIT, TRIM, RuleParams, rule_signals
+from arthasutra.services.indicators import sma
+
+
+TRADING_DAYS = 252
+_ID_CHUNK = 500
+
+
+@dataclass(frozen=True)
+class BacktestParams:
+    sma_fast: int = 50
+    sma_slow: int = 200
+    trim_extension: float = 0.08
+    add_min_score: int = 60
+    trim_fraction: float = 0.1
+    add_fraction: float = 0.1
+    # Signals are acted on every N bars (the live engine is consulted, not auto-traded daily)
+    rebalance_every: int = 21
+    initial_capital: float = 1_000_000.0
+    cost_bps: float = 10.0
+
+    @property
+    def rules(self) -> RuleParams:
+        return RuleParams(
+            sma_fast=self.sma_fast,
+            sma_slow=self.sma_slow,
+            trim_extension=self.trim_extension,
+            add_min_score=self.add_min_score,
+            trim_fraction=self.trim_fraction,
+            add_fraction=self.add_fraction,
+        )
+
+
+@dataclass
+class PriceMatrix:
+    dates: np.ndarray  # datetime64[D], ascending
+    security_ids: np.ndarray
+    symbols: list[str]
+    close: np.ndarray  # (n_securities, n_dates); NaN where a security has no bar
+
+    def start_index(self, start: Optional[dt.date]) -> int:
+        if start is None:
+            return 0
+        return int(np.searchsorted(self.dates, np.datetime64(start, "D"), side="left"))
+
+
+def _read_db(session: Session, ids: list[int], since: dt.date, end: dt.date) -> Iterable[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    conn = session.connection()
+    for i in range(0, len(ids), _ID_CHUNK):
+        rows = conn.execute(
+            select(PriceEOD.security_id, PriceEOD.date, PriceEOD.close).where(
+                PriceEOD.security_id.in_(ids[i : i + _ID_CHUNK]), PriceEOD.date >= since, PriceEOD.date <= end
+            )
+        ).all()
+        if rows:
+            sids, dates, closes = zip(*rows)
+            yield np.asarray(sids, dtype=np.int64), np.asarray(dates, dtype="M8[D]"), np.asarray(closes, dtype=float)
+
+
+def load_price_matrix(
+    session: Session,
+    securities: Sequence[Security],
+    start: dt.date,
+    end: dt.date,
+    warmup_bars: int = 0,
+) -> PriceMatrix:
+    """Closes for ``securities`` between ``start`` and ``end``, plus ``warmup_bars`` of look-back.
+
+    Securities exported to the columnar store are read from their memory-mapped files;
+    the rest come from PriceEOD in a few chunked queries.
+    """
+    # Trading days -> calendar days, with slack for holidays
+    since = start - dt.timedelta(days=int(warmup_bars * 7 / 5) + 14) if warmup_bars else start
+    store = get_columnar_store()
+    parts: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+    from_db: list[int] = []
+    for sec in securities:
+        hist = store.read(sec.id, since, end) if store is not None else None
+        if hist is None:
+            from_db.append(sec.id)
+        elif len(hist.close):
+            n = len(hist.close)
+            parts.append((np.full(n, sec.id, dtype=np.int64), np.asarray(hist.dates, dtype="M8[D]"), np.asarray(hist.close, dtype=float)))
+    parts.extend(_read_db(session, from_db, since, end))
+
+    order = sorted(range(len(securities)), key=lambda i: securities[i].id)
+    ids = np.array([securities[i].id for i in order], dtype=np.int64)
+    symbols = [f"{securities[i].exchange}:{securities[i].symbol}" for i in order]
+    if not parts:
+        return PriceMatrix(np.empty(0, dtype="M8[D]"), ids, symbols, np.empty((len(ids), 0)))
+    sids = np.concatenate([p[0] for p in parts])
+    dates = np.concatenate([p[1] for p in parts])
+    closes = np.concatenate([p[2] for p in parts])
+    udates, cols = np.unique(dates, return_inverse=True)
+    close = np.full((len(ids), len(udates)), np.nan)
+    close[np.searchsorted(ids, sids), cols] = closes
+    return PriceMatrix(udates, ids, symbols, close)
+
+
+def _ffill(a: np.ndarray) -> np.ndarray:
+    """Carry the last known close forward along dates (leading gaps stay NaN)."""
+    idx = np.where(np.isnan(a), 0, np.arange(a.shape[1]))
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return a[np.arange(a.shape[0])[:, None], idx]
+
+
+@dataclass
+class BacktestResult:
+    params: BacktestParams
+    dates: np.ndarray
+    equity: np.ndarray
+    cash: np.ndarray
+    stats: dict
+    # Trade log as parallel arrays: (security row, date column, qty delta, price, action code; -1 = initial buy)
+    trade_rows: np.ndarray
+    trade_cols: np.ndarray
+    trade_qty: np.ndarray
+    trade_price: np.ndarray
+    trade_code: np.ndarray
+    symbols: list[str]
+
+    def trades(self, limit: Optional[int] = None) -> list[dict]:
+        n = len(self.trade_rows) if limit is None else min(limit, len(self.trade_rows))
+        return [
+            {
+                "date": str(self.dates[self.trade_cols[i]]),
+                "symbol": self.symbols[self.trade_rows[i]],
+                "action": "BUY" if self.trade_code[i] < 0 else ACTION_NAMES[self.trade_code[i]],
+                "qty": float(self.trade_qty[i]),
+                "price": float(self.trade_price[i]),
+            }
+            for i in range(n)
+        ]
+
+    def to_dict(self, max_trades: Optional[int] = 1000) -> dict:
+        return {
+            "params": asdict(self.params),
+            "stats": self.stats,
+            "equity_curve": [{"date": str(d), "equity": float(e)} for d, e in zip(self.dates, self.equity)],
+            "trades": self.trades(max_trades),
+        }
+
+
+def compute_stats(dates: np.ndarray, equity: np.ndarray, traded_value: float) -> dict:
+    """CAGR, volatility, Sharpe/Sortino (rf = 0), max drawdown and annual turnover."""
+    out: dict = {"start": str(dates[0]) if len(dates) else None, "end": str(dates[-1]) if len(dates) else None}
+    if len(equity) < 2 or equity[0] <= 0:
+        return out | {"total_return": 0.0, "cagr": None, "ann_vol": None, "sharpe": None, "sortino": None, "max_drawdown": 0.0, "turnover": 0.0}
+    rets = equity[1:] / equity[:-1] - 1.0
+    years = max(int((dates[-1] - dates[0]).astype(int)) / 365.25, 1e-9)
+    total = float(equity[-1] / equity[0] - 1.0)
+    std = float(rets.std(ddof=1)) if len(rets) > 1 else 0.0
+    downside = float(np.sqrt(np.mean(np.minimum(rets, 0.0) ** 2)))
+    mean = float(rets.mean())
+    drawdown = equity / np.maximum.accumulate(equity) - 1.0
+    return out | {
+        "total_return": total,
+        "cagr": float((equity[-1] / equity[0]) ** (1.0 / years) - 1.0) if equity[-1] > 0 else -1.0,
+        "ann_vol": std * math.sqrt(TRADING_DAYS),
+        "sharpe": mean / std * math.sqrt(TRADING_DAYS) if std > 0 else None,
+        "sortino": mean / downside * math.sqrt(TRADING_DAYS) if downside > 0 else None,
+        "max_drawdown": float(drawdown.min()),
+        "turnover": traded_value / float(equity.mean()) / years,
+    }
+
+
+def run_backtest(
+    matrix: PriceMatrix,
+    params: BacktestParams = BacktestParams(),
+    start: Optional[dt.date] = None,
+    _sma_cache: Optional[dict] = None,
+) -> BacktestResult:
+    """Replay KEEP/ADD/TRIM/EXIT from ``start`` on an equal-weight portfolio of the matrix.
+
+    Every security with a close on the first day gets an equal share of the capital.
+    Signals computed on a rebalance day's close are filled at the next bar's close
+    (no look-ahead): EXIT sells everything, TRIM/ADD scale the position by the
+    configured fractions. ADDs are funded from cash, which may go negative (reported
+    as ``min_cash``). Exited positions stay closed, as the live engine only advises on
+    held positions.
+    """
+    s0 = matrix.start_index(start)
+    filled = _ffill(matrix.close)
+
+    def _sma(window: int) -> np.ndarray:
+        if _sma_cache is None:
+            return sma(filled, window)
+        if window not in _sma_cache:
+            _sma_cache[window] = sma(filled, window)
+        return _sma_cache[window]
+
+    fast, slow = _sma(params.sma_fast)[:, s0:], _sma(params.sma_slow)[:, s0:]
+    raw = matrix.close[:, s0:]
+    price = filled[:, s0:]
+    dates = matrix.dates[s0:]
+    n_sec, n = price.shape
+    if n == 0:
+        none, idx = np.empty(0), np.empty(0, dtype=int)
+        return BacktestResult(params, dates, none, none, compute_stats(dates, none, 0.0), idx, idx, none, none, idx, matrix.symbols)
+
+    codes, _ = rule_signals(price, fast, slow, params.rules)
+    on_day = np.zeros(n, dtype=bool)
+    on_day[:: max(1, params.rebalance_every)] = True
+    # Only act on real bars: a carried-forward close is not a signal
+    codes = np.where(on_day[None, :] & ~np.isnan(raw), codes, 0)
+    factor = np.ones((n_sec, n))
+    step = np.select([codes == EXIT, codes == TRIM, codes == ADD], [0.0, 1.0 - params.trim_fraction, 1.0 + params.add_fraction], 1.0)
+    # Fill at the next bar
+    factor[:, 1:] = step[:, :-1]
+
+    p0 = price[:, 0]
+    live = ~np.isnan(p0) & (p0 > 0)
+    qty0 = np.zeros(n_sec)
+    if live.any():
+        qty0[live] = params.initial_capital / live.sum() / p0[live]
+    qty = qty0[:, None] * np.cumprod(factor, axis=1)
+    dq = np.diff(qty, axis=1, prepend=0.0)
+
+    px = np.nan_to_num(price)
+    flow = dq * px
+    cost = np.abs(flow) * (params.cost_bps / 10_000.0)
+    cash = params.initial_capital - np.cumsum(flow.sum(axis=0) + cost.sum(axis=0))
+    equity = (qty * px).sum(axis=0) + cash
+
+    rows, cols = np.nonzero(np.abs(dq) > 1e-12)
+    order = np.lexsort((rows, cols))
+    rows, cols = rows[order], cols[order]
+    trade_code = np.where(cols == 0, -1, codes[rows, np.maximum(cols - 1, 0)])
+    traded_after_open = float(np.abs(flow[:, 1:]).sum())
+    stats = compute_stats(dates, equity, traded_after_open)
+    stats.update(
+        {
+            "securities": int(live.sum()),
+            "trades": int((cols > 0).sum()),
+            "costs": float(cost.sum()),
+            "min_cash": float(cash.min()),
+            "final_equity": float(equity[-1]),
+        }
+    )
+    return BacktestResult(params, dates, equity, cash, stats, rows, cols, dq[rows, cols], price[rows, cols], trade_code, matrix.symbols)
+
+
+# -- parameter sweeps ---------------------------------------------------------
+
+_sweep_matrix: Optional[PriceMatrix] = None
+_sweep_start: Optional[dt.date] = None
+_sweep_cache: dict = {}
+
+
+def _init_sweep_worker(matrix: Optional[PriceMatrix], start: Optional[dt.date]) -> None:
+    # The matrix is shipped once per worker, not once per grid point
+    global _sweep_matrix, _sweep_start
+    _sweep_matrix, _sweep_start = matrix, start
+    _sweep_cache.clear()
+
+
+def _sweep_point(params: BacktestParams) -> dict:
+    assert _sweep_matrix is not None
+    res = run_backtest(_sweep_matrix, params, _sweep_start, _sma_cache=_sweep_cache)
+    return {"params": asdict(params), "stats": res.stats}
+
+
+def expand_grid(grid: dict[str, Sequence], base: BacktestParams = BacktestParams()) -> list[BacktestParams]:
+    """Cartesian product of ``grid`` over ``base``; fast/slow pairs with fast >= slow are dropped."""
+    known = {f.name for f in fields(BacktestParams)}
+    unknown = set(grid) - known
+    if unknown:
+        raise ValueError(f"unknown parameters: {', '.join(sorted(unknown))}")
+    keys = list(grid)
+    points = [replace(base, **dict(zip(keys, combo))) for combo in itertools.product(*(grid[k] for k in keys))]
+    return [p for p in points if p.sma_fast < p.sma_slow]
+
+
+def run_sweep(
+    matrix: PriceMatrix,
+    grid: dict[str, Sequence],
+    base: BacktestParams = BacktestParams(),
+    start: Optional[dt.date] = None,
+    max_workers: Optional[int] = None,
+) -> list[dict]:
+    """Backtest every grid point, spread over a process pool; best Sharpe first."""
+    points = expand_grid(grid, base)
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(points)))
+    if workers == 1:
+        _init_sweep_worker(matrix, start)
+        try:
+            results = [_sweep_point(p) for p in points]
+        finally:
+            _init_sweep_worker(None, None)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_sweep_worker, initargs=(matrix, start)) as pool:
+            results = list(pool.map(_sweep_point, points, chunksize=max(1, len(points) // (workers * 4))))
+    results.sort(key=lambda r: (r["stats"].get("sharpe") is None, -(r["stats"].get("sharpe") or 0.0)))
+    return results
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import datetime as dt
+import os
+import threading
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+from sqlmodel import Session, select
+
+from arthasutra.db.models import PriceEOD
+from arthasutra.services.price_cache import PriceHistory
+
+
+# One fixed-width record per bar; files are plain arrays of these, oldest first
+BAR_DTYPE = np.dtype(
+    [
+        ("date", "<M8[D]"),
+        ("open", "<f8"),
+        ("high", "<f8"),
+        ("low", "<f8"),
+        ("close", "<f8"),
+        ("volume", "<f8"),
+    ]
+)
+
+Bar = tuple  # (date, open, high, low, close, volume)
+
+
+class ColumnarPriceStore:
+    """Per-security, memory-mapped EOD bar files.
+
+    Reads return zero-copy column views into the mapping; appends of newer bars are
+    plain file appends, anything else (back-fills, corrections) rewrites the file
+    atomically. Files are derived data: PriceEOD stays the source of truth.
+    """
+
+    def __init__(self, root: str | os.PathLike) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._maps: dict[int, tuple[int, int, np.memmap]] = {}
+
+    def _path(self, security_id: int) -> Path:
+        return self.root / f"{int(security_id)}.bars"
+
+    def has(self, security_id: int) -> bool:
+        return self._path(security_id).exists()
+
+    def _map(self, security_id: int) -> Optional[np.ndarray]:
+        path = self._path(security_id)
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        if st.st_size == 0:
+            return np.empty(0, dtype=BAR_DTYPE)
+        cached = self._maps.get(security_id)
+        if cached is not None and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        mm = np.memmap(path, dtype=BAR_DTYPE, mode="r")
+        self._maps[security_id] = (st.st_size, st.st_mtime_ns, mm)
+        return mm
+
+    def read(
+        self,
+        security_id: int,
+        start: Optional[dt.date] = None,
+        end: Optional[dt.date] = None,
+    ) -> Optional[PriceHistory]:
+        """Bars with ``start <= date <= end`` as zero-copy views, or None if not stored."""
+        recs = self._map(security_id)
+        if recs is None:
+            return None
+        dates = recs["date"]
+        lo = 0 if start is None else int(np.searchsorted(dates, np.datetime64(start, "D"), side="left"))
+        hi = len(recs) if end is None else int(np.searchsorted(dates, np.datetime64(end, "D"), side="right"))
+        return self._history(recs[lo:hi], complete=(lo == 0))
+
+    def read_tail(self, security_id: int, bars: int) -> Optional[PriceHistory]:
+        recs = self._map(security_id)
+        if recs is None:
+            return None
+        lo = max(len(recs) - bars, 0)
+        return self._history(recs[lo:], complete=(lo == 0))
+
+    @staticmethod
+    def _history(recs: np.ndarray, complete: bool) -> PriceHistory:
+        return PriceHistory(
+            recs["date"], recs["open"], recs["high"], recs["low"], recs["close"], recs["volume"], complete=complete
+        )
+
+    def append(self, security_id: int, bars: Iterable[Bar], overwrite: bool = True) -> int:
+        """Add bars for one security; returns the number of records written or replaced.
+
+        With ``overwrite=False`` dates already stored are left untouched.
+        """
+        new = np.array(
+            [(np.datetime64(b[0], "D"), b[1], b[2], b[3], b[4], np.nan if b[5] is None else b[5]) for b in bars],
+            dtype=BAR_DTYPE,
+        )
+        if not len(new):
+            return 0
+        # Sort and collapse repeated dates, keeping the last occurrence
+        order = np.argsort(new["date"], kind="stable")
+        new = new[order]
+        keep = np.append(new["date"][1:] != new["date"][:-1], True)
+        new = new[keep]
+
+        path = self._path(security_id)
+        with self._lock:
+            last = self._last_date(path)
+            if last is None or new["date"][0] > last:
+                with open(path, "ab") as fh:
+                    new.tofile(fh)
+                return len(new)
+            existing = np.fromfile(path, dtype=BAR_DTYPE)
+            if overwrite:
+                merged = np.concatenate([existing[~np.isin(existing["date"], new["date"])], new])
+                written = len(new)
+            else:
+                fresh = new[~np.isin(new["date"], existing["date"])]
+                merged = np.concatenate([existing, fresh])
+                written = len(fresh)
+            merged = merged[np.argsort(merged["date"], kind="stable")]
+            tmp = path.with_suffix(".tmp")
+            merged.tofile(tmp)
+            os.replace(tmp, path)
+            self._maps.pop(security_id, None)
+            return written
+
+    @staticmethod
+    def _last_date(path: Path) -> Optional[np.datetime64]:
+        try:
+            with open(path, "rb") as fh:
+                fh.seek(0, os.SEEK_END)
+                size = fh.tell()
+                if size < BAR_DTYPE.itemsize:
+                    return None
+                fh.seek(size - BAR_DTYPE.itemsize)
+                return np.frombuffer(fh.read(BAR_DTYPE.itemsize), dtype=BAR_DTYPE)["date"][0]
+        except FileNotFoundError:
+            return None
+
+    def replace(self, security_id: int, bars: Sequence[Bar]) -> int:
+        """Overwrite a security's file with exactly ``bars``."""
+        path = self._path(security_id)
+        with self._lock:
+            if path.exists():
+                path.unlink()
+            self._maps.pop(security_id, None)
+        return self.append(security_id, bars)
+
+
+def rebuild_from_db(session: Session, store: ColumnarPriceStore, security_ids: Optional[Iterable[int]] = None) -> int:
+    """Export PriceEOD into the columnar store, one security at a time. Returns bars written."""
+    if security_ids is None:
+        security_ids = session.exec(select(PriceEOD.security_id).distinct()).all()
+    total = 0
+    for sid in security_ids:
+        rows = session.exec(
+            select(PriceEOD.date, PriceEOD.open, PriceEOD.high, PriceEOD.low, PriceEOD.close, PriceEOD.volume)
+            .where(PriceEOD.security_id == sid)
+            .order_by(PriceEOD.date.asc())
+        ).all()
+        total += store.replace(sid, rows)
+    return total
+
+
+_store: Optional[ColumnarPriceStore] = None
+_store_lock = threading.Lock()
+
+
+def get_columnar_store() -> Optional[ColumnarPriceStore]:
+    """The process-wide store rooted at ``COLUMNAR_STORE_DIR``, or None when unset (disabled)."""
+    global _store
+    root = os.getenv("COLUMNAR_STORE_DIR")
+    if not root:
+        return None
+    with _store_lock:
+        if _store is None or _store.root != Path(root):
+            _store = ColumnarPriceStore(root)
+        return _store
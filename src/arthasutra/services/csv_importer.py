@@ -44,6 +44,25 @@ def _num(value: str | None) -> Optional[float]:
         return None
 
 
+# Header aliases per field, in priority order; resolved once per file
+HEADER_ALIASES: dict[str, tuple[str, ...]] = {
+    "symbol": ("symbol", "Symbol", "Ticker", "Instrument", "instrument"),
+    "name": ("name", "Name"),
+    "exchange": ("exchange", "Exchange"),
+    "qty": ("qty", "Qty.", "quantity", "Quantity", "Shares", "shares"),
+    "avg_price": ("avg_price", "Avg. cost", "Avg Buy Price (Rs.)", "avgPrice", "average_price"),
+    "ltp": ("LTP", "Current Price (Rs.)", "ltp"),
+    "sector": ("sector", "Sector"),
+}
+
+
+def resolve_header(fieldnames: Iterable[str] | None) -> dict[str, list[int]]:
+    """Map each field to the column indexes of its aliases present in the header."""
+    # A repeated column name resolves to its last occurrence, as csv.DictReader does
+    pos = {name: i for i, name in enumerate(fieldnames or [])}
+    return {field: [pos[a] for a in aliases if a in pos] for field, aliases in HEADER_ALIASES.items()}
+
+
 def parse_positions_csv(file: BytesIO | TextIOBase) -> List[CSVRow]:
     # Normalize to text reader
     if isinstance(file, BytesIO):
@@ -58,39 +77,28 @@ def parse_positions_csv(file: BytesIO | TextIOBase) -> List[CSVRow]:
     else:
         raise ValueError("Unsupported file object")
 
-    reader = csv.DictReader(stream, skipinitialspace=True)
+    reader = csv.reader(stream, skipinitialspace=True)
+    header = next(reader, None)
+    cols = resolve_header(header)
+
+    def first(row: list[str], field: str) -> Optional[str]:
+        # First non-empty value among the field's aliases, as the per-row lookups did
+        for i in cols[field]:
+            if i < len(row) and row[i]:
+                return row[i]
+        return None
+
     rows: list[CSVRow] = []
     for row in reader:
-        # Header aliases
-        symbol_field = (
-            row.get("symbol")
-            or row.get("Symbol")
-            or row.get("Ticker")
-            or row.get("Instrument")
-            or row.get("instrument")
-            or ""
-        ).strip()
-        name_field = (row.get("name") or row.get("Name") or None)
-        exchange_field = (row.get("exchange") or row.get("Exchange") or "").strip()
-        qty_field = (
-            row.get("qty")
-            or row.get("Qty.")
-            or row.get("quantity")
-            or row.get("Quantity")
-            or row.get("Shares")
-            or row.get("shares")
-            or "0"
-        )
-        avg_field = (
-            row.get("avg_price")
-            or row.get("Avg. cost")
-            or row.get("Avg Buy Price (Rs.)")
-            or row.get("avgPrice")
-            or row.get("average_price")
-            or "0"
-        )
-        ltp_field = row.get("LTP") or row.get("Current Price (Rs.)") or row.get("ltp")
-        sector_field = (row.get("sector") or row.get("Sector") or None)
+        if not row:
+            continue
+        symbol_field = (first(row, "symbol") or "").strip()
+        name_field = first(row, "name")
+        exchange_field = (first(row, "exchange") or "").strip()
+        qty_field = first(row, "qty") or "0"
+        avg_field = first(row, "avg_price") or "0"
+        ltp_field = first(row, "ltp")
+        sector_field = first(row, "sector")
 
         if not symbol_field:
             continue
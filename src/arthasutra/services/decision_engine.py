@@ -1,11 +1,13 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Optional
+from typing import Mapping, Optional
 
-from sqlmodel import Session, select
+import numpy as np
+from sqlmodel import Session
 
-from arthasutra.db.models import Holding, Security, PriceEOD
+from arthasutra.services.indicator_state import IncrementalIndicators, load_indicator_states
+from arthasutra.services.valuation import ValuationContext, load_valuation_context
 
 
 @dataclass
@@ -17,87 +19,114 @@ class Action:
     score: Optional[int] = None
 
 
-def _sma(values: list[float], window: int) -> Optional[float]:
-    if len(values) < window:
-        return None
-    return sum(values[-window:]) / window
-
-
-def _get_closes(session: Session, security_id: int, limit: int = 220) -> list[float]:
-    rows = session.exec(
-        select(PriceEOD).where(PriceEOD.security_id == security_id).order_by(PriceEOD.date.asc())
-    ).all()
-    closes = [float(r.close) for r in rows][-limit:]
-    return closes
-
-
-def propose_actions(session: Session, portfolio_id: int) -> list[dict]:
-    holdings = session.exec(select(Holding).where(Holding.portfolio_id == portfolio_id)).all()
-    actions: list[dict] = []
-    for h in holdings:
-        sec: Security | None = session.get(Security, h.security_id)
-        if not sec:
-            continue
-        closes = _get_closes(session, sec.id)
-        if not closes:
-            actions.append({
-                "action": "KEEP",
-                "symbol": f"{sec.exchange}:{sec.symbol}",
-                "reason": "no_price_history",
-                "qty": None,
-                "score": 50,
-            })
-            continue
-        last = closes[-1]
-        sma50 = _sma(closes, 50)
-        sma200 = _sma(closes, 200)
-        score = 50
-        if sma50:
-            score += 10 if last > sma50 else -10
-        if sma200:
-            score += 10 if last > sma200 else -10
-
+@dataclass(frozen=True)
+class RuleParams:
+    sma_fast: int = 50
+    sma_slow: int = 200
+    trim_extension: float = 0.08  # TRIM when last > (1 + x) * fast SMA
+    add_min_score: int = 60
+    trim_fraction: float = 0.1
+    add_fraction: float = 0.1
+
+
+# Action codes returned by rule_signals
+KEEP, ADD, TRIM, EXIT = 0, 1, 2, 3
+ACTION_NAMES = ("KEEP", "ADD", "TRIM", "EXIT")
+
+
+def rule_signals(
+    last: np.ndarray, sma_fast: np.ndarray, sma_slow: np.ndarray, params: RuleParams = RuleParams()
+) -> tuple[np.ndarray, np.ndarray]:
+    """Action codes and trend scores for arrays of closes and their SMAs.
+
+    Element-wise over any shape, so the live engine evaluates the latest column and the
+    backtest the whole (securities x dates) matrix with the same rules. NaN SMAs mean
+    "not enough history" and contribute nothing to the score.
+    """
+    has_fast = ~np.isnan(sma_fast) & (sma_fast != 0)
+    has_slow = ~np.isnan(sma_slow) & (sma_slow != 0)
+    with np.errstate(invalid="ignore"):
+        score = (
+            50
+            + np.where(has_fast, np.where(last > sma_fast, 10, -10), 0)
+            + np.where(has_slow, np.where(last > sma_slow, 10, -10), 0)
+        )
         # Rules v1 (simple):
         # - EXIT if below 200SMA and score low
         # - TRIM if extended vs 50SMA by 8%
         # - ADD if above 50SMA and score high
-        if sma200 and last < sma200 and score < 50:
-            actions.append({
-                "action": "EXIT",
-                "symbol": f"{sec.exchange}:{sec.symbol}",
-                "reason": "below_200sma",
-                "qty": h.qty_total,
-                "score": max(score, 0),
-            })
+        exit_ = has_slow & (last < sma_slow) & (score < 50)
+        trim = ~exit_ & has_fast & (last > (1.0 + params.trim_extension) * sma_fast)
+        add = ~exit_ & ~trim & has_fast & (last >= sma_fast) & (score >= params.add_min_score)
+    codes = np.select([exit_, trim, add], [EXIT, TRIM, ADD], KEEP)
+    return codes, score
+
+
+def _nan(v: Optional[float]) -> float:
+    return np.nan if v is None else float(v)
+
+
+def propose_actions(
+    session: Session, portfolio_id: int, ctx: ValuationContext | None = None, intraday: bool = False
+) -> list[dict]:
+    """Rule-based actions per holding from the persisted incremental indicator state.
+
+    Cost does not depend on history length: SMAs are read from ``indicatorstate``
+    (folded from PriceEOD only when missing or stale). With ``intraday`` during
+    market hours, a live quote newer than the last EOD bar is evaluated as a
+    provisional bar.
+    """
+    if ctx is None:
+        ctx = load_valuation_context(session, portfolio_id)
+    states = load_indicator_states(session, [sec.id for _, sec in ctx.holdings])
+    return context_actions(ctx, states, intraday=intraday)
+
+
+def context_actions(
+    ctx: ValuationContext, states: Mapping[int, IncrementalIndicators], intraday: bool = False
+) -> list[dict]:
+    """:func:`propose_actions` on an already loaded context and states; issues no queries."""
+    params = RuleParams()
+    n = len(ctx.holdings)
+    last, fast, slow = np.full(n, np.nan), np.full(n, np.nan), np.full(n, np.nan)
+    for i, (_, sec) in enumerate(ctx.holdings):
+        state = states.get(sec.id)
+        if state is None:
             continue
-
-        if sma50 and last > 1.08 * sma50:
+        values = state.values()
+        q = ctx.quotes.get(sec.id) if intraday and ctx.in_session else None
+        if q is not None and state.as_of is not None and q.ts.date() > state.as_of:
+            values = state.provisional(q.ltp)
+        last[i] = _nan(values["close"])
+        fast[i] = _nan(values.get(f"sma{params.sma_fast}"))
+        slow[i] = _nan(values.get(f"sma{params.sma_slow}"))
+    codes, scores = rule_signals(last, fast, slow, params)
+    actions: list[dict] = []
+    for i, (h, sec) in enumerate(ctx.holdings):
+        symbol = f"{sec.exchange}:{sec.symbol}"
+        if sec.id not in states:
+            actions.append({"action": "KEEP", "symbol": symbol, "reason": "no_price_history", "qty": None, "score": 50})
+            continue
+        code, score = int(codes[i]), int(scores[i])
+        if code == EXIT:
+            actions.append({"action": "EXIT", "symbol": symbol, "reason": "below_200sma", "qty": h.qty_total, "score": max(score, 0)})
+        elif code == TRIM:
             actions.append({
                 "action": "TRIM",
-                "symbol": f"{sec.exchange}:{sec.symbol}",
+                "symbol": symbol,
                 "reason": "extended_vs_50sma",
-                "qty": round(h.qty_total * 0.1, 4),
+                "qty": round(h.qty_total * params.trim_fraction, 4),
                 "score": min(score + 5, 100),
             })
-            continue
-
-        if sma50 and last >= sma50 and score >= 60:
+        elif code == ADD:
             actions.append({
                 "action": "ADD",
-                "symbol": f"{sec.exchange}:{sec.symbol}",
+                "symbol": symbol,
                 "reason": "trend_ok_above_50sma",
-                "qty": round(h.qty_total * 0.1, 4),
+                "qty": round(h.qty_total * params.add_fraction, 4),
                 "score": min(score + 5, 100),
             })
-            continue
-
-        actions.append({
-            "action": "KEEP",
-            "symbol": f"{sec.exchange}:{sec.symbol}",
-            "reason": "default",
-            "qty": None,
-            "score": score,
-        })
+        else:
+            actions.append({"action": "KEEP", "symbol": symbol, "reason": "default", "qty": None, "score": score})
 
     return actions
-
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import gzip
+import hashlib
+import io
+import time
+from dataclasses import asdict, dataclass, field
+from typing import BinaryIO, Iterator, Optional
+
+from sqlalchemy import tuple_
+from sqlmodel import Session, select
+
+from arthasutra.db.models import ImportedFile, Security
+from arthasutra.services.eod_ingest import DEFAULT_BATCH_SIZE, EODBar, OnConflict, upsert_eod_bars
+
+
+_HASH_CHUNK = 1 << 20
+_GZIP_MAGIC = b"\x1f\x8b"
+_PAIR_CHUNK = 400
+MAX_REJECT_SAMPLES = 20
+
+
+@dataclass
+class ImportReport:
+    status: str = "ok"  # ok | skipped
+    sha256: Optional[str] = None
+    bytes: int = 0
+    rows: int = 0  # valid rows parsed
+    written: int = 0  # rows inserted/updated
+    rejects: int = 0
+    securities_created: int = 0
+    elapsed_s: float = 0.0
+    reject_samples: list[dict] = field(default_factory=list)
+
+    @property
+    def duplicates(self) -> int:
+        # Repeats within the file, plus (with on_conflict="nothing") bars already stored
+        return self.rows - self.written
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d["duplicates"] = self.duplicates
+        d["rows_per_sec"] = round(self.rows_per_sec, 1)
+        d["elapsed_s"] = round(self.elapsed_s, 3)
+        return d
+
+
+def file_sha256(fh: BinaryIO) -> tuple[str, int]:
+    """Hash a seekable binary stream's content in chunks and rewind it; returns (hash, stream size).
+
+    Gzipped streams are hashed after decompression: the gzip header carries a
+    timestamp, so the same CSV compressed again must not look like a new file.
+    """
+    h = hashlib.sha256()
+    fh.seek(0)
+    gzipped = fh.read(2) == _GZIP_MAGIC
+    fh.seek(0)
+    src: BinaryIO = gzip.GzipFile(fileobj=fh) if gzipped else fh
+    while chunk := src.read(_HASH_CHUNK):
+        h.update(chunk)
+    size = fh.seek(0, io.SEEK_END)
+    fh.seek(0)
+    return h.hexdigest(), size
+
+
+class _Prefixed(io.RawIOBase):
+    """Replays bytes already read from a non-seekable stream ahead of the rest of it."""
+
+    def __init__(self, prefix: bytes, fh: BinaryIO) -> None:
+        self._prefix = prefix
+        self._fh = fh
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:  # noqa: ANN001
+        if self._prefix:
+            n = min(len(b), len(self._prefix))
+            b[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+        data = self._fh.read(len(b))
+        b[: len(data)] = data
+        return len(data)
+
+
+def _open_text(fh: BinaryIO) -> io.TextIOWrapper:
+    # Sniff the gzip magic number instead of trusting the file name
+    magic = fh.read(2)
+    if fh.seekable():
+        fh.seek(0)
+        raw: BinaryIO = fh
+    else:
+        raw = io.BufferedReader(_Prefixed(magic, fh))
+    if magic == _GZIP_MAGIC:
+        raw = gzip.GzipFile(fileobj=raw)
+    return io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+
+
+def _num(v: Optional[str], default: Optional[float] = 0.0) -> Optional[float]:
+    v = (v or "").strip()
+    return float(v) if v else default
+
+
+def _iter_rows(text: io.TextIOWrapper, report: ImportReport) -> Iterator[tuple[str, str, dt.date, float, float, float, float, Optional[float]]]:
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if header is None:
+        return
+    # Column names are matched case-insensitively (vendor files use Date/Close, etc.)
+    col = {name.strip().lower(): i for i, name in enumerate(header)}
+    idx = {k: col.get(k) for k in ("symbol", "exchange", "date", "open", "high", "low", "close", "volume")}
+
+    def get(row: list[str], key: str) -> Optional[str]:
+        i = idx[key]
+        return row[i] if i is not None and i < len(row) else None
+
+    for line_no, row in enumerate(reader, start=2):
+        if not row:
+            continue
+        symbol = (get(row, "symbol") or "").strip()
+        exchange = (get(row, "exchange") or "").strip() or "NSE"
+        date_s = (get(row, "date") or "").strip()
+        try:
+            if not symbol or not date_s:
+                raise ValueError("missing symbol or date")
+            day = dt.date.fromisoformat(date_s[:10])
+            close = _num(get(row, "close"), None)
+            if close is None:
+                raise ValueError("missing close")
+            yield (
+                symbol,
+                exchange,
+                day,
+                _num(get(row, "open")),
+                _num(get(row, "high")),
+                _num(get(row, "low")),
+                close,
+                _num(get(row, "volume"), None),
+            )
+        except ValueError as e:
+            report.rejects += 1
+            if len(report.reject_samples) < MAX_REJECT_SAMPLES:
+                report.reject_samples.append({"line": line_no, "reason": str(e)})
+
+
+def _resolve_securities(session: Session, pairs: set[tuple[str, str]], cache: dict[tuple[str, str], int], report: ImportReport) -> None:
+    missing = [p for p in pairs if p not in cache]
+    if not missing:
+        return
+    for i in range(0, len(missing), _PAIR_CHUNK):
+        chunk = missing[i : i + _PAIR_CHUNK]
+        for sid, sym, ex in session.exec(
+            select(Security.id, Security.symbol, Security.exchange).where(
+                tuple_(Security.symbol, Security.exchange).in_(chunk)
+            )
+        ).all():
+            cache.setdefault((sym, ex), sid)
+    new = [Security(symbol=sym, exchange=ex, name=sym) for sym, ex in missing if (sym, ex) not in cache]
+    if new:
+        session.add_all(new)
+        session.flush()
+        for sec in new:
+            cache[(sec.symbol, sec.exchange)] = sec.id
+        report.securities_created += len(new)
+
+
+def import_eod_csv(
+    session: Session,
+    fh: BinaryIO,
+    filename: Optional[str] = None,
+    on_conflict: OnConflict = "update",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    force: bool = False,
+) -> ImportReport:
+    """Stream an EOD CSV (optionally gzipped) into PriceEOD.
+
+    The file is read incrementally; every ``batch_size`` rows their securities are
+    resolved in bulk (new ones created), the bars upserted and the batch committed, so
+    memory stays flat regardless of file size. Files whose content hash is already
+    recorded are skipped unless ``force``.
+    """
+    t0 = time.perf_counter()
+    report = ImportReport()
+    seekable = hasattr(fh, "seekable") and fh.seekable()
+    if seekable:
+        report.sha256, report.bytes = file_sha256(fh)
+        if not force and session.get(ImportedFile, report.sha256) is not None:
+            report.status = "skipped"
+            report.elapsed_s = time.perf_counter() - t0
+            return report
+
+    cache: dict[tuple[str, str], int] = {}
+    batch: list[tuple] = []
+
+    def flush() -> None:
+        _resolve_securities(session, {(r[0], r[1]) for r in batch}, cache, report)
+        res = upsert_eod_bars(
+            session,
+            (EODBar(cache[(r[0], r[1])], r[2], r[3], r[4], r[5], r[6], r[7]) for r in batch),
+            on_conflict=on_conflict,
+            batch_size=batch_size,
+        )
+        report.written += res.written
+        session.commit()
+        batch.clear()
+
+    text = _open_text(fh)
+    try:
+        for row in _iter_rows(text, report):
+            batch.append(row)
+            report.rows += 1
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    finally:
+        # Leave the caller's stream open (UploadFile / CLI own it)
+        text.detach()
+
+    if report.sha256:
+        session.merge(
+            ImportedFile(sha256=report.sha256, kind="prices_eod", filename=filename, bytes=report.bytes, rows=report.rows)
+        )
+        session.commit()
+    report.elapsed_s = time.perf_counter() - t0
+    return report
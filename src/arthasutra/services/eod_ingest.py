@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import datetime as dt
+from dataclasses import dataclass
+from typing import Iterable, Literal, Optional
+
+from sqlalchemy import event
+from sqlmodel import Session
+
+from arthasutra.db.models import PriceEOD
+from arthasutra.services.columnar_store import get_columnar_store, rebuild_from_db
+from arthasutra.services.indicator_state import apply_indicator_bars
+from arthasutra.services.price_cache import price_cache
+from arthasutra.services.price_snapshot import apply_bars, refresh_snapshots
+
+
+DEFAULT_BATCH_SIZE = 5000
+
+OnConflict = Literal["update", "nothing"]
+
+
+@dataclass
+class EODBar:
+    security_id: int
+    date: dt.date
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: Optional[float] = None
+
+
+@dataclass
+class UpsertResult:
+    rows: int = 0  # distinct (security_id, date) bars submitted
+    written: int = 0  # rows inserted (or inserted/updated for on_conflict="update")
+
+    @property
+    def duplicates(self) -> int:
+        return self.rows - self.written
+
+
+def _dialect_insert(session: Session):
+    name = session.get_bind().dialect.name
+    if name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def _upsert_stmt(session: Session, on_conflict: OnConflict):
+    dialect_insert = _dialect_insert(session)
+    if dialect_insert is None:
+        raise RuntimeError(f"bulk upsert not supported for dialect {session.get_bind().dialect.name!r}")
+    stmt = dialect_insert(PriceEOD)
+    keys = [PriceEOD.security_id, PriceEOD.date]
+    if on_conflict == "nothing":
+        return stmt.on_conflict_do_nothing(index_elements=keys)
+    return stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={
+            "open": stmt.excluded.open,
+            "high": stmt.excluded.high,
+            "low": stmt.excluded.low,
+            "close": stmt.excluded.close,
+            "volume": stmt.excluded.volume,
+        },
+    )
+
+
+def upsert_eod_bars(
+    session: Session,
+    bars: Iterable[EODBar],
+    on_conflict: OnConflict = "update",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> UpsertResult:
+    """Write EOD bars with ``INSERT ... ON CONFLICT (security_id, date)`` in batches.
+
+    ``on_conflict="update"`` overwrites existing bars (re-imports are idempotent);
+    ``"nothing"`` keeps what is stored. Bars repeated within ``bars`` collapse to the
+    last occurrence. Price snapshots and indicator states for the touched securities are
+    kept in sync and their cached histories invalidated (and mirrored into the columnar
+    store, if enabled, after commit).
+    The caller owns the transaction.
+    """
+    latest: dict[tuple[int, dt.date], EODBar] = {}
+    for b in bars:
+        latest[(b.security_id, b.date)] = b
+    result = UpsertResult(rows=len(latest))
+    if not latest:
+        return result
+
+    stmt = _upsert_stmt(session, on_conflict)
+    params = [
+        {
+            "security_id": b.security_id,
+            "date": b.date,
+            "open": float(b.open),
+            "high": float(b.high),
+            "low": float(b.low),
+            "close": float(b.close),
+            "volume": float(b.volume) if b.volume is not None else None,
+        }
+        for b in latest.values()
+    ]
+    session.flush()
+    # Core-level executemany on the session's connection: no ORM bookkeeping per row
+    conn = session.connection()
+    for i in range(0, len(params), batch_size):
+        res = conn.execute(stmt, params[i : i + batch_size])
+        result.written += max(res.rowcount or 0, 0)
+
+    price_cache.invalidate_on_commit(session, {b.security_id for b in latest.values()})
+    _append_columnar_on_commit(session, latest.values(), overwrite=(on_conflict == "update"))
+    if on_conflict == "update":
+        by_security: dict[int, list[tuple[dt.date, float]]] = {}
+        for b in latest.values():
+            by_security.setdefault(b.security_id, []).append((b.date, float(b.close)))
+        apply_bars(session, by_security)
+    else:
+        # Skipped conflicts keep the stored close, so re-read the newest two bars
+        refresh_snapshots(session, {b.security_id for b in latest.values()})
+    indicator_bars: dict[int, list[tuple[dt.date, float, float, float]]] = {}
+    for b in latest.values():
+        indicator_bars.setdefault(b.security_id, []).append((b.date, float(b.high), float(b.low), float(b.close)))
+    # A skipped conflict on a state's as_of is the bar it already folded; older bars still rebuild
+    apply_indicator_bars(session, indicator_bars, skip_known=(on_conflict == "nothing" and result.duplicates > 0))
+    return result
+
+
+def _append_columnar_on_commit(session: Session, bars: Iterable[EODBar], overwrite: bool) -> None:
+    """Mirror ingested bars into the columnar store once the transaction commits."""
+    store = get_columnar_store()
+    if store is None:
+        return
+    pending: list = session.info.setdefault("columnar_pending", [])
+    by_security: dict[int, list[tuple]] = {}
+    for b in bars:
+        by_security.setdefault(b.security_id, []).append((b.date, b.open, b.high, b.low, b.close, b.volume))
+    pending.append((by_security, overwrite))
+    if session.info.get("columnar_listening"):
+        return
+    session.info["columnar_listening"] = True
+
+    @event.listens_for(session, "after_commit")
+    def _after_commit(sess) -> None:  # noqa: ANN001
+        batches = sess.info.pop("columnar_pending", [])
+        # A security without a file may have PriceEOD history from before the store was
+        # enabled: export it whole (the committed bars included) instead of starting a
+        # file that would read as complete with only the new bars in it
+        unseeded = {sid for batch, _ in batches for sid in batch if not store.has(sid)}
+        if unseeded:
+            with Session(sess.get_bind()) as fresh:
+                rebuild_from_db(fresh, store, sorted(unseeded))
+        for batch, ow in batches:
+            for sid, rows in batch.items():
+                if sid not in unseeded:
+                    store.append(sid, rows, overwrite=ow)
+
+    @event.listens_for(session, "after_rollback")
+    def _after_rollback(sess) -> None:  # noqa: ANN001
+        sess.info.pop("columnar_pending", None)
@@ -0,0 +1,359 @@
+"""Per-security indicator state folded forward one bar at a time.
+
+:class:`IncrementalIndicators` keeps rolling sums for the SMAs, EMA accumulators and
+Wilder ATR state, so a new EOD bar costs O(1) regardless of history length. Values
+match :mod:`arthasutra.services.indicators` on the same bars (SMA/EMA/ATR seeding
+included), so backtests on the vectorized library and live decisions on this state
+agree. States are persisted in ``indicatorstate`` and advanced by the EOD ingest path;
+:meth:`IncrementalIndicators.provisional` evaluates an intraday price without
+committing it.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import json
+import math
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Iterable, Mapping, Optional
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from arthasutra.db.models import IndicatorState, PriceEOD, PriceSnapshot
+from arthasutra.services.price_cache import PriceHistory, load_history
+
+
+SMA_WINDOWS: tuple[int, ...] = (50, 200)
+EMA_SPANS: tuple[int, ...] = (20,)
+ATR_WINDOW = 14
+
+# Bars read when (re)building a state from PriceEOD; EMA/ATR have long converged by then
+REBUILD_BARS = 5000
+
+# Keep IN (...) lists well under SQLite's bound-parameter limit
+_CHUNK = 500
+
+# (date, high, low, close)
+Bar = tuple[dt.date, float, float, float]
+
+
+def params_key(
+    sma_windows: Iterable[int] = SMA_WINDOWS, ema_spans: Iterable[int] = EMA_SPANS, atr_window: int = ATR_WINDOW
+) -> str:
+    return (
+        f"sma={','.join(map(str, sma_windows))};ema={','.join(map(str, ema_spans))};atr={atr_window}"
+    )
+
+
+@dataclass
+class IncrementalIndicators:
+    """O(1)-per-bar SMA/EMA/ATR state for one security.
+
+    ``ring`` holds the last ``capacity`` closes; absolute bar ``i`` lives in slot
+    ``i % capacity``, so the close leaving an ``n``-bar window is one index away.
+    Rolling sums are re-added from the ring every ``capacity`` bars to bound
+    floating-point drift (amortized O(1)).
+    """
+
+    sma_windows: tuple[int, ...] = SMA_WINDOWS
+    ema_spans: tuple[int, ...] = EMA_SPANS
+    atr_window: int = ATR_WINDOW
+    as_of: Optional[dt.date] = None
+    bars: int = 0
+    last_close: Optional[float] = None
+    prev_close: Optional[float] = None
+    ring: list[float] = field(default_factory=list)
+    sums: dict[int, float] = field(default_factory=dict)
+    ema: dict[int, Optional[float]] = field(default_factory=dict)
+    atr: Optional[float] = None
+    tr_sum: float = 0.0  # sum of true ranges until the ATR is seeded
+
+    def __post_init__(self) -> None:
+        for w in self.windows:
+            self.sums.setdefault(w, 0.0)
+        for s in self.ema_spans:
+            self.ema.setdefault(s, None)
+
+    @cached_property
+    def windows(self) -> tuple[int, ...]:
+        # EMAs are seeded with SMA(span), so spans need a rolling sum too; fixed per state
+        return tuple(sorted(set(self.sma_windows) | set(self.ema_spans)))
+
+    @cached_property
+    def capacity(self) -> int:
+        return max(self.windows, default=1)
+
+    @property
+    def params(self) -> str:
+        return params_key(self.sma_windows, self.ema_spans, self.atr_window)
+
+    # -- stepping --------------------------------------------------------
+    def _step(self, close: float, high: Optional[float], low: Optional[float]):
+        """New (sums, ema, atr, tr_sum) after one more bar; does not mutate."""
+        hi = close if high is None else high
+        lo = close if low is None else low
+        n = self.bars + 1
+        cap = self.capacity
+        sums: dict[int, float] = {}
+        for w in self.windows:
+            leaving = self.ring[(self.bars - w) % cap] if self.bars >= w else 0.0
+            sums[w] = self.sums[w] + close - leaving
+        ema: dict[int, Optional[float]] = {}
+        for s in self.ema_spans:
+            prev = self.ema[s]
+            if prev is not None:
+                ema[s] = prev + 2.0 / (s + 1.0) * (close - prev)
+            else:
+                ema[s] = sums[s] / s if n >= s else None
+        tr = hi - lo
+        if self.last_close is not None:
+            tr = max(tr, abs(hi - self.last_close), abs(lo - self.last_close))
+        atr, tr_sum = self.atr, self.tr_sum
+        if atr is not None:
+            atr += (tr - atr) / self.atr_window
+        else:
+            tr_sum += tr
+            if n >= self.atr_window:
+                atr = tr_sum / self.atr_window
+        return sums, ema, atr, tr_sum
+
+    def update(self, date: dt.date, close: float, high: Optional[float] = None, low: Optional[float] = None) -> None:
+        """Fold in the next bar; ``date`` must be after :attr:`as_of`."""
+        if self.as_of is not None and date <= self.as_of:
+            raise ValueError(f"bar {date} is not after state date {self.as_of}")
+        close = float(close)
+        self.sums, self.ema, self.atr, self.tr_sum = self._step(
+            close, None if high is None else float(high), None if low is None else float(low)
+        )
+        cap = self.capacity
+        if len(self.ring) < cap:
+            self.ring.append(close)
+        else:
+            self.ring[self.bars % cap] = close
+        self.bars += 1
+        self.prev_close, self.last_close = self.last_close, close
+        self.as_of = date
+        if self.bars % cap == 0:
+            self._resum()
+
+    def _resum(self) -> None:
+        cap = self.capacity
+        for w in self.windows:
+            k = min(w, self.bars)
+            self.sums[w] = math.fsum(self.ring[(self.bars - 1 - i) % cap] for i in range(k))
+
+    # -- reads -----------------------------------------------------------
+    def _values(self, close, sums, ema, atr, n) -> dict[str, Optional[float]]:  # noqa: ANN001
+        out: dict[str, Optional[float]] = {"close": close}
+        for w in self.sma_windows:
+            out[f"sma{w}"] = sums[w] / w if n >= w else None
+        for s in self.ema_spans:
+            out[f"ema{s}"] = ema[s]
+        out[f"atr{self.atr_window}"] = atr
+        return out
+
+    def values(self) -> dict[str, Optional[float]]:
+        """Indicator values as of the last folded bar (``None`` = not enough history)."""
+        return self._values(self.last_close, self.sums, self.ema, self.atr, self.bars)
+
+    def provisional(self, close: float, high: Optional[float] = None, low: Optional[float] = None) -> dict[str, Optional[float]]:
+        """Values as if a bar closing at ``close`` (e.g. a live LTP) were appended; state is unchanged."""
+        close = float(close)
+        sums, ema, atr, _ = self._step(close, high, low)
+        return self._values(close, sums, ema, atr, self.bars + 1)
+
+    # -- persistence -----------------------------------------------------
+    def to_json(self) -> str:
+        return json.dumps({
+            "sma_windows": list(self.sma_windows),
+            "ema_spans": list(self.ema_spans),
+            "atr_window": self.atr_window,
+            "as_of": self.as_of.isoformat() if self.as_of else None,
+            "bars": self.bars,
+            "last_close": self.last_close,
+            "prev_close": self.prev_close,
+            "ring": self.ring,
+            "sums": {str(k): v for k, v in self.sums.items()},
+            "ema": {str(k): v for k, v in self.ema.items()},
+            "atr": self.atr,
+            "tr_sum": self.tr_sum,
+        })
+
+    @classmethod
+    def from_json(cls, text: str) -> "IncrementalIndicators":
+        d = json.loads(text)
+        return cls(
+            sma_windows=tuple(d["sma_windows"]),
+            ema_spans=tuple(d["ema_spans"]),
+            atr_window=int(d["atr_window"]),
+            as_of=dt.date.fromisoformat(d["as_of"]) if d.get("as_of") else None,
+            bars=int(d["bars"]),
+            last_close=d.get("last_close"),
+            prev_close=d.get("prev_close"),
+            ring=[float(x) for x in d["ring"]],
+            sums={int(k): float(v) for k, v in d["sums"].items()},
+            ema={int(k): v for k, v in d["ema"].items()},
+            atr=d.get("atr"),
+            tr_sum=float(d.get("tr_sum", 0.0)),
+        )
+
+
+def fold_history(hist: PriceHistory, state: Optional[IncrementalIndicators] = None) -> IncrementalIndicators:
+    """Fold a (possibly empty) price history into a fresh or given state."""
+    state = state or IncrementalIndicators()
+    dates = hist.dates.astype("datetime64[D]").astype(object)
+    for d, hi, lo, c in zip(dates, hist.high.tolist(), hist.low.tolist(), hist.close.tolist()):
+        state.update(d, c, hi, lo)
+    return state
+
+
+# -- persistence -------------------------------------------------------------
+
+def _chunks(ids: list[int]) -> Iterable[list[int]]:
+    for i in range(0, len(ids), _CHUNK):
+        yield ids[i : i + _CHUNK]
+
+
+def _rows(session: Session, security_ids: Iterable[int]) -> dict[int, IndicatorState]:
+    out: dict[int, IndicatorState] = {}
+    for chunk in _chunks(sorted(set(security_ids))):
+        for row in session.exec(select(IndicatorState).where(IndicatorState.security_id.in_(chunk))).all():
+            out[row.security_id] = row
+    return out
+
+
+def _store(session: Session, row: Optional[IndicatorState], security_id: int, state: IncrementalIndicators) -> None:
+    if state.bars == 0:
+        if row is not None:
+            session.delete(row)
+        return
+    if row is None:
+        row = IndicatorState(security_id=security_id)
+        session.add(row)
+    row.as_of = state.as_of
+    row.bars = state.bars
+    row.params = state.params
+    row.state_json = state.to_json()
+    row.updated_at = dt.datetime.now(dt.UTC)
+
+
+def _decode(row: Optional[IndicatorState]) -> Optional[IncrementalIndicators]:
+    if row is None or row.params != params_key():
+        return None
+    return IncrementalIndicators.from_json(row.state_json)
+
+
+def rebuild_states(
+    session: Session, security_ids: Iterable[int], rows: Optional[Mapping[int, IndicatorState]] = None
+) -> dict[int, IncrementalIndicators]:
+    """Recompute states from the newest ``REBUILD_BARS`` PriceEOD bars and store them."""
+    ids = sorted(set(security_ids))
+    if not ids:
+        return {}
+    session.flush()
+    rows = _rows(session, ids) if rows is None else rows
+    out: dict[int, IncrementalIndicators] = {}
+    for sid, hist in load_history(session, ids, REBUILD_BARS).items():
+        state = fold_history(hist)
+        _store(session, rows.get(sid), sid, state)
+        if state.bars:
+            out[sid] = state
+    return out
+
+
+def apply_indicator_bars(
+    session: Session, bars_by_security: Mapping[int, Iterable[Bar]], skip_known: bool = False
+) -> int:
+    """Advance stored states with freshly ingested ``(date, high, low, close)`` bars.
+
+    Bars strictly after a state's ``as_of`` are folded in O(1) each. Securities without
+    a (current) state, or receiving a bar at or before ``as_of`` (corrections,
+    backfilled gaps), are rebuilt from PriceEOD instead. With ``skip_known``, for
+    ingests that kept the stored bars on conflict, a bar on ``as_of`` is the one
+    already folded and is ignored; older bars still rebuild, as they may fill a gap.
+    """
+    if not bars_by_security:
+        return 0
+    rows = _rows(session, bars_by_security.keys())
+    rebuild: list[int] = []
+    for sid, bars in bars_by_security.items():
+        state = _decode(rows.get(sid))
+        ordered = sorted(bars, key=lambda b: b[0])
+        if state is not None and state.as_of is not None and ordered and ordered[0][0] <= state.as_of:
+            if not skip_known or ordered[0][0] < state.as_of:
+                rebuild.append(sid)
+                continue
+            ordered = [b for b in ordered if b[0] > state.as_of]
+        if state is None:
+            rebuild.append(sid)
+            continue
+        for d, hi, lo, close in ordered:
+            state.update(d, close, hi, lo)
+        _store(session, rows.get(sid), sid, state)
+    rebuild_states(session, rebuild, rows)
+    return len(bars_by_security)
+
+
+def read_indicator_states(
+    session: Session, security_ids: Iterable[int]
+) -> tuple[dict[int, IncrementalIndicators], dict[int, PriceHistory]]:
+    """Current stored states, plus the PriceEOD histories of missing or stale ones.
+
+    Only reads: :func:`fold_histories` turns the histories into states, so callers can
+    do the (CPU-bound) folding away from where they awaited the database.
+    """
+    ids = sorted(set(security_ids))
+    out: dict[int, IncrementalIndicators] = {}
+    stale: list[int] = []
+    for chunk in _chunks(ids):
+        found: set[int] = set()
+        for sid, last_date, row in session.exec(
+            select(PriceSnapshot.security_id, PriceSnapshot.last_date, IndicatorState)
+            .outerjoin(IndicatorState, IndicatorState.security_id == PriceSnapshot.security_id)
+            .where(PriceSnapshot.security_id.in_(chunk))
+        ).all():
+            found.add(sid)
+            state = _decode(row)
+            if state is not None and state.as_of == last_date:
+                out[sid] = state
+            else:
+                stale.append(sid)
+        stale.extend(sid for sid in chunk if sid not in found)
+    return out, load_history(session, stale, REBUILD_BARS)
+
+
+def fold_histories(histories: Mapping[int, PriceHistory]) -> dict[int, IncrementalIndicators]:
+    """States folded from :func:`read_indicator_states` histories; empty histories are dropped."""
+    out: dict[int, IncrementalIndicators] = {}
+    for sid, hist in histories.items():
+        state = fold_history(hist)
+        if state.bars:
+            out[sid] = state
+    return out
+
+
+def load_indicator_states(session: Session, security_ids: Iterable[int]) -> dict[int, IncrementalIndicators]:
+    """Stored states for the given securities; missing or stale ones are folded in memory.
+
+    A state is current when its ``as_of`` matches the security's PriceSnapshot. Others
+    (bars written outside the ingest paths) are computed from PriceEOD for this call
+    only: reads never write, so concurrent requests cannot race on the same rows. The
+    ingest paths and ``arthasutra rebuild-indicators`` keep the table current.
+    Securities with no price history are absent from the result.
+    """
+    states, pending = read_indicator_states(session, security_ids)
+    states.update(fold_histories(pending))
+    return states
+
+
+def rebuild_all_states(session: Session) -> int:
+    """Rebuild every security's state from PriceEOD, committing per chunk; returns the state count."""
+    session.execute(delete(IndicatorState))
+    ids = sorted(session.exec(select(PriceEOD.security_id).distinct()).all())
+    n = 0
+    for chunk in _chunks(ids):
+        n += len(rebuild_states(session, chunk, rows={}))
+        session.commit()
+    session.commit()
+    return n
@@ -0,0 +1,182 @@
+"""Vectorized technical indicators over (securities x dates) matrices.
+
+Every function takes 2-D float arrays shaped ``(n_securities, n_dates)`` with dates in
+ascending order along axis 1 (1-D inputs are treated as a single security). Missing
+bars are ``NaN``; histories of different lengths are left-padded with ``NaN`` via
+:func:`close_matrix`. An output is ``NaN`` until its full look-back window is
+available, mirroring the decision engine's "not enough history" semantics.
+"""
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+def close_matrix(series: Sequence[Sequence[float]], length: Optional[int] = None) -> np.ndarray:
+    """Stack per-security histories into a right-aligned matrix (latest bar in the last column)."""
+    n = len(series)
+    width = length if length is not None else max((len(s) for s in series), default=0)
+    out = np.full((n, width), np.nan, dtype=float)
+    for i, s in enumerate(series):
+        tail = list(s)[-width:] if width else []
+        if tail:
+            out[i, width - len(tail) :] = tail
+    return out
+
+
+def _as_2d(x: np.ndarray) -> np.ndarray:
+    a = np.asarray(x, dtype=float)
+    return a[np.newaxis, :] if a.ndim == 1 else a
+
+
+def sma(x: np.ndarray, window: int) -> np.ndarray:
+    """Simple moving average via cumulative sums; O(n_dates) per security."""
+    a = _as_2d(x)
+    out = np.full(a.shape, np.nan)
+    if window <= 0 or a.shape[1] < window:
+        return out
+    valid = ~np.isnan(a)
+    cs = np.cumsum(np.where(valid, a, 0.0), axis=1)
+    win_sum = cs[:, window - 1 :].copy()
+    win_sum[:, 1:] -= cs[:, :-window]
+    if valid.all():
+        out[:, window - 1 :] = win_sum / window
+        return out
+    cnt = np.cumsum(valid, axis=1)
+    win_cnt = cnt[:, window - 1 :].copy()
+    win_cnt[:, 1:] -= cnt[:, :-window]
+    out[:, window - 1 :] = np.where(win_cnt == window, win_sum / window, np.nan)
+    return out
+
+
+def _smooth(x: np.ndarray, window: int, alpha: float) -> np.ndarray:
+    """Exponential smoothing seeded with the SMA of the first ``window`` values.
+
+    Recursion runs along dates but is vectorized across securities; gaps hold the
+    previous state.
+    """
+    a = _as_2d(x)
+    # Date-major copies so each step touches one contiguous row
+    seed = np.ascontiguousarray(sma(a, window).T)
+    vals = np.ascontiguousarray(a.T)
+    out = np.empty_like(vals)
+    state = np.full(a.shape[0], np.nan)
+    delta = np.empty_like(state)
+    for t in range(vals.shape[0]):
+        np.subtract(vals[t], state, out=delta)
+        # NaN deltas (gap or not started) leave the state untouched
+        np.multiply(delta, alpha, out=delta)
+        np.add(state, np.nan_to_num(delta, nan=0.0), out=state, where=~np.isnan(state))
+        np.copyto(state, seed[t], where=np.isnan(state))
+        out[t] = state
+    return np.ascontiguousarray(out.T)
+
+
+def ema(x: np.ndarray, span: int) -> np.ndarray:
+    """Exponential moving average (alpha = 2 / (span + 1)), seeded with SMA(span)."""
+    return _smooth(x, span, 2.0 / (span + 1.0))
+
+
+def wilder(x: np.ndarray, window: int) -> np.ndarray:
+    """Wilder's smoothing (alpha = 1 / window), as used by ATR and RSI."""
+    return _smooth(x, window, 1.0 / window)
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    h, l, c = _as_2d(high), _as_2d(low), _as_2d(close)
+    prev = np.concatenate([np.full((c.shape[0], 1), np.nan), c[:, :-1]], axis=1)
+    hl = h - l
+    # fmax ignores the NaN previous close on each security's first bar
+    return np.fmax(hl, np.fmax(np.abs(h - prev), np.abs(l - prev)))
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = 14) -> np.ndarray:
+    """Average true range with Wilder smoothing."""
+    return wilder(true_range(high, low, close), window)
+
+
+def rsi(close: np.ndarray, window: int = 14) -> np.ndarray:
+    """Relative strength index (Wilder) in the 0..100 range."""
+    c = _as_2d(close)
+    diff = np.concatenate([np.full((c.shape[0], 1), np.nan), np.diff(c, axis=1)], axis=1)
+    avg_gain = wilder(np.where(np.isnan(diff), np.nan, np.clip(diff, 0.0, None)), window)
+    avg_loss = wilder(np.where(np.isnan(diff), np.nan, np.clip(-diff, 0.0, None)), window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        out = 100.0 - 100.0 / (1.0 + rs)
+    return np.where((avg_loss == 0) & ~np.isnan(avg_gain), 100.0, out)
+
+
+def _rolling(x: np.ndarray, window: int, fn) -> np.ndarray:  # noqa: ANN001
+    a = _as_2d(x)
+    out = np.full(a.shape, np.nan)
+    n = a.shape[1]
+    if window <= 0 or n < window:
+        return out
+    # Fold the window in with `window` shifted element-wise ops; NaN propagates,
+    # so windows touching a missing bar stay NaN, same as sma()
+    acc = a[:, window - 1 :].copy()
+    for k in range(1, window):
+        fn(acc, a[:, window - 1 - k : n - k], out=acc)
+    out[:, window - 1 :] = acc
+    return out
+
+
+def rolling_max(x: np.ndarray, window: int) -> np.ndarray:
+    return _rolling(x, window, np.maximum)
+
+
+def rolling_min(x: np.ndarray, window: int) -> np.ndarray:
+    return _rolling(x, window, np.minimum)
+
+
+def returns(x: np.ndarray, periods: int = 1) -> np.ndarray:
+    """Simple returns over ``periods`` bars."""
+    a = _as_2d(x)
+    out = np.full(a.shape, np.nan)
+    if periods <= 0 or a.shape[1] <= periods:
+        return out
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[:, periods:] = a[:, periods:] / a[:, :-periods] - 1.0
+    return out
+
+
+def compute_indicators(
+    close: np.ndarray,
+    high: Optional[np.ndarray] = None,
+    low: Optional[np.ndarray] = None,
+    sma_windows: Sequence[int] = (50, 200),
+    ema_spans: Sequence[int] = (20,),
+    atr_window: int = 14,
+    rsi_window: int = 14,
+    range_window: int = 20,
+    return_periods: Sequence[int] = (1,),
+) -> dict[str, np.ndarray]:
+    """Compute the standard indicator set for a close matrix in one pass.
+
+    Keys: ``sma{n}``, ``ema{n}``, ``rsi{n}``, ``high{n}``/``low{n}`` (rolling extremes of
+    high/low, falling back to close), ``ret{n}`` and, when high/low are given, ``atr{n}``.
+    """
+    c = _as_2d(close)
+    out: dict[str, np.ndarray] = {}
+    for w in sma_windows:
+        out[f"sma{w}"] = sma(c, w)
+    for s in ema_spans:
+        out[f"ema{s}"] = ema(c, s)
+    out[f"rsi{rsi_window}"] = rsi(c, rsi_window)
+    out[f"high{range_window}"] = rolling_max(c if high is None else high, range_window)
+    out[f"low{range_window}"] = rolling_min(c if low is None else low, range_window)
+    for p in return_periods:
+        out[f"ret{p}"] = returns(c, p)
+    if high is not None and low is not None:
+        out[f"atr{atr_window}"] = atr(high, low, c, atr_window)
+    return out
+
+
+def last_values(x: np.ndarray) -> list[Optional[float]]:
+    """Latest column as Python floats, with ``None`` for missing values."""
+    a = _as_2d(x)
+    if a.shape[1] == 0:
+        return [None] * a.shape[0]
+    return [None if np.isnan(v) else float(v) for v in a[:, -1]]
@@ -14,7 +14,9 @@ except Exception:  # pragma: no cover - optional dependency
     KiteConnect = None  # type: ignore
 
 from arthasutra.db.models import Security
-from arthasutra.services.live import upsert_ltp
+from arthasutra.services.live import parse_symbol, upsert_ltp
+from arthasutra.services.metrics import track_job
+from arthasutra.services.tick_pipeline import pipeline_from_env
 
 
 class KiteWSManager:
@@ -40,6 +42,8 @@ class KiteWSManager:
                 raise RuntimeError("Failed to initialize KiteTicker. Check token type (PUBLIC/ACCESS) and library version.")
         self._thread: Optional[threading.Thread] = None
         self._session = session
+        # Ticks are coalesced in memory and flushed in batches off the websocket thread
+        self.pipeline = pipeline_from_env(session_scope)
 
         self._kt.on_ticks = self._on_ticks
         self._kt.on_connect = self._on_connect
@@ -57,20 +61,15 @@ class KiteWSManager:
         self._connected = False
 
     def _on_ticks(self, ws, ticks):  # noqa: ANN001
-        # ticks: list of dicts with instrument_token and last_price
-        with session_scope() as s:
-            tok_to_sec = {srow.kite_token: srow.id for srow in s.exec(select(Security).where(Security.kite_token.is_not(None))).all()}
-            for t in ticks:
-                token = t.get("instrument_token")
-                ltp = t.get("last_price") or t.get("last_traded_price")
-                sid = tok_to_sec.get(token)
-                if sid and ltp:
-                    upsert_ltp(s, sid, float(ltp), source="kite")
+        # ticks: list of dicts with instrument_token and last_price; never touches the DB here
+        with track_job("kite_ticks"):
+            self.pipeline.offer(ticks)
 
     def subscribe_portfolio_tokens(self) -> None:
+        # Token map is rebuilt only when subscriptions change, not per tick batch
         with session_scope() as s:
-            tokens = [row.kite_token for row in s.exec(select(Security).where(Security.kite_token.is_not(None))).all() if row.kite_token]
-        self._sub_tokens = list({int(t) for t in tokens})
+            token_map = self.pipeline.refresh_token_map(s)
+        self._sub_tokens = list(token_map)
         if self._kt and self._sub_tokens:
             self._kt.subscribe(self._sub_tokens)
             self._kt.set_mode(self._kt.MODE_LTP, self._sub_tokens)
@@ -79,6 +78,7 @@ class KiteWSManager:
         if self._thread and self._thread.is_alive():
             return
         self._connected = False
+        self.pipeline.start()
         self._thread = threading.Thread(target=self._kt.connect, kwargs={"threaded": True}, daemon=True)
         self._thread.start()
 
@@ -87,12 +87,14 @@ class KiteWSManager:
             self._kt.close()
         except Exception:
             pass
+        self.pipeline.stop()
 
     def status(self) -> Dict[str, object]:
         return {
             "connected": getattr(self, "_connected", False),
             "subscribed_count": len(self._sub_tokens or []),
             "provider": "kite",
+            "pipeline": self.pipeline.stats(),
         }
 
 
@@ -180,7 +182,7 @@ def fetch_snapshot_ltp(session: Session, symbols: Iterable[Tuple[str, str]]) ->
         return mapping
     for key, val in data.items():
         try:
-            ex, sym = key.split(":", 1)
+            ex, sym = parse_symbol(key)
             ltp = float(val.get("last_price") or val.get("last_traded_price") or 0)
             if ltp:
                 mapping[(sym, ex)] = ltp
@@ -2,11 +2,13 @@ from __future__ import annotations
 
 import datetime as dt
 from zoneinfo import ZoneInfo
-from typing import Optional
+from typing import Iterable, Mapping, Optional
 
+from sqlalchemy import tuple_
 from sqlmodel import Session, select
 
-from arthasutra.db.models import QuoteLive
+from arthasutra.db.models import PriceSnapshot, QuoteLive, Security
+from arthasutra.services.quote_store import quote_store
 
 
 IST = ZoneInfo("Asia/Kolkata")
@@ -25,21 +27,140 @@ def is_market_session(now: Optional[dt.datetime] = None) -> bool:
 
 
 def upsert_ltp(session: Session, security_id: int, ltp: float, source: str = "yf") -> None:
-    row = session.exec(select(QuoteLive).where(QuoteLive.security_id == security_id)).first()
+    """Record a quote in the in-process store.
+
+    With the store's write-behind thread running, persistence is deferred to it;
+    otherwise the quote is upserted on ``session`` (the caller commits).
+    """
+    q = quote_store.put(security_id, ltp, source=source, persist=quote_store.write_behind)
+    if q is not None and not quote_store.write_behind:
+        upsert_ltps(session, {security_id: (q.ltp, q.ts)}, source=source)
+
+
+def record_ltps(session: Session, quotes: Mapping[int, float], source: str = "yf") -> int:
+    """Batch form of :func:`upsert_ltp` for ``{security_id: ltp}``; returns quotes recorded."""
     now = dt.datetime.now(dt.UTC)
-    if row:
-        row.ltp = float(ltp)
-        row.ts = now
-        row.updated_at = now
+    batch = {sid: (float(ltp), now) for sid, ltp in quotes.items()}
+    n = quote_store.put_many(batch, source=source, persist=quote_store.write_behind)
+    if not quote_store.write_behind:
+        upsert_ltps(session, batch, source=source)
+    return n
+
+
+def upsert_ltps(
+    session: Session, quotes: Mapping[int, tuple[float, dt.datetime]], source: str = "kite"
+) -> int:
+    """Write many ``{security_id: (ltp, ts)}`` quotes with one batched ON CONFLICT upsert.
+
+    Dialects without ON CONFLICT support get a select-then-update/insert on the ORM.
+    The caller owns the transaction. Returns the number of quotes written.
+    """
+    if not quotes:
+        return 0
+    now = dt.datetime.now(dt.UTC)
+    name = session.get_bind().dialect.name
+    if name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
     else:
-        session.add(QuoteLive(security_id=security_id, ltp=float(ltp), ts=now, updated_at=now, source=source))
+        existing = {
+            row.security_id: row
+            for row in session.exec(select(QuoteLive).where(QuoteLive.security_id.in_(list(quotes)))).all()
+        }
+        for sid, (ltp, ts) in quotes.items():
+            row = existing.get(sid) or QuoteLive(security_id=sid, ltp=float(ltp))
+            row.ltp, row.ts, row.updated_at, row.source = float(ltp), ts, now, source
+            session.add(row)
+        session.flush()
+        return len(quotes)
+    stmt = dialect_insert(QuoteLive)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[QuoteLive.security_id],
+        set_={"ltp": stmt.excluded.ltp, "ts": stmt.excluded.ts, "updated_at": stmt.excluded.updated_at, "source": stmt.excluded.source},
+    )
+    params = [
+        {"security_id": sid, "ltp": float(ltp), "ts": ts, "updated_at": now, "source": source}
+        for sid, (ltp, ts) in quotes.items()
+    ]
+    session.flush()
+    session.connection().execute(stmt, params)
+    return len(params)
 
 
 def get_fresh_ltp(session: Session, security_id: int, freshness_seconds: int = 120) -> Optional[float]:
-    row = session.exec(select(QuoteLive).where(QuoteLive.security_id == security_id)).first()
-    if not row:
+    quote_store.ensure_warm(session)
+    q = quote_store.get(security_id)
+    if q is None:
         return None
-    age = (dt.datetime.now(dt.UTC) - row.ts).total_seconds()
+    age = (dt.datetime.now(dt.UTC) - q.ts).total_seconds()
     if age <= freshness_seconds:
-        return float(row.ltp)
+        return float(q.ltp)
     return None
+
+
+# (exchange, symbol) row values per IN clause; two bound parameters each
+_PAIR_CHUNK = 400
+
+
+def parse_symbol(token: str, default_exchange: str = "NSE") -> tuple[str, str]:
+    """``"NSE:HDFCBANK"`` -> ``("NSE", "HDFCBANK")``; a bare symbol gets ``default_exchange``."""
+    if ":" in token:
+        ex, sym = token.split(":", 1)
+        return ex, sym
+    return default_exchange, token
+
+
+def split_symbols(text: str) -> list[str]:
+    """Tokens of a comma-separated symbol list, stripped; empty entries are dropped."""
+    return [t for t in (t.strip() for t in text.split(",")) if t]
+
+
+def lookup_quotes(
+    session: Session, tokens: Iterable[str], include_prev: bool = False
+) -> dict[str, Optional[dict]]:
+    """Quotes for many ``EXCHANGE:SYMBOL`` tokens.
+
+    Securities (and, with ``include_prev``, their close snapshots) are resolved with
+    one joined query per chunk of pairs; LTPs come from the in-process quote store.
+    Unknown symbols map to None.
+    """
+    wanted = {t: parse_symbol(t) for t in dict.fromkeys(t.strip() for t in tokens) if t}
+    pairs = list(set(wanted.values()))
+    found: dict[tuple[str, str], tuple[int, Optional[PriceSnapshot]]] = {}
+    for i in range(0, len(pairs), _PAIR_CHUNK):
+        chunk = pairs[i : i + _PAIR_CHUNK]
+        if include_prev:
+            stmt = (
+                select(Security.exchange, Security.symbol, Security.id, PriceSnapshot)
+                .outerjoin(PriceSnapshot, PriceSnapshot.security_id == Security.id)
+            )
+        else:
+            stmt = select(Security.exchange, Security.symbol, Security.id)
+        for row in session.exec(stmt.where(tuple_(Security.exchange, Security.symbol).in_(chunk))).all():
+            found.setdefault((row[0], row[1]), (row[2], row[3] if include_prev else None))
+
+    quote_store.ensure_warm(session)
+    out: dict[str, Optional[dict]] = {}
+    for token, pair in wanted.items():
+        hit = found.get(pair)
+        if hit is None:
+            out[token] = None
+            continue
+        sid, snap = hit
+        q = quote_store.get(sid)
+        item: Optional[dict] = {"ltp": q.ltp, "ts": q.ts.isoformat()} if q else None
+        if include_prev:
+            # Same reference close as the dashboard's pct_today
+            prev = None
+            if snap is not None:
+                prev = snap.prev_close if snap.prev_close is not None else snap.last_close
+            item = item or {"ltp": None, "ts": None}
+            item["prev_close"] = prev
+            if q is not None and prev:
+                item["change"] = q.ltp - prev
+                item["pct_change"] = (q.ltp - prev) / prev * 100.0
+            else:
+                item["change"] = item["pct_change"] = None
+        out[token] = item
+    return out
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import datetime as dt
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Callable, ContextManager, Optional, Protocol
+
+from sqlmodel import Session, select
+
+from arthasutra.db.models import Holding, Security
+from arthasutra.services.live import IST, is_market_session, record_ltps
+from arthasutra.services.metrics import track_job
+
+
+Pair = tuple  # (symbol, exchange)
+
+
+class LTPProvider(Protocol):
+    def fetch(self, pairs: list[Pair]) -> dict[Pair, float]: ...
+
+
+class YFinanceLTPProvider:
+    def fetch(self, pairs: list[Pair]) -> dict[Pair, float]:
+        from arthasutra.services.marketdata.yfinance_client import download_ltps
+
+        return download_ltps(pairs)
+
+
+@dataclass
+class PollCycle:
+    started_at: dt.datetime
+    final: bool = False
+    tickers: int = 0
+    skipped_backoff: int = 0
+    chunks: int = 0
+    chunk_errors: int = 0
+    quotes: int = 0
+    failed: int = 0
+    fetch_ms: float = 0.0
+    write_ms: float = 0.0
+    duration_ms: float = 0.0
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d["started_at"] = self.started_at.isoformat()
+        return d
+
+
+def load_poll_universe(session: Session) -> list[tuple[int, str, str]]:
+    """``(security_id, symbol, exchange)`` for every held security, in one query."""
+    return [
+        (sid, sym, ex)
+        for sid, sym, ex in session.exec(
+            select(Security.id, Security.symbol, Security.exchange)
+            .where(Security.id.in_(select(Holding.security_id).distinct()))
+            .order_by(Security.id)
+        ).all()
+    ]
+
+
+class LivePoller:
+    """Market-hours LTP poller for providers without a push feed (yfinance).
+
+    :meth:`tick` is called on a fixed schedule; it polls only while the market is in
+    session, plus one final pass after the close. Large universes are split into
+    chunks downloaded concurrently. Tickers that fail or return nothing are skipped
+    for an exponentially growing number of cycles (capped at ``max_backoff_cycles``).
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], ContextManager[Session]],
+        provider: Optional[LTPProvider] = None,
+        chunk_size: int = 50,
+        max_workers: int = 4,
+        max_backoff_cycles: int = 8,
+        history: int = 20,
+    ) -> None:
+        self._session_factory = session_factory
+        self.provider = provider or YFinanceLTPProvider()
+        self.chunk_size = max(1, chunk_size)
+        self.max_workers = max(1, max_workers)
+        self.max_backoff_cycles = max_backoff_cycles
+        self._history = history
+        self._lock = threading.Lock()
+        self.cycle_no = 0
+        self._failures: dict[int, int] = {}
+        self._skip_until: dict[int, int] = {}
+        self._was_open = False
+        self._final_done_for: Optional[dt.date] = None
+        self.cycles: list[PollCycle] = []
+        self.idle_ticks = 0
+
+    # -- scheduling ------------------------------------------------------
+    def tick(self, now: Optional[dt.datetime] = None) -> Optional[PollCycle]:
+        """Poll if the session is open, or run the post-close pass; otherwise do nothing."""
+        now = now or dt.datetime.now(IST)
+        if now.tzinfo is None:
+            now = now.replace(tzinfo=IST)
+        local = now.astimezone(IST)
+        if is_market_session(local):
+            self._was_open = True
+            return self.poll_once()
+        after_close = local.weekday() < 5 and local.time() > dt.time(15, 30)
+        if self._was_open or (after_close and self._final_done_for != local.date()):
+            # One pass to capture closing prices, then idle until the next session
+            self._was_open = False
+            self._final_done_for = local.date()
+            return self.poll_once(final=True)
+        self.idle_ticks += 1
+        return None
+
+    # -- polling ---------------------------------------------------------
+    def _due(self, universe: list[tuple[int, str, str]]) -> tuple[list[tuple[int, str, str]], int]:
+        due = [u for u in universe if self._skip_until.get(u[0], 0) <= self.cycle_no]
+        return due, len(universe) - len(due)
+
+    def _record_miss(self, sid: int) -> None:
+        fails = self._failures.get(sid, 0) + 1
+        self._failures[sid] = fails
+        # Sit out the next 1, 2, 4, ... cycles
+        self._skip_until[sid] = self.cycle_no + min(2 ** (fails - 1), self.max_backoff_cycles) + 1
+
+    def poll_once(self, final: bool = False) -> PollCycle:
+        with self._lock, track_job("yf_poll"):
+            self.cycle_no += 1
+            cycle = PollCycle(started_at=dt.datetime.now(dt.UTC), final=final)
+            t0 = time.perf_counter()
+            with self._session_factory() as s:
+                universe = load_poll_universe(s)
+                due, cycle.skipped_backoff = self._due(universe)
+                cycle.tickers = len(due)
+                by_pair = {(sym, ex): sid for sid, sym, ex in due}
+                pairs = list(by_pair)
+                chunks = [pairs[i : i + self.chunk_size] for i in range(0, len(pairs), self.chunk_size)]
+                cycle.chunks = len(chunks)
+
+                def _fetch(chunk: list[Pair]) -> tuple[list[Pair], Optional[dict[Pair, float]]]:
+                    try:
+                        return chunk, self.provider.fetch(chunk)
+                    except Exception:
+                        return chunk, None
+
+                t_fetch = time.perf_counter()
+                results = []
+                if chunks:
+                    with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks)), thread_name_prefix="ltp-poll") as pool:
+                        results = list(pool.map(_fetch, chunks))
+                cycle.fetch_ms = (time.perf_counter() - t_fetch) * 1000.0
+
+                quotes: dict[int, float] = {}
+                for chunk, got in results:
+                    if not got and len(chunk) > 1:
+                        # Whole chunk failed: a provider/network problem, not the tickers' fault
+                        cycle.chunk_errors += 1
+                        continue
+                    for pair in chunk:
+                        sid = by_pair[pair]
+                        ltp = (got or {}).get(pair)
+                        if ltp:
+                            quotes[sid] = ltp
+                            self._failures.pop(sid, None)
+                            self._skip_until.pop(sid, None)
+                        else:
+                            cycle.failed += 1
+                            self._record_miss(sid)
+
+                t_write = time.perf_counter()
+                cycle.quotes = record_ltps(s, quotes, source="yf") if quotes else 0
+                s.commit()
+                cycle.write_ms = (time.perf_counter() - t_write) * 1000.0
+            cycle.duration_ms = (time.perf_counter() - t0) * 1000.0
+            self.cycles.append(cycle)
+            del self.cycles[: -self._history]
+            return cycle
+
+    def stats(self) -> dict[str, object]:
+        recent = list(self.cycles)
+        return {
+            "cycles": self.cycle_no,
+            "idle_ticks": self.idle_ticks,
+            "in_backoff": sum(1 for until in self._skip_until.values() if until > self.cycle_no),
+            "avg_duration_ms": round(sum(c.duration_ms for c in recent) / len(recent), 2) if recent else None,
+            "last_cycle": recent[-1].to_dict() if recent else None,
+        }
+
+
+def poller_from_env(session_factory: Callable[[], ContextManager[Session]]) -> LivePoller:
+    return LivePoller(
+        session_factory,
+        chunk_size=int(os.getenv("LIVE_POLL_CHUNK", "50")),
+        max_workers=int(os.getenv("LIVE_POLL_WORKERS", "4")),
+    )
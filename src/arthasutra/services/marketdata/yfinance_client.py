@@ -7,8 +7,9 @@ import pandas as pd
 import yfinance as yf
 from sqlmodel import Session, select
 
-from arthasutra.db.models import Security, PriceEOD
+from arthasutra.db.models import Security
 from arthasutra.services.live import upsert_ltp
+from arthasutra.services.eod_ingest import EODBar, upsert_eod_bars
 
 
 def yahoo_symbol(symbol: str, exchange: str) -> str:
@@ -33,29 +34,32 @@ def fetch_eod_to_db(session: Session, symbol: str, exchange: str, start: date, e
         session.add(sec)
         session.flush()
 
-    rows = 0
-    for idx, row in hist.iterrows():
-        d = idx.date()
-        exists = session.exec(select(PriceEOD).where(PriceEOD.security_id == sec.id, PriceEOD.date == d)).first()
-        if exists:
-            continue
-        pe = PriceEOD(
+    bars = [
+        EODBar(
             security_id=sec.id,
-            date=d,
-            open=float(row["Open"]),
-            high=float(row["High"]),
-            low=float(row["Low"]),
-            close=float(row["Close"]),
-            volume=float(row["Volume"]) if not (row["Volume"] is None) else None,
+            date=idx.date(),
+            open=float(o),
+            high=float(h),
+            low=float(l),
+            close=float(c),
+            volume=None if pd.isna(v) else float(v),
+        )
+        for idx, o, h, l, c, v in zip(
+            hist.index, hist["Open"], hist["High"], hist["Low"], hist["Close"], hist["Volume"]
         )
-        session.add(pe)
-        rows += 1
+    ]
+    # Bars already stored are kept as-is; only new dates are inserted
+    rows = upsert_eod_bars(session, bars, on_conflict="nothing").written
     session.commit()
     return rows
 
 
 def fetch_ltp_batch(session: Session, pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
-    # pairs: list of (symbol, exchange)
+    return download_ltps(pairs)
+
+
+def download_ltps(pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
+    """Latest 1-minute close per (symbol, exchange), in one yfinance download."""
     mapping = {}
     # Batch via yfinance.download for efficiency
     tickers = []
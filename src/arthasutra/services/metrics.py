@@ -0,0 +1,276 @@
+"""In-process metrics in Prometheus text format.
+
+Requests and background jobs each open a :class:`Scope` (held in a context variable,
+so it follows FastAPI's threadpool hand-off); the SQLAlchemy hooks installed by
+:func:`install_sql_hooks` add every statement's count and time to the current scope.
+When the scope closes, its latency and SQL totals are folded into per-route or
+per-job series. Recording is a few additions under a per-metric lock; nothing is
+formatted until ``/metrics`` is scraped.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in {"0", "false", "no"}
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    return repr(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple[str, ...] = (), amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, labels: tuple[str, ...] = ()) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        out.extend(f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items)
+        return out
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (+Inf last)..., sum]
+        self._series: dict[tuple[str, ...], list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple[str, ...], value: float) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            s[i] += 1
+            s[-1] += value
+
+    def count(self, labels: tuple[str, ...] = ()) -> int:
+        s = self._series.get(labels)
+        return int(sum(s[:-1])) if s else 0
+
+    def sum(self, labels: tuple[str, ...] = ()) -> float:
+        s = self._series.get(labels)
+        return s[-1] if s else 0.0
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for k, s in items:
+            cum = 0.0
+            for le, n in zip([*map(_num, self.buckets), "+Inf"], s[:-1]):
+                cum += n
+                bound = 'le="' + le + '"'
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, k, bound)} {_num(cum)}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, k)} {_num(s[-1])}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, k)} {_num(cum)}")
+        return out
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: list[Counter | Histogram] = []
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        m = Counter(name, help, labelnames)
+        self._metrics.append(m)
+        return m
+
+    def histogram(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        m = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(m)
+        return m
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.counter("arthasutra_http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_LATENCY = registry.histogram("arthasutra_http_request_duration_seconds", "Time until response headers, by route", ("method", "route"))
+HTTP_SQL = registry.histogram("arthasutra_http_sql_statements", "SQL statements per request, by route", ("method", "route"), STATEMENT_BUCKETS)
+HTTP_SQL_SECONDS = registry.counter("arthasutra_http_sql_seconds_total", "Time spent in SQL, by route", ("method", "route"))
+JOB_DURATION = registry.histogram("arthasutra_job_duration_seconds", "Background job run time", ("job",))
+JOB_ERRORS = registry.counter("arthasutra_job_errors_total", "Background job runs that raised", ("job",))
+JOB_SQL = registry.counter("arthasutra_job_sql_statements_total", "SQL statements issued by background jobs", ("job",))
+JOB_SQL_SECONDS = registry.counter("arthasutra_job_sql_seconds_total", "Time spent in SQL by background jobs", ("job",))
+OTHER_SQL = registry.counter("arthasutra_sql_unscoped_statements_total", "SQL statements outside any request or job")
+OTHER_SQL_SECONDS = registry.counter("arthasutra_sql_unscoped_seconds_total", "SQL time outside any request or job")
+
+
+class Scope:
+    __slots__ = ("statements", "sql_seconds")
+
+    def __init__(self) -> None:
+        self.statements = 0
+        self.sql_seconds = 0.0
+
+
+_scope: ContextVar[Optional[Scope]] = ContextVar("arthasutra_metrics_scope", default=None)
+
+
+def current_scope() -> Optional[Scope]:
+    return _scope.get()
+
+
+@contextmanager
+def scoped() -> Iterator[Scope]:
+    """Attribute SQL issued inside the block (this context and threads it hands off to)."""
+    scope = Scope()
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+
+
+@contextmanager
+def track_job(job: str) -> Iterator[Scope]:
+    """Record one background-job run: duration, errors and its SQL."""
+    if not METRICS_ENABLED:
+        yield Scope()
+        return
+    t0 = time.perf_counter()
+    labels = (job,)
+    with scoped() as scope:
+        try:
+            yield scope
+        except BaseException:
+            JOB_ERRORS.inc(labels)
+            raise
+        finally:
+            JOB_DURATION.observe(labels, time.perf_counter() - t0)
+            if scope.statements:
+                JOB_SQL.inc(labels, scope.statements)
+                JOB_SQL_SECONDS.inc(labels, scope.sql_seconds)
+
+
+# -- SQLAlchemy hooks --------------------------------------------------------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ANN001
+    conn.info.setdefault("_metrics_t0", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ANN001
+    starts = conn.info.get("_metrics_t0")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    scope = _scope.get()
+    if scope is not None:
+        scope.statements += 1
+        scope.sql_seconds += elapsed
+    else:
+        OTHER_SQL.inc()
+        OTHER_SQL_SECONDS.inc((), elapsed)
+
+
+def install_sql_hooks(engine: Engine) -> None:
+    if not METRICS_ENABLED or event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# -- ASGI middleware ---------------------------------------------------------
+# route id -> path prefix it was included under (FastAPI may keep included routes unprefixed)
+_prefixes: dict[int, str] = {}
+
+
+def _route_label(scope: dict) -> str:
+    """The matched route's full path template, e.g. ``/portfolios/{portfolio_id}/dashboard``."""
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "<unmatched>"
+    regex = getattr(route, "path_regex", None)
+    if regex is None:
+        return template
+    path = scope.get("path", "")
+    prefix = _prefixes.get(id(route))
+    if prefix is None or not path.startswith(prefix) or not regex.match(path[len(prefix):]):
+        # The prefix is whatever precedes the part the route's own pattern matches
+        cuts = [i for i, c in enumerate(path) if c == "/"] + [len(path)]
+        prefix = next((path[:i] for i in cuts if regex.match(path[i:])), "")
+        _prefixes[id(route)] = prefix
+    return prefix + template
+
+
+class MetricsMiddleware:
+    """Per-route latency (to response headers), status and SQL for HTTP requests.
+
+    Routes are labelled by their path template, so ids do not multiply series;
+    unmatched paths share one label. Latency stops at ``http.response.start`` so
+    streaming responses are measured like the rest; their SQL is recorded when the
+    stream ends.
+    """
+
+    def __init__(self, app, skip_paths: tuple[str, ...] = ("/metrics",)) -> None:  # noqa: ANN001
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send) -> None:  # noqa: ANN001
+        if scope["type"] != "http" or not METRICS_ENABLED or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+        t0 = time.perf_counter()
+        status = ["500"]
+        latency: list[float] = []
+
+        async def _send(message) -> None:  # noqa: ANN001
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+                latency.append(time.perf_counter() - t0)
+            await send(message)
+
+        sql = Scope()
+        token = _scope.set(sql)
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _scope.reset(token)
+            labels = (scope["method"], _route_label(scope))
+            HTTP_REQUESTS.inc((*labels, status[0]))
+            HTTP_LATENCY.observe(labels, latency[0] if latency else time.perf_counter() - t0)
+            HTTP_SQL.observe(labels, sql.statements)
+            if sql.sql_seconds:
+                HTTP_SQL_SECONDS.inc(labels, sql.sql_seconds)
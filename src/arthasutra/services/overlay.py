@@ -0,0 +1,501 @@
+"""Overlay engine: trim into strength, buy back on pullbacks, evaluated per tick.
+
+Every (portfolio, security) pair with ``overlay.enabled`` gets a compact state machine
+whose trigger prices are precomputed when it is armed, so a tick costs a couple of
+float comparisons and no database access. Quotes arrive through
+:class:`~arthasutra.services.quote_store.QuoteStore` listeners, which both the Kite
+tick pipeline and the yfinance poller publish to. Fired triggers become
+:class:`OverlayEvent`\\ s; states that changed are checkpointed to
+``overlaycheckpoint`` by a background thread and restored on reload.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import json
+import os
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Callable, ContextManager, Iterable, Mapping, Optional
+
+import yaml
+from sqlmodel import Session, select
+
+from arthasutra.db.models import ConfigText, Holding, OverlayCheckpoint, PriceSnapshot, Security
+from arthasutra.services.indicator_state import ATR_WINDOW, load_indicator_states
+from arthasutra.services.metrics import track_job
+from arthasutra.services.quote_store import LiveQuote
+
+
+ARMED, TRIMMED, STOPPED = "armed", "trimmed", "stopped"
+TRIM, BUYBACK, STOP = "TRIM", "BUYBACK", "STOP"
+
+
+@dataclass(frozen=True)
+class OverlayParams:
+    """The ``overlay:`` config block (see docs/config-schema.md)."""
+
+    enabled: bool = False
+    anchor_type: str = "last_close"  # last_close | avg_price | manual
+    anchor_value: Optional[float] = None
+    anchor_values: Mapping[str, float] = field(default_factory=dict)  # "NSE:SYM" -> manual anchor
+    tp1_percent: float = 8.0
+    tp1_trim_pct: float = 20.0
+    buyback_percent: float = -3.0
+    buyback_add_pct: float = 20.0
+    atr_mult_stop: Optional[float] = 2.0
+    atr_mult_tp: Optional[float] = 2.5
+    net_units_target: Optional[float] = None  # max units the overlay may be net short over the window
+    net_units_window_days: int = 30
+
+    @classmethod
+    def from_config(cls, block: Optional[Mapping]) -> "OverlayParams":
+        block = dict(block or {})
+        anchor = block.pop("anchor", None) or {}
+        if not isinstance(anchor, Mapping):
+            anchor = {"type": "manual", "value": anchor}
+        known = {f for f in cls.__dataclass_fields__ if not f.startswith("anchor")}
+        kwargs = {k: v for k, v in block.items() if k in known}
+        return cls(
+            anchor_type=str(anchor.get("type", "last_close")),
+            anchor_value=anchor.get("value"),
+            anchor_values={str(k).upper(): float(v) for k, v in (anchor.get("values") or {}).items()},
+            **kwargs,
+        )
+
+    def anchor_for(self, symbol: str, avg_price: Optional[float], last_close: Optional[float]) -> Optional[float]:
+        if self.anchor_type == "manual":
+            v = self.anchor_values.get(symbol.upper(), self.anchor_value)
+            return float(v) if v is not None else None
+        if self.anchor_type == "avg_price":
+            return avg_price or None
+        return last_close
+
+
+def parse_overlay_config(yaml_text: str) -> Optional[OverlayParams]:
+    """Overlay params from a portfolio's YAML config, or None if disabled/unparseable."""
+    if not yaml_text:
+        return None
+    try:
+        doc = yaml.safe_load(yaml_text) or {}
+    except yaml.YAMLError:
+        return None
+    block = doc.get("overlay") if isinstance(doc, Mapping) else None
+    if not isinstance(block, Mapping) or not block.get("enabled"):
+        return None
+    return OverlayParams.from_config(block)
+
+
+@dataclass(frozen=True)
+class OverlayEvent:
+    seq: int
+    portfolio_id: int
+    security_id: int
+    kind: str  # TRIM | BUYBACK | STOP
+    price: float
+    qty: float
+    ts: dt.datetime
+    reason: str
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d["ts"] = self.ts.isoformat()
+        return d
+
+
+class OverlayState:
+    """Per-(portfolio, security) overlay state machine: ``armed -> trimmed -> armed``, or ``stopped``.
+
+    ``tp_px``, ``buyback_px`` and ``stop_px`` are recomputed only on transitions, so
+    :meth:`on_price` does no arithmetic beyond comparisons on the hot path.
+    """
+
+    __slots__ = (
+        "portfolio_id", "security_id", "symbol", "units", "anchor", "atr", "params", "phase",
+        "tp_px", "stop_px", "buyback_px", "last_trim_px", "net_units", "legs", "last_price",
+    )
+
+    def __init__(
+        self,
+        portfolio_id: int,
+        security_id: int,
+        units: float,
+        anchor: float,
+        params: OverlayParams,
+        atr: Optional[float] = None,
+        symbol: str = "",
+    ) -> None:
+        self.portfolio_id = portfolio_id
+        self.security_id = security_id
+        self.symbol = symbol
+        self.units = float(units)
+        self.anchor = float(anchor)
+        self.atr = atr
+        self.params = params
+        self.phase = ARMED
+        self.last_trim_px: Optional[float] = None
+        self.buyback_px: Optional[float] = None
+        self.net_units = 0.0  # overlay's signed units: trims negative, buybacks positive
+        self.legs: deque[tuple[dt.datetime, float]] = deque()
+        self.last_price: Optional[float] = None
+        self._arm()
+
+    def _arm(self) -> None:
+        p = self.params
+        tp = self.anchor * (1.0 + p.tp1_percent / 100.0)
+        if self.atr and p.atr_mult_tp:
+            tp = min(tp, self.anchor + p.atr_mult_tp * self.atr)
+        # Don't re-trim below the last trim straight after a buyback
+        self.tp_px = max(tp, self.last_trim_px) if self.last_trim_px is not None else tp
+        self.stop_px = self.anchor - p.atr_mult_stop * self.atr if self.atr and p.atr_mult_stop else None
+        if self.last_trim_px is not None:
+            self.buyback_px = self.last_trim_px * (1.0 + p.buyback_percent / 100.0)
+
+    def on_price(self, price: float, ts: dt.datetime) -> Optional[tuple[str, float, str]]:
+        """Advance on one tick; returns ``(kind, qty, reason)`` when a trigger fires."""
+        self.last_price = price
+        phase = self.phase
+        if phase == ARMED:
+            if price >= self.tp_px:
+                hit = self._trim(price, ts)
+                if hit is not None:
+                    return hit
+        elif phase == TRIMMED:
+            if price <= self.buyback_px:
+                return self._buyback(price, ts)
+        else:
+            return None
+        if self.stop_px is not None and price <= self.stop_px:
+            self.phase = STOPPED
+            return STOP, round(self.units + self.net_units, 4), "atr_stop"
+        return None
+
+    def _window_net(self, ts: dt.datetime) -> float:
+        cutoff = ts - dt.timedelta(days=self.params.net_units_window_days)
+        legs = self.legs
+        while legs and legs[0][0] < cutoff:
+            legs.popleft()
+        return sum(q for _, q in legs)
+
+    def _trim(self, price: float, ts: dt.datetime) -> Optional[tuple[str, float, str]]:
+        p = self.params
+        qty = round(self.units * p.tp1_trim_pct / 100.0, 4)
+        if qty <= 0:
+            return None
+        # Net-units stabilizer: don't let the overlay drift too far short within the window
+        if p.net_units_target and -(self._window_net(ts) - qty) > p.net_units_target:
+            return None
+        self.phase = TRIMMED
+        self.last_trim_px = price
+        self.net_units -= qty
+        self.legs.append((ts, -qty))
+        self._arm()
+        return TRIM, qty, "tp1"
+
+    def _buyback(self, price: float, ts: dt.datetime) -> tuple[str, float, str]:
+        qty = round(self.units * self.params.buyback_add_pct / 100.0, 4)
+        self.phase = ARMED
+        self.net_units += qty
+        self.legs.append((ts, qty))
+        self._arm()
+        return BUYBACK, qty, "buyback"
+
+    # -- checkpoints -----------------------------------------------------
+    def to_json(self) -> str:
+        return json.dumps({
+            "phase": self.phase,
+            "anchor": self.anchor,
+            "last_trim_px": self.last_trim_px,
+            "net_units": self.net_units,
+            "legs": [(ts.isoformat(), q) for ts, q in self.legs],
+            "last_price": self.last_price,
+        })
+
+    def restore(self, text: str) -> None:
+        """Resume transitions from a checkpoint; thresholds follow the current anchor/ATR."""
+        d = json.loads(text)
+        self.phase = d.get("phase", ARMED)
+        self.last_trim_px = d.get("last_trim_px")
+        self.net_units = float(d.get("net_units", 0.0))
+        self.legs = deque((dt.datetime.fromisoformat(ts), float(q)) for ts, q in d.get("legs", []))
+        self.last_price = d.get("last_price")
+        self._arm()
+
+    def to_dict(self) -> dict:
+        return {
+            "security_id": self.security_id,
+            "symbol": self.symbol,
+            "phase": self.phase,
+            "units": self.units,
+            "anchor": self.anchor,
+            "atr": self.atr,
+            "tp_px": self.tp_px,
+            "buyback_px": self.buyback_px if self.phase == TRIMMED else None,
+            "stop_px": self.stop_px,
+            "last_trim_px": self.last_trim_px,
+            "net_units": self.net_units,
+            "last_price": self.last_price,
+        }
+
+
+def load_overlay_states(session: Session, portfolio_ids: Optional[Iterable[int]] = None) -> list[OverlayState]:
+    """Build states for every portfolio (or those in ``portfolio_ids``) whose latest config enables the overlay.
+
+    Anchors come from the config (or the holding's average price / last close), ATRs
+    from the incremental indicator state; saved checkpoints are restored.
+    """
+    stmt = select(ConfigText).order_by(ConfigText.id.asc())
+    if portfolio_ids is not None:
+        stmt = stmt.where(ConfigText.portfolio_id.in_(list(portfolio_ids)))
+    latest: dict[int, ConfigText] = {}
+    for cfg in session.exec(stmt).all():
+        latest[cfg.portfolio_id] = cfg
+    params = {pid: p for pid, cfg in latest.items() if (p := parse_overlay_config(cfg.yaml_text)) is not None}
+    if not params:
+        return []
+
+    rows = session.exec(
+        select(Holding, Security, PriceSnapshot.last_close)
+        .join(Security, Security.id == Holding.security_id)
+        .outerjoin(PriceSnapshot, PriceSnapshot.security_id == Security.id)
+        .where(Holding.portfolio_id.in_(list(params)))
+        .order_by(Holding.id.asc())
+    ).all()
+    indicators = load_indicator_states(session, {sec.id for _, sec, _ in rows})
+    checkpoints = {
+        (c.portfolio_id, c.security_id): c.state_json
+        for c in session.exec(select(OverlayCheckpoint).where(OverlayCheckpoint.portfolio_id.in_(list(params)))).all()
+    }
+    out: list[OverlayState] = []
+    for h, sec, last_close in rows:
+        p = params[h.portfolio_id]
+        symbol = f"{sec.exchange}:{sec.symbol}"
+        anchor = p.anchor_for(symbol, h.avg_price, last_close)
+        if not anchor or h.qty_total <= 0:
+            continue
+        ind = indicators.get(sec.id)
+        atr = ind.values()[f"atr{ATR_WINDOW}"] if ind is not None else None
+        st = OverlayState(h.portfolio_id, sec.id, h.qty_total, anchor, p, atr=atr, symbol=symbol)
+        saved = checkpoints.get((h.portfolio_id, sec.id))
+        if saved:
+            st.restore(saved)
+        out.append(st)
+    return out
+
+
+def save_checkpoints(session: Session, rows: Mapping[tuple[int, int], str]) -> int:
+    """Upsert ``{(portfolio_id, security_id): state_json}`` in one batched statement."""
+    if not rows:
+        return 0
+    now = dt.datetime.now(dt.UTC)
+    name = session.get_bind().dialect.name
+    if name not in ("sqlite", "postgresql"):
+        for (pid, sid), text in rows.items():
+            row = session.get(OverlayCheckpoint, (pid, sid)) or OverlayCheckpoint(portfolio_id=pid, security_id=sid)
+            row.state_json, row.updated_at = text, now
+            session.add(row)
+        return len(rows)
+    if name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    stmt = dialect_insert(OverlayCheckpoint)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[OverlayCheckpoint.portfolio_id, OverlayCheckpoint.security_id],
+        set_={"state_json": stmt.excluded.state_json, "updated_at": stmt.excluded.updated_at},
+    )
+    params = [
+        {"portfolio_id": pid, "security_id": sid, "state_json": text, "updated_at": now}
+        for (pid, sid), text in rows.items()
+    ]
+    session.flush()
+    session.connection().execute(stmt, params)
+    return len(params)
+
+
+class OverlayEngine:
+    """Routes quotes to overlay states and collects fired triggers.
+
+    :meth:`on_quotes` is registered as a quote-store listener: one dict lookup per
+    quote, then the state's comparisons, under a lock held for the batch. States that
+    fired are marked dirty and written by :meth:`flush` (periodically, see
+    :meth:`start`). Recent events are kept in a bounded buffer for polling clients;
+    listeners added with :meth:`add_listener` get each event as it fires.
+    """
+
+    def __init__(self, max_events: int = 1000) -> None:
+        self._states: dict[int, list[OverlayState]] = {}
+        self._by_key: dict[tuple[int, int], OverlayState] = {}
+        self._dirty: set[tuple[int, int]] = set()
+        self._events: deque[OverlayEvent] = deque(maxlen=max_events)
+        self._listeners: tuple[Callable[[OverlayEvent], None], ...] = ()
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._session_factory: Optional[Callable[[], ContextManager[Session]]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.interval = 30.0
+        self.ticks = 0
+        self.fired = 0
+        self.checkpoints = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+    # -- loading ---------------------------------------------------------
+    def _install(self, by_key: dict[tuple[int, int], OverlayState]) -> None:
+        # Caller holds the lock
+        by_sid: dict[int, list[OverlayState]] = {}
+        for st in by_key.values():
+            by_sid.setdefault(st.security_id, []).append(st)
+        self._states, self._by_key = by_sid, by_key
+        self._dirty &= set(by_key)
+
+    def load(self, states: Iterable[OverlayState]) -> int:
+        by_key = {(st.portfolio_id, st.security_id): st for st in states}
+        with self._lock:
+            self._install(by_key)
+        return len(by_key)
+
+    def reload(self, session: Session) -> int:
+        """Rebuild states from configs, holdings and checkpoints (pending checkpoints are written first)."""
+        self.flush()
+        return self.load(load_overlay_states(session))
+
+    def reload_portfolio(self, session: Session, portfolio_id: int) -> int:
+        """Rebuild one portfolio's states after its holdings or config changed; returns its states.
+
+        Units, anchors and ATRs follow the database; pairs already tracked keep their
+        live phase and legs, which may be newer than their checkpoint.
+        """
+        fresh = load_overlay_states(session, [portfolio_id])
+        with self._lock:
+            by_key = {k: st for k, st in self._by_key.items() if k[0] != portfolio_id}
+            for st in fresh:
+                old = self._by_key.get((portfolio_id, st.security_id))
+                if old is not None:
+                    st.restore(old.to_json())
+                by_key[(portfolio_id, st.security_id)] = st
+            self._install(by_key)
+        return len(fresh)
+
+    def forget(self, portfolio_id: int) -> int:
+        """Drop a deleted portfolio's states, pending checkpoints and events; returns states dropped."""
+        with self._lock:
+            by_key = {k: st for k, st in self._by_key.items() if k[0] != portfolio_id}
+            dropped = len(self._by_key) - len(by_key)
+            self._install(by_key)
+            self._events = deque((e for e in self._events if e.portfolio_id != portfolio_id), maxlen=self._events.maxlen)
+        return dropped
+
+    # -- ticks -----------------------------------------------------------
+    def on_quotes(self, quotes: Iterable[LiveQuote]) -> int:
+        """Evaluate a batch of quotes; returns how many triggers fired."""
+        fired: list[OverlayEvent] = []
+        with self._lock:
+            index = self._states
+            for q in quotes:
+                states = index.get(q.security_id)
+                if states is None:
+                    continue
+                self.ticks += 1
+                for st in states:
+                    hit = st.on_price(q.ltp, q.ts)
+                    if hit is None:
+                        continue
+                    self._seq += 1
+                    ev = OverlayEvent(self._seq, st.portfolio_id, st.security_id, hit[0], q.ltp, hit[1], q.ts, hit[2])
+                    self._events.append(ev)
+                    self._dirty.add((st.portfolio_id, st.security_id))
+                    fired.append(ev)
+            self.fired += len(fired)
+        for ev in fired:
+            for fn in self._listeners:
+                try:
+                    fn(ev)
+                except Exception as e:
+                    self.errors += 1
+                    self.last_error = str(e)
+        return len(fired)
+
+    def add_listener(self, fn: Callable[[OverlayEvent], None]) -> None:
+        if fn not in self._listeners:
+            self._listeners = self._listeners + (fn,)
+
+    def remove_listener(self, fn: Callable[[OverlayEvent], None]) -> None:
+        self._listeners = tuple(f for f in self._listeners if f is not fn)
+
+    # -- reads -----------------------------------------------------------
+    def events(self, portfolio_id: Optional[int] = None, after_seq: int = 0) -> list[OverlayEvent]:
+        with self._lock:
+            return [
+                e for e in self._events
+                if e.seq > after_seq and (portfolio_id is None or e.portfolio_id == portfolio_id)
+            ]
+
+    def states(self, portfolio_id: int) -> list[dict]:
+        with self._lock:
+            return [st.to_dict() for (pid, _), st in self._by_key.items() if pid == portfolio_id]
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    # -- checkpoints -----------------------------------------------------
+    def flush(self) -> int:
+        """Checkpoint states that changed since the last flush; returns rows written."""
+        if self._session_factory is None:
+            return 0
+        with self._lock:
+            keys, self._dirty = self._dirty, set()
+            rows = {k: self._by_key[k].to_json() for k in keys if k in self._by_key}
+        if not rows:
+            return 0
+        try:
+            with track_job("overlay_checkpoint"), self._session_factory() as s:
+                written = save_checkpoints(s, rows)
+        except Exception as e:
+            with self._lock:
+                self._dirty |= keys
+                self.errors += 1
+                self.last_error = str(e)
+            return 0
+        self.checkpoints += written
+        return written
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.flush()
+        self.flush()
+
+    def start(self, session_factory: Callable[[], ContextManager[Session]], interval: Optional[float] = None) -> None:
+        self._session_factory = session_factory
+        if interval is not None:
+            self.interval = interval
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="overlay-checkpoint", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> dict[str, object]:
+        with self._lock:
+            return {
+                "states": len(self._by_key),
+                "dirty": len(self._dirty),
+                "seq": self._seq,
+                "ticks": self.ticks,
+                "fired": self.fired,
+                "checkpoints": self.checkpoints,
+                "errors": self.errors,
+                "last_error": self.last_error,
+            }
+
+
+overlay_engine = OverlayEngine(max_events=int(os.getenv("OVERLAY_EVENT_BUFFER", "1000")))
+overlay_engine.interval = float(os.getenv("OVERLAY_CHECKPOINT_SECONDS", "30"))
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import os
+import time
+from typing import AsyncIterator, Callable, ContextManager, Optional
+
+from sqlmodel import Session
+
+from arthasutra.services.analytics import PositionStats, context_position_stats
+from arthasutra.services.live import is_market_session
+from arthasutra.services.metrics import track_job
+from arthasutra.services.quote_store import QuoteStore, quote_store
+from arthasutra.services.valuation import ValuationContext, load_valuation_context
+
+
+# Fields sent on every position change; the snapshot carries the full row
+DELTA_FIELDS = ("last_price", "pnl_inr", "pct_today", "price_source")
+
+
+def _full_row(sid: int, stats: PositionStats) -> dict:
+    return {
+        "security_id": sid,
+        "symbol": stats.symbol,
+        "exchange": stats.exchange,
+        "qty": stats.qty,
+        "avg_price": stats.avg_price,
+        "last_price": stats.last_price,
+        "prev_close": stats.prev_close,
+        "pct_today": stats.pct_today,
+        "pnl_inr": stats.pnl_inr,
+        "price_source": stats.price_source,
+    }
+
+
+class PortfolioFeed:
+    """Valuation state for one streamed portfolio, shared by all of its clients.
+
+    Loaded once from the database; afterwards only positions whose quote changed in
+    the quote store are recomputed, from the cached closes, with no SQL.
+    """
+
+    def __init__(self, portfolio_id: int, ctx: ValuationContext, store: QuoteStore) -> None:
+        self.portfolio_id = portfolio_id
+        self.store = store
+        self.seq = store.seq
+        self._load(ctx)
+
+    def _load(self, ctx: ValuationContext) -> None:
+        self.ctx = ctx
+        ctx.quotes = self.store.get_many(sec.id for _, sec in ctx.holdings)
+        self.positions: dict[int, PositionStats] = {
+            sec.id: context_position_stats(ctx, h, sec) for h, sec in ctx.holdings
+        }
+        self._holdings = {sec.id: (h, sec) for h, sec in ctx.holdings}
+
+    def totals(self) -> dict:
+        return {
+            "equity_value": sum(p.qty * p.last_price for p in self.positions.values()),
+            "pnl_inr": sum(p.pnl_inr for p in self.positions.values()),
+        }
+
+    def snapshot(self) -> dict:
+        return {
+            "type": "snapshot",
+            "portfolio_id": self.portfolio_id,
+            "seq": self.seq,
+            **self.totals(),
+            "positions": [_full_row(sid, p) for sid, p in self.positions.items()],
+        }
+
+    def _diff(self, before: dict[int, PositionStats]) -> Optional[dict]:
+        rows = []
+        for sid, p in self.positions.items():
+            old = before.get(sid)
+            if old is None or any(getattr(old, f) != getattr(p, f) for f in DELTA_FIELDS):
+                rows.append({"security_id": sid, "symbol": p.symbol, **{f: getattr(p, f) for f in DELTA_FIELDS}})
+        if not rows:
+            return None
+        return {"type": "delta", "portfolio_id": self.portfolio_id, "seq": self.seq, "positions": rows, "totals": self.totals()}
+
+    def apply_quotes(self) -> Optional[dict]:
+        """Pick up quotes newer than the last seen sequence; returns a delta message or None."""
+        seq = self.store.seq
+        if seq == self.seq:
+            return None
+        changed = [sid for sid in self._holdings if (q := self.store.get(sid)) is not None and q.seq > self.seq]
+        self.seq = seq
+        if not changed:
+            return None
+        ctx = self.ctx
+        ctx.now = dt.datetime.now(dt.UTC)
+        ctx.in_session = is_market_session()
+        before = dict(self.positions)
+        for sid in changed:
+            ctx.quotes[sid] = self.store.get(sid)
+            h, sec = self._holdings[sid]
+            self.positions[sid] = context_position_stats(ctx, h, sec)
+        return self._diff(before)
+
+    def reload(self, ctx: ValuationContext) -> Optional[dict]:
+        """Swap in a freshly loaded context (holdings, closes); snapshot if holdings changed."""
+        old_keys = {sid: (h.qty_total, h.avg_price) for sid, (h, _) in self._holdings.items()}
+        before = self.positions
+        self.seq = self.store.seq
+        self._load(ctx)
+        if {sid: (h.qty_total, h.avg_price) for sid, (h, _) in self._holdings.items()} != old_keys:
+            return self.snapshot()
+        return self._diff(before)
+
+
+class _Subscriber:
+    """Per-client mailbox; pending deltas coalesce until the client's next send."""
+
+    def __init__(self) -> None:
+        self.event = asyncio.Event()
+        self.snapshot: Optional[dict] = None
+        self.positions: dict[int, dict] = {}
+        self.totals: Optional[dict] = None
+        self.seq = 0
+
+    def push(self, msg: dict) -> None:
+        if msg["type"] == "snapshot":
+            self.snapshot, self.positions, self.totals = msg, {}, None
+        else:
+            for row in msg["positions"]:
+                self.positions[row["security_id"]] = row
+            self.totals = msg["totals"]
+        self.seq = msg["seq"]
+        self.event.set()
+
+    def take(self, portfolio_id: int) -> list[dict]:
+        out: list[dict] = []
+        if self.snapshot is not None:
+            out.append(self.snapshot)
+        if self.positions:
+            out.append({
+                "type": "delta",
+                "portfolio_id": portfolio_id,
+                "seq": self.seq,
+                "positions": list(self.positions.values()),
+                "totals": self.totals,
+            })
+        self.snapshot, self.positions, self.totals = None, {}, None
+        self.event.clear()
+        return out
+
+
+class StreamHub:
+    """Fans quote-store changes out to streaming dashboard clients.
+
+    One background task per event loop polls the store's sequence number; each
+    watched portfolio is revalued once per change and the resulting delta is merged
+    into every subscriber's mailbox. Contexts are reloaded every ``refresh_seconds``
+    to pick up trades and new EOD closes.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], ContextManager[Session]],
+        store: QuoteStore,
+        poll_interval: float = 0.2,
+        refresh_seconds: float = 60.0,
+    ) -> None:
+        self._session_factory = session_factory
+        self.store = store
+        self.poll_interval = poll_interval
+        self.refresh_seconds = refresh_seconds
+        self._feeds: dict[int, PortfolioFeed] = {}
+        self._subs: dict[int, set[_Subscriber]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._loaded_at: dict[int, float] = {}
+
+    def _load_ctx(self, portfolio_id: int) -> ValuationContext:
+        # Own scope: the hub task would otherwise bill this to the first subscriber's request
+        with track_job("portfolio_stream"), self._session_factory() as s:
+            self.store.ensure_warm(s)
+            return load_valuation_context(s, portfolio_id)
+
+    async def subscribe(self, portfolio_id: int) -> tuple[_Subscriber, dict]:
+        feed = self._feeds.get(portfolio_id)
+        if feed is None:
+            ctx = await asyncio.to_thread(self._load_ctx, portfolio_id)
+            feed = self._feeds.setdefault(portfolio_id, PortfolioFeed(portfolio_id, ctx, self.store))
+            self._loaded_at[portfolio_id] = time.monotonic()
+        else:
+            # Catch up before snapshotting so the client starts from current quotes
+            msg = feed.apply_quotes()
+            if msg:
+                self._broadcast(portfolio_id, msg)
+        sub = _Subscriber()
+        self._subs.setdefault(portfolio_id, set()).add(sub)
+        self._ensure_task()
+        return sub, feed.snapshot()
+
+    def unsubscribe(self, portfolio_id: int, sub: _Subscriber) -> None:
+        subs = self._subs.get(portfolio_id)
+        if subs is None:
+            return
+        subs.discard(sub)
+        if not subs:
+            self._subs.pop(portfolio_id, None)
+            self._feeds.pop(portfolio_id, None)
+            self._loaded_at.pop(portfolio_id, None)
+
+    def _broadcast(self, portfolio_id: int, msg: dict) -> None:
+        for sub in self._subs.get(portfolio_id, ()):
+            sub.push(msg)
+
+    def _ensure_task(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while self._feeds:
+            await asyncio.sleep(self.poll_interval)
+            now = time.monotonic()
+            for pid, feed in list(self._feeds.items()):
+                if now - self._loaded_at.get(pid, now) >= self.refresh_seconds:
+                    self._loaded_at[pid] = now
+                    try:
+                        ctx = await asyncio.to_thread(self._load_ctx, pid)
+                    except Exception:
+                        continue
+                    msg = feed.reload(ctx)
+                else:
+                    msg = feed.apply_quotes()
+                if msg:
+                    self._broadcast(pid, msg)
+
+    async def stream(self, portfolio_id: int, min_interval: float) -> AsyncIterator[dict]:
+        """Yield a snapshot, then coalesced deltas no more often than every ``min_interval`` seconds."""
+        sub, snapshot = await self.subscribe(portfolio_id)
+        try:
+            yield snapshot
+            last_sent = time.monotonic()
+            while True:
+                await sub.event.wait()
+                wait = last_sent + min_interval - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                for msg in sub.take(portfolio_id):
+                    yield msg
+                last_sent = time.monotonic()
+        finally:
+            self.unsubscribe(portfolio_id, sub)
+
+    def stats(self) -> dict[str, int]:
+        return {"portfolios": len(self._feeds), "clients": sum(len(s) for s in self._subs.values())}
+
+
+STREAM_MIN_INTERVAL = int(os.getenv("STREAM_MIN_INTERVAL_MS", "500")) / 1000.0
+
+
+def _default_hub() -> StreamHub:
+    from arthasutra.db.session import ReadSession
+
+    # Read-only loads on the read pool; the loaded rows stay usable after the session closes
+    return StreamHub(
+        ReadSession,
+        quote_store,
+        refresh_seconds=float(os.getenv("STREAM_REFRESH_SECONDS", "60")),
+    )
+
+
+stream_hub = _default_hub()
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import datetime as dt
+from dataclasses import asdict, dataclass
+from typing import Iterable
+
+from sqlalchemy import delete, func, insert, tuple_, update
+from sqlmodel import Session, select
+
+from arthasutra.db.models import Holding, Lot, Security
+from arthasutra.services.csv_importer import CSVRow
+from arthasutra.services.eod_ingest import EODBar, upsert_eod_bars
+
+
+_PAIR_CHUNK = 400
+_QTY_EPS = 1e-9
+
+
+@dataclass
+class PositionsImportResult:
+    rows: int = 0
+    securities_created: int = 0
+    securities_updated: int = 0
+    holdings_created: int = 0
+    holdings_updated: int = 0
+    holdings_unchanged: int = 0
+    holdings_removed: int = 0
+    lots_created: int = 0
+    lots_removed: int = 0
+    bars_seeded: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _load_securities(session: Session, pairs: list[tuple[str, str]]) -> dict[tuple[str, str], Security]:
+    out: dict[tuple[str, str], Security] = {}
+    for i in range(0, len(pairs), _PAIR_CHUNK):
+        chunk = pairs[i : i + _PAIR_CHUNK]
+        for sec in session.exec(select(Security).where(tuple_(Security.symbol, Security.exchange).in_(chunk))).all():
+            out.setdefault((sec.symbol, sec.exchange), sec)
+    return out
+
+
+def import_positions(
+    session: Session, portfolio_id: int, rows: Iterable[CSVRow], prune: bool = False
+) -> PositionsImportResult:
+    """Apply a broker positions snapshot to a portfolio as a diff.
+
+    Securities and holdings are preloaded with one query each; only holdings whose
+    quantity or average price changed are updated. A holding's lots are replaced by a
+    single snapshot lot when they no longer add up to its quantity, so re-uploading the
+    same export leaves the lot table alone. With ``prune``, holdings missing from the
+    snapshot are removed. Rows repeating a symbol resolve to the last one. The caller
+    commits.
+    """
+    result = PositionsImportResult()
+    snapshot: dict[tuple[str, str], CSVRow] = {}
+    for r in rows:
+        result.rows += 1
+        snapshot[(r.symbol, r.exchange)] = r
+    if not snapshot and not prune:
+        return result
+
+    # Securities: preload, create the missing ones in one executemany, fill in blank name/sector
+    secs = _load_securities(session, list(snapshot))
+    created = [key for key in snapshot if key not in secs]
+    if created:
+        session.execute(
+            insert(Security),
+            [
+                {"symbol": sym, "exchange": ex, "name": snapshot[(sym, ex)].name or sym, "sector": snapshot[(sym, ex)].sector}
+                for sym, ex in created
+            ],
+        )
+        secs.update(_load_securities(session, created))
+        result.securities_created = len(created)
+    sec_updates = []
+    for key, r in snapshot.items():
+        sec = secs[key]
+        patch = {}
+        if r.name and not sec.name:
+            patch["name"] = r.name
+        if r.sector and not sec.sector:
+            patch["sector"] = r.sector
+        if patch:
+            sec_updates.append({"id": sec.id, **patch})
+    if sec_updates:
+        session.execute(update(Security), sec_updates)
+        result.securities_updated = len(sec_updates)
+
+    # Holdings and their lot totals: one query each
+    holdings = {h.security_id: h for h in session.exec(select(Holding).where(Holding.portfolio_id == portfolio_id)).all()}
+    lot_qty = dict(
+        session.exec(
+            select(Lot.holding_id, func.sum(Lot.qty))
+            .join(Holding, Holding.id == Lot.holding_id)
+            .where(Holding.portfolio_id == portfolio_id)
+            .group_by(Lot.holding_id)
+        ).all()
+    )
+
+    new_holdings: list[dict] = []
+    holding_updates: list[dict] = []
+    relot: list[tuple[int, float, float]] = []  # (holding_id, qty, price)
+    for key, r in snapshot.items():
+        sid = secs[key].id
+        qty, avg = float(r.qty), float(r.avg_price)
+        h = holdings.get(sid)
+        if h is None:
+            new_holdings.append({"portfolio_id": portfolio_id, "security_id": sid, "qty_total": qty, "avg_price": avg})
+            continue
+        if abs(h.qty_total - qty) > _QTY_EPS or abs(h.avg_price - avg) > _QTY_EPS:
+            holding_updates.append({"id": h.id, "qty_total": qty, "avg_price": avg})
+            relot.append((h.id, qty, avg))
+        else:
+            result.holdings_unchanged += 1
+            if abs(float(lot_qty.get(h.id) or 0.0) - qty) > _QTY_EPS:
+                relot.append((h.id, qty, avg))
+    if new_holdings:
+        session.execute(insert(Holding), new_holdings)
+        new_sids = [row["security_id"] for row in new_holdings]
+        for i in range(0, len(new_sids), _PAIR_CHUNK):
+            relot.extend(
+                session.exec(
+                    select(Holding.id, Holding.qty_total, Holding.avg_price).where(
+                        Holding.portfolio_id == portfolio_id, Holding.security_id.in_(new_sids[i : i + _PAIR_CHUNK])
+                    )
+                ).all()
+            )
+        result.holdings_created = len(new_holdings)
+    if holding_updates:
+        session.execute(update(Holding), holding_updates)
+        result.holdings_updated = len(holding_updates)
+
+    stale: list[int] = []
+    if prune:
+        held = {secs[key].id for key in snapshot}
+        stale = [h.id for sid, h in holdings.items() if sid not in held]
+
+    # Lots: drop those of re-lotted/pruned holdings, then insert one snapshot lot each
+    clear_ids = [hid for hid, _, _ in relot if hid in lot_qty] + [hid for hid in stale if hid in lot_qty]
+    if clear_ids:
+        result.lots_removed = session.execute(delete(Lot).where(Lot.holding_id.in_(clear_ids))).rowcount or 0
+    if stale:
+        session.execute(delete(Holding).where(Holding.id.in_(stale)))
+        result.holdings_removed = len(stale)
+    if relot:
+        now = dt.datetime.now(dt.UTC)
+        session.execute(
+            insert(Lot),
+            [
+                {"holding_id": hid, "qty": qty, "price": price, "date": now, "account": "main", "tax_status": "unknown"}
+                for hid, qty, price in relot
+            ],
+        )
+        result.lots_created = len(relot)
+
+    # Seed today's bar from the export's LTP where none exists, for immediate KPIs
+    today = dt.date.today()
+    seeded = [
+        EODBar(security_id=secs[key].id, date=today, open=r.ltp, high=r.ltp, low=r.ltp, close=r.ltp)
+        for key, r in snapshot.items()
+        if r.ltp is not None
+    ]
+    result.bars_seeded = upsert_eod_bars(session, seeded, on_conflict="nothing").written
+    return result
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable
+
+import numpy as np
+from sqlalchemy import event, func
+from sqlmodel import Session, select
+
+from arthasutra.db.models import PriceEOD
+
+
+# Keep IN (...) lists well under SQLite's bound-parameter limit
+_CHUNK = 500
+
+
+@dataclass(frozen=True)
+class PriceHistory:
+    """Column arrays for one security's most recent bars, oldest first."""
+
+    dates: np.ndarray  # datetime64[D]
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    complete: bool = False  # True when this is the security's entire stored history
+
+    def __len__(self) -> int:
+        return len(self.close)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.dates, self.open, self.high, self.low, self.close, self.volume))
+
+    def tail(self, bars: int) -> "PriceHistory":
+        if bars >= len(self):
+            return self
+        s = slice(len(self) - bars, None)
+        return PriceHistory(
+            self.dates[s], self.open[s], self.high[s], self.low[s], self.close[s], self.volume[s], complete=False
+        )
+
+
+def _empty_history() -> PriceHistory:
+    f = np.empty(0, dtype=float)
+    f.flags.writeable = False
+    return PriceHistory(np.empty(0, dtype="datetime64[D]"), f, f, f, f, f, complete=True)
+
+
+def load_history(session: Session, security_ids: Iterable[int], bars: int) -> dict[int, PriceHistory]:
+    """Read at most ``bars`` most recent bars per security, as arrays, in one windowed query per chunk."""
+    ids = sorted(set(security_ids))
+    rows_by_sid: dict[int, list[tuple]] = {sid: [] for sid in ids}
+    for i in range(0, len(ids), _CHUNK):
+        chunk = ids[i : i + _CHUNK]
+        rn = func.row_number().over(partition_by=PriceEOD.security_id, order_by=PriceEOD.date.desc()).label("rn")
+        ranked = (
+            select(
+                PriceEOD.security_id, PriceEOD.date, PriceEOD.open, PriceEOD.high,
+                PriceEOD.low, PriceEOD.close, PriceEOD.volume, rn,
+            )
+            .where(PriceEOD.security_id.in_(chunk))
+            .subquery()
+        )
+        for row in session.exec(
+            select(
+                ranked.c.security_id, ranked.c.date, ranked.c.open, ranked.c.high,
+                ranked.c.low, ranked.c.close, ranked.c.volume,
+            )
+            .where(ranked.c.rn <= bars)
+            .order_by(ranked.c.security_id, ranked.c.rn.desc())
+        ).all():
+            rows_by_sid[row[0]].append(row)
+
+    out: dict[int, PriceHistory] = {}
+    for sid, rows in rows_by_sid.items():
+        if not rows:
+            out[sid] = _empty_history()
+            continue
+        cols = [
+            np.array([r[1] for r in rows], dtype="datetime64[D]"),
+            np.array([r[2] for r in rows], dtype=float),
+            np.array([r[3] for r in rows], dtype=float),
+            np.array([r[4] for r in rows], dtype=float),
+            np.array([r[5] for r in rows], dtype=float),
+            np.array([np.nan if r[6] is None else r[6] for r in rows], dtype=float),
+        ]
+        # Cached arrays are shared between requests
+        for a in cols:
+            a.flags.writeable = False
+        out[sid] = PriceHistory(*cols, complete=len(rows) < bars)
+    return out
+
+
+def _load(session: Session, security_ids: list[int], bars: int) -> dict[int, PriceHistory]:
+    # Prefer the memory-mapped columnar store when enabled; SQL for anything not in it
+    from arthasutra.services.columnar_store import get_columnar_store
+
+    store = get_columnar_store()
+    out: dict[int, PriceHistory] = {}
+    rest = security_ids
+    if store is not None:
+        rest = []
+        for sid in security_ids:
+            hist = store.read_tail(sid, bars)
+            if hist is None:
+                rest.append(sid)
+            else:
+                out[sid] = hist
+    if rest:
+        out.update(load_history(session, rest, bars))
+    return out
+
+
+class PriceHistoryCache:
+    """Process-wide, memory-bounded LRU of per-security price arrays.
+
+    Entries are dropped by :meth:`invalidate` whenever bars are ingested for a security.
+    A per-security generation counter stops a read that raced with an invalidation
+    from re-inserting stale arrays.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[int, PriceHistory] = OrderedDict()
+        self._gen: dict[int, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, session: Session, security_ids: Iterable[int], bars: int) -> dict[int, PriceHistory]:
+        ids = list(dict.fromkeys(security_ids))
+        out: dict[int, PriceHistory] = {}
+        missing: list[int] = []
+        gens: dict[int, int] = {}
+        with self._lock:
+            for sid in ids:
+                entry = self._entries.get(sid)
+                if entry is not None and (entry.complete or len(entry) >= bars):
+                    self._entries.move_to_end(sid)
+                    out[sid] = entry.tail(bars)
+                    self.hits += 1
+                else:
+                    missing.append(sid)
+                    gens[sid] = self._gen.get(sid, 0)
+                    self.misses += 1
+        if missing:
+            loaded = _load(session, missing, bars)
+            with self._lock:
+                for sid, hist in loaded.items():
+                    out[sid] = hist
+                    if self._gen.get(sid, 0) == gens[sid]:
+                        self._put(sid, hist)
+        return out
+
+    def _put(self, sid: int, hist: PriceHistory) -> None:
+        old = self._entries.pop(sid, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+        if hist.nbytes > self.max_bytes:
+            return
+        self._entries[sid] = hist
+        self._bytes += hist.nbytes
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+
+    def invalidate(self, security_ids: Iterable[int] | None = None) -> None:
+        with self._lock:
+            if security_ids is None:
+                for sid in self._entries:
+                    self._gen[sid] = self._gen.get(sid, 0) + 1
+                self._entries.clear()
+                self._bytes = 0
+                return
+            for sid in security_ids:
+                self._gen[sid] = self._gen.get(sid, 0) + 1
+                old = self._entries.pop(sid, None)
+                if old is not None:
+                    self._bytes -= old.nbytes
+
+    def invalidate_on_commit(self, session: Session, security_ids: Iterable[int]) -> None:
+        """Invalidate now and again once ``session`` commits.
+
+        The second pass evicts anything another request cached from the pre-commit state.
+        """
+        ids = set(security_ids)
+        if not ids:
+            return
+        self.invalidate(ids)
+        session.info.setdefault("price_cache_pending", set()).update(ids)
+        if not session.info.get("price_cache_listening"):
+            session.info["price_cache_listening"] = True
+
+            @event.listens_for(session, "after_commit")
+            def _after_commit(sess) -> None:  # noqa: ANN001
+                self.invalidate(sess.info.pop("price_cache_pending", set()))
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+price_cache = PriceHistoryCache(max_bytes=int(float(os.getenv("PRICE_CACHE_MAX_MB", "256")) * 1024 * 1024))
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import datetime as dt
+from typing import Iterable, Mapping
+
+from sqlalchemy import and_, delete, func, insert, literal
+from sqlmodel import Session, select
+
+from arthasutra.db.models import PriceEOD, PriceSnapshot
+
+
+# Keep IN (...) lists well under SQLite's bound-parameter limit
+_CHUNK = 500
+
+
+def _chunks(ids: list[int]) -> Iterable[list[int]]:
+    for i in range(0, len(ids), _CHUNK):
+        yield ids[i : i + _CHUNK]
+
+
+def _ranked(security_ids: list[int] | None = None):
+    rn = func.row_number().over(partition_by=PriceEOD.security_id, order_by=PriceEOD.date.desc()).label("rn")
+    stmt = select(PriceEOD.security_id, PriceEOD.date, PriceEOD.close, rn)
+    if security_ids is not None:
+        stmt = stmt.where(PriceEOD.security_id.in_(security_ids))
+    return stmt
+
+
+def top_two_closes(session: Session, security_ids: Iterable[int]) -> dict[int, list[tuple[dt.date, float]]]:
+    """Latest two (date, close) bars per security straight from PriceEOD, newest first."""
+    out: dict[int, list[tuple[dt.date, float]]] = {}
+    for chunk in _chunks(sorted(set(security_ids))):
+        ranked = _ranked(chunk).subquery()
+        for sid, d, close in session.exec(
+            select(ranked.c.security_id, ranked.c.date, ranked.c.close)
+            .where(ranked.c.rn <= 2)
+            .order_by(ranked.c.security_id, ranked.c.rn)
+        ).all():
+            out.setdefault(sid, []).append((d, float(close)))
+    return out
+
+
+def get_snapshots(session: Session, security_ids: Iterable[int]) -> dict[int, PriceSnapshot]:
+    out: dict[int, PriceSnapshot] = {}
+    for chunk in _chunks(sorted(set(security_ids))):
+        for row in session.exec(select(PriceSnapshot).where(PriceSnapshot.security_id.in_(chunk))).all():
+            out[row.security_id] = row
+    return out
+
+
+def _store(session: Session, row: PriceSnapshot | None, security_id: int, bars: list[tuple[dt.date, float]]) -> None:
+    if not bars:
+        if row is not None:
+            session.delete(row)
+        return
+    if row is None:
+        row = PriceSnapshot(security_id=security_id)
+        session.add(row)
+    row.last_date, row.last_close = bars[0]
+    row.prev_date, row.prev_close = bars[1] if len(bars) > 1 else (None, None)
+    row.updated_at = dt.datetime.now(dt.UTC)
+
+
+def refresh_snapshots(session: Session, security_ids: Iterable[int]) -> int:
+    """Recompute snapshots for the given securities from their two newest PriceEOD rows."""
+    ids = sorted(set(security_ids))
+    if not ids:
+        return 0
+    session.flush()
+    top = top_two_closes(session, ids)
+    existing = get_snapshots(session, ids)
+    for sid in ids:
+        _store(session, existing.get(sid), sid, top.get(sid, []))
+    return len(ids)
+
+
+def apply_bars(session: Session, bars_by_security: Mapping[int, Iterable[tuple[dt.date, float]]]) -> int:
+    """Fold freshly ingested (date, close) bars into the snapshot table.
+
+    Securities that already have a snapshot are merged in memory without touching
+    PriceEOD; the rest are recomputed from PriceEOD once so older history is honoured.
+    """
+    if not bars_by_security:
+        return 0
+    existing = get_snapshots(session, bars_by_security.keys())
+    missing = [sid for sid in bars_by_security if sid not in existing]
+    refresh_snapshots(session, missing)
+    for sid, row in existing.items():
+        merged: dict[dt.date, float] = {}
+        if row.prev_date is not None and row.prev_close is not None:
+            merged[row.prev_date] = float(row.prev_close)
+        if row.last_date is not None and row.last_close is not None:
+            merged[row.last_date] = float(row.last_close)
+        for d, close in bars_by_security[sid]:
+            merged[d] = float(close)
+        top = sorted(merged.items(), key=lambda kv: kv[0], reverse=True)[:2]
+        _store(session, row, sid, top)
+    return len(bars_by_security)
+
+
+def rebuild_snapshots(session: Session) -> int:
+    """Rebuild the whole snapshot table from PriceEOD with a single INSERT ... SELECT."""
+    session.execute(delete(PriceSnapshot))
+    ranked = _ranked().cte("ranked")
+    last = ranked.alias("last")
+    prev = ranked.alias("prev")
+    src = (
+        select(
+            last.c.security_id,
+            last.c.close,
+            last.c.date,
+            prev.c.close,
+            prev.c.date,
+            literal(dt.datetime.now(dt.UTC)),
+        )
+        .select_from(last.outerjoin(prev, and_(prev.c.security_id == last.c.security_id, prev.c.rn == 2)))
+        .where(last.c.rn == 1)
+    )
+    session.execute(
+        insert(PriceSnapshot).from_select(
+            ["security_id", "last_close", "last_date", "prev_close", "prev_date", "updated_at"],
+            src,
+        )
+    )
+    session.commit()
+    return session.exec(select(func.count()).select_from(PriceSnapshot)).one()
@@ -0,0 +1,344 @@
+"""Opt-in per-request profiling.
+
+A request carrying ``X-Profile: 1`` (or ``?profile=1``) is profiled when
+``PROFILE_ENABLED`` is set and it wins the ``PROFILE_SAMPLE_RATE`` draw. While it
+runs, a sampler thread snapshots every ``PROFILE_INTERVAL_MS`` the stacks of the
+threads working on it -- the event loop while the request's coroutine is running,
+and threadpool workers running in its context -- and the SQLAlchemy hooks time each
+statement it issues. Sampling is wall-clock, so time blocked in SQLite shows up
+under the statement that waited.
+
+Each profile is written to ``PROFILE_DIR`` as ``<id>.folded`` (collapsed stacks,
+one ``frame;frame;... count`` line per distinct stack, for flamegraph.pl or
+speedscope) and ``<id>.json`` (the request, timings, top SQL and hottest frames).
+The response carries the id in ``X-Profile-Id``.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import hmac
+import json
+import os
+import random
+import re
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextvars import Context, ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+_TRUE = {"1", "true", "yes", "on"}
+_ID = re.compile(r"^\d{8}T\d{6}-[0-9a-f]{6}$")
+# Expanded IN lists differ per call only in their length
+_IN_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))+\s*\)")
+_WS = re.compile(r"\s+")
+
+
+def _flag(value: Optional[str]) -> bool:
+    return (value or "").strip().lower() in _TRUE
+
+
+def normalize_sql(statement: str) -> str:
+    return _IN_LIST.sub("(...)", _WS.sub(" ", statement).strip())
+
+
+@dataclass
+class SqlStat:
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+
+class Profile:
+    def __init__(self, method: str, path: str, query: str, interval: float) -> None:
+        self.id = f"{time.strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(3)}"
+        self.created_at = dt.datetime.now(dt.UTC)
+        self.request = {"method": method, "path": path, "query": query}
+        self.interval = interval
+        self.status: Optional[int] = None
+        self.duration_ms = 0.0
+        self.samples = 0
+        self.stacks: Counter[tuple[str, ...]] = Counter()
+        self.sql: dict[str, SqlStat] = {}
+        self._lock = threading.Lock()
+
+    def add_stack(self, stack: tuple[str, ...]) -> None:
+        with self._lock:
+            self.stacks[stack] += 1
+            self.samples += 1
+
+    def record_sql(self, statement: str, elapsed: float) -> None:
+        key = normalize_sql(statement)
+        ms = elapsed * 1000.0
+        with self._lock:
+            st = self.sql.get(key)
+            if st is None:
+                st = self.sql[key] = SqlStat()
+            st.count += 1
+            st.total_ms += ms
+            st.max_ms = max(st.max_ms, ms)
+
+    def folded(self) -> str:
+        with self._lock:
+            items = sorted(self.stacks.items())
+        return "".join(f"{';'.join(stack)} {n}\n" for stack, n in items)
+
+    def summary(self, top: int = 20) -> dict:
+        with self._lock:
+            stacks = list(self.stacks.items())
+            sql = sorted(self.sql.items(), key=lambda kv: kv[1].total_ms, reverse=True)
+        leaf: Counter[str] = Counter()
+        inclusive: Counter[str] = Counter()
+        for stack, n in stacks:
+            leaf[stack[-1]] += n
+            for frame in set(stack[1:]):
+                inclusive[frame] += n
+        return {
+            "id": self.id,
+            "created_at": self.created_at.isoformat(),
+            "request": self.request,
+            "status": self.status,
+            "duration_ms": round(self.duration_ms, 3),
+            "interval_ms": self.interval * 1000.0,
+            "samples": self.samples,
+            "sql_statements": sum(st.count for _, st in sql),
+            "sql_ms": round(sum(st.total_ms for _, st in sql), 3),
+            "top_sql": [
+                {"statement": s, "count": st.count, "total_ms": round(st.total_ms, 3), "max_ms": round(st.max_ms, 3)}
+                for s, st in sql[:top]
+            ],
+            "hot_frames": [{"frame": f, "self": n, "total": inclusive[f]} for f, n in leaf.most_common(top)],
+        }
+
+
+_active: ContextVar[Optional[Profile]] = ContextVar("arthasutra_profile", default=None)
+
+
+def current_profile() -> Optional[Profile]:
+    return _active.get()
+
+
+# -- stack sampling ----------------------------------------------------------
+_labels: dict[CodeType, str] = {}
+
+
+def _label(code: CodeType) -> str:
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename.replace("\\", "/")
+        for marker in ("/site-packages/", "/src/", "/lib/python"):
+            if marker in path:
+                path = path.rsplit(marker, 1)[1]
+                break
+        else:
+            path = os.path.basename(path)
+        label = _labels[code] = f"{code.co_name} ({path}:{code.co_firstlineno})"
+    return label
+
+
+def _request_stack(frame: FrameType, profile: Profile) -> Optional[tuple[str, ...]]:
+    """The part of a thread's stack that works for ``profile``, root first; else None.
+
+    The event loop counts while the profiled middleware coroutine is on its stack; a
+    worker thread counts while it runs a callable in a context copied from the request
+    (anyio's worker loop holds that context in a ``context`` local).
+    """
+    frames: list[FrameType] = []
+    f: Optional[FrameType] = frame
+    while f is not None:
+        code = f.f_code
+        if code is _PROFILED_CODE:
+            # Skip the middleware's own bookkeeping once the app has returned
+            if f.f_locals.get("profile") is not profile or (frames and frames[-1].f_code is _STOP_CODE):
+                return None
+            root = "event-loop"
+            break
+        if code.co_name == "run":
+            ctx = f.f_locals.get("context")
+            if isinstance(ctx, Context):
+                if ctx.get(_active, None) is not profile:
+                    return None
+                root = "threadpool"
+                break
+        frames.append(f)
+        f = f.f_back
+    else:
+        return None
+    return (root, *(_label(x.f_code) for x in reversed(frames)))
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, profile: Profile) -> None:
+        super().__init__(name="arthasutra-profiler", daemon=True)
+        self.profile = profile
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        me = threading.get_ident()
+        while not self._done.wait(self.profile.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = _request_stack(frame, self.profile)
+                if stack is not None:
+                    self.profile.add_stack(stack)
+
+    def stop(self) -> None:
+        self._done.set()
+        self.join()
+
+
+# -- SQLAlchemy hooks --------------------------------------------------------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ANN001
+    if _active.get() is not None:
+        conn.info.setdefault("_profile_t0", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ANN001
+    profile = _active.get()
+    starts = conn.info.get("_profile_t0")
+    if profile is None or not starts:
+        return
+    profile.record_sql(statement, time.perf_counter() - starts.pop())
+
+
+def install_sql_hooks(engine: Engine) -> None:
+    if event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# -- storage -----------------------------------------------------------------
+class Profiler:
+    """Settings, the sampling decision, and the profile directory."""
+
+    def __init__(self) -> None:
+        self.enabled = _flag(os.getenv("PROFILE_ENABLED", "0"))
+        self.sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "1.0"))
+        self.interval = max(float(os.getenv("PROFILE_INTERVAL_MS", "5")), 0.1) / 1000.0
+        self.directory = Path(os.getenv("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "arthasutra-profiles"))
+        self.keep = int(os.getenv("PROFILE_KEEP", "100"))
+        # Profiling and /admin require a matching X-Admin-Token header; both stay closed when unset
+        self.admin_token = os.getenv("ADMIN_TOKEN") or None
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return self.admin_token is not None and token is not None and hmac.compare_digest(token, self.admin_token)
+
+    def wants(self, scope: dict) -> bool:
+        """Whether an HTTP request asked to be profiled and is allowed and sampled."""
+        headers = dict(scope.get("headers") or ())
+        flag = headers.get(b"x-profile")
+        if flag is None:
+            qs = scope.get("query_string") or b""
+            if b"profile=" not in qs:
+                return False
+            flag = dict(parse_qsl(qs.decode("latin-1"))).get("profile", "").encode()
+        if not _flag(flag.decode("latin-1")):
+            return False
+        token = headers.get(b"x-admin-token")
+        if not self.authorized(token.decode("latin-1") if token is not None else None):
+            return False
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def begin(self, scope: dict) -> Profile:
+        qs = (scope.get("query_string") or b"").decode("latin-1")
+        query = urlencode([(k, v) for k, v in parse_qsl(qs, keep_blank_values=True) if k != "profile"])
+        return Profile(scope.get("method", "GET"), scope.get("path", ""), query, self.interval)
+
+    def save(self, profile: Profile) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / f"{profile.id}.folded").write_text(profile.folded())
+        path = self.directory / f"{profile.id}.json"
+        path.write_text(json.dumps(profile.summary(), indent=2))
+        self._prune()
+        return path
+
+    def _prune(self) -> None:
+        saved = sorted(self.directory.glob("*.json"))
+        for old in saved[: max(len(saved) - self.keep, 0)]:
+            old.unlink(missing_ok=True)
+            old.with_suffix(".folded").unlink(missing_ok=True)
+
+    def list(self) -> list[dict]:
+        """Stored profiles, newest first, without their SQL and frame tables."""
+        out = []
+        if not self.directory.is_dir():
+            return out
+        for path in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            out.append({k: v for k, v in data.items() if k not in {"top_sql", "hot_frames"}})
+        return out
+
+    def load(self, profile_id: str) -> Optional[dict]:
+        path = self._path(profile_id, ".json")
+        return json.loads(path.read_text()) if path is not None else None
+
+    def folded(self, profile_id: str) -> Optional[str]:
+        path = self._path(profile_id, ".folded")
+        return path.read_text() if path is not None else None
+
+    def _path(self, profile_id: str, suffix: str) -> Optional[Path]:
+        # Ids are generated here; anything else (e.g. "../") is not a profile
+        if not _ID.match(profile_id):
+            return None
+        path = self.directory / f"{profile_id}{suffix}"
+        return path if path.is_file() else None
+
+
+profiler = Profiler()
+
+
+# -- ASGI middleware ---------------------------------------------------------
+class ProfileMiddleware:
+    """Profile requests that ask for it (see :meth:`Profiler.wants`); others pass through."""
+
+    def __init__(self, app) -> None:  # noqa: ANN001
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:  # noqa: ANN001
+        if scope["type"] != "http" or not profiler.enabled or not profiler.wants(scope):
+            await self.app(scope, receive, send)
+            return
+        await self._profiled(profiler.begin(scope), scope, receive, send)
+
+    async def _profiled(self, profile: Profile, scope, receive, send) -> None:  # noqa: ANN001
+        async def _send(message) -> None:  # noqa: ANN001
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = {**message, "headers": [*message.get("headers", ()), (b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        token = _active.set(profile)
+        sampler = _Sampler(profile)
+        sampler.start()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            profile.duration_ms = (time.perf_counter() - t0) * 1000.0
+            sampler.stop()
+            _active.reset(token)
+            try:
+                profiler.save(profile)
+            except OSError:
+                pass  # an unwritable PROFILE_DIR must not fail the request
+
+
+# Marks the event loop's frames that belong to a profiled request
+_PROFILED_CODE = ProfileMiddleware._profiled.__code__
+_STOP_CODE = _Sampler.stop.__code__
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import datetime as dt
+import os
+import threading
+from dataclasses import dataclass
+from typing import Callable, ContextManager, Iterable, Mapping, Optional
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from arthasutra.db.models import QuoteLive
+from arthasutra.services.metrics import track_job
+
+
+def _utc(ts: dt.datetime) -> dt.datetime:
+    # SQLite hands back naive datetimes; everything stored is UTC
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=dt.UTC)
+
+
+@dataclass(frozen=True)
+class LiveQuote:
+    security_id: int
+    ltp: float
+    ts: dt.datetime
+    source: str
+    seq: int
+
+
+class QuoteStore:
+    """Thread-safe, in-process latest quote per security.
+
+    Serves every LTP read without SQL once warmed from ``quotelive``. Writes land here
+    first and are marked dirty; a write-behind thread (see :meth:`start`) persists
+    dirty quotes in batches. Every accepted write gets a store-wide sequence number.
+    Listeners (see :meth:`add_listener`) receive accepted writes on the writer's thread,
+    after the lock is released, so they must be cheap.
+    """
+
+    def __init__(self) -> None:
+        self._quotes: dict[int, LiveQuote] = {}
+        self._dirty: dict[int, LiveQuote] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._warm_lock = threading.Lock()
+        self.warmed = False
+        self._listeners: tuple[Callable[[list[LiveQuote]], None], ...] = ()
+        self._session_factory: Optional[Callable[[], ContextManager[Session]]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.interval = 1.0
+        self.flushes = 0
+        self.rows_written = 0
+        self.errors = 0
+        self.listener_errors = 0
+        self.last_error: Optional[str] = None
+
+    # -- loading ---------------------------------------------------------
+    def warm(self, session: Session) -> int:
+        """Load every ``quotelive`` row; quotes already held (newer writes) are kept."""
+        rows = session.exec(select(QuoteLive.security_id, QuoteLive.ltp, QuoteLive.ts, QuoteLive.source)).all()
+        with self._lock:
+            for sid, ltp, ts, source in rows:
+                self._apply(sid, float(ltp), _utc(ts), source, dirty=False)
+            self.warmed = True
+        return len(rows)
+
+    def ensure_warm(self, session: Session) -> None:
+        if self.warmed:
+            return
+        with self._warm_lock:
+            if not self.warmed:
+                self.warm(session)
+
+    # -- writes ----------------------------------------------------------
+    def _apply(self, sid: int, ltp: float, ts: dt.datetime, source: str, dirty: bool) -> Optional[LiveQuote]:
+        cur = self._quotes.get(sid)
+        if cur is not None and cur.ts > ts:
+            return None
+        self._seq += 1
+        q = LiveQuote(sid, ltp, ts, source, self._seq)
+        self._quotes[sid] = q
+        if dirty:
+            self._dirty[sid] = q
+        return q
+
+    def put(
+        self, security_id: int, ltp: float, ts: Optional[dt.datetime] = None, source: str = "yf", persist: bool = True
+    ) -> Optional[LiveQuote]:
+        """Record a quote; returns it, or None when an even newer quote is already held."""
+        with self._lock:
+            q = self._apply(security_id, float(ltp), _utc(ts or dt.datetime.now(dt.UTC)), source, persist)
+        if q is not None and self._listeners:
+            self._notify([q])
+        return q
+
+    def put_many(
+        self, quotes: Mapping[int, tuple[float, dt.datetime]], source: str = "yf", persist: bool = True
+    ) -> int:
+        accepted: list[LiveQuote] = []
+        with self._lock:
+            for sid, (ltp, ts) in quotes.items():
+                q = self._apply(sid, float(ltp), _utc(ts), source, persist)
+                if q is not None:
+                    accepted.append(q)
+        if accepted and self._listeners:
+            self._notify(accepted)
+        return len(accepted)
+
+    # -- listeners -------------------------------------------------------
+    def add_listener(self, fn: Callable[[list[LiveQuote]], None]) -> None:
+        """Call ``fn`` with every batch of accepted quotes (overlay, alerts)."""
+        # Copy-on-write tuple: writers iterate a stable snapshot without locking
+        if fn not in self._listeners:
+            self._listeners = self._listeners + (fn,)
+
+    def remove_listener(self, fn: Callable[[list[LiveQuote]], None]) -> None:
+        self._listeners = tuple(f for f in self._listeners if f is not fn)
+
+    def _notify(self, quotes: list[LiveQuote]) -> None:
+        for fn in self._listeners:
+            try:
+                fn(quotes)
+            except Exception as e:
+                # A failing consumer must not break quote ingestion
+                self.listener_errors += 1
+                self.last_error = str(e)
+
+    def discard_dirty(self, security_ids: Iterable[int]) -> None:
+        """Forget pending writes the caller has persisted itself."""
+        with self._lock:
+            for sid in security_ids:
+                self._dirty.pop(sid, None)
+
+    # -- reads -----------------------------------------------------------
+    def get(self, security_id: int) -> Optional[LiveQuote]:
+        return self._quotes.get(security_id)
+
+    def get_many(self, security_ids: Iterable[int]) -> dict[int, LiveQuote]:
+        quotes = self._quotes
+        out: dict[int, LiveQuote] = {}
+        for sid in security_ids:
+            q = quotes.get(sid)
+            if q is not None:
+                out[sid] = q
+        return out
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def __len__(self) -> int:
+        return len(self._quotes)
+
+    # -- write-behind ----------------------------------------------------
+    @property
+    def write_behind(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def flush(self) -> int:
+        """Persist dirty quotes with one batched upsert; returns rows written."""
+        from arthasutra.services.live import upsert_ltps
+
+        if self._session_factory is None:
+            return 0
+        with self._lock:
+            batch, self._dirty = self._dirty, {}
+        if not batch:
+            return 0
+        by_source: dict[str, dict[int, tuple[float, dt.datetime]]] = {}
+        for sid, q in batch.items():
+            by_source.setdefault(q.source, {})[sid] = (q.ltp, q.ts)
+        try:
+            with track_job("quote_store_flush"), self._session_factory() as s:
+                written = sum(upsert_ltps(s, rows, source=src) for src, rows in by_source.items())
+        except Exception as e:
+            with self._lock:
+                for sid, q in batch.items():
+                    self._dirty.setdefault(sid, q)
+                self.errors += 1
+                self.last_error = str(e)
+            return 0
+        self.flushes += 1
+        self.rows_written += written
+        return written
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.flush()
+        self.flush()
+
+    def start(self, session_factory: Callable[[], ContextManager[Session]], interval: Optional[float] = None) -> None:
+        self._session_factory = session_factory
+        if interval is not None:
+            self.interval = interval
+        if self.write_behind:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="quote-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> dict[str, object]:
+        with self._lock:
+            return {
+                "quotes": len(self._quotes),
+                "dirty": len(self._dirty),
+                "seq": self._seq,
+                "warmed": self.warmed,
+                "write_behind": self.write_behind,
+                "flushes": self.flushes,
+                "rows_written": self.rows_written,
+                "errors": self.errors,
+                "listeners": len(self._listeners),
+                "listener_errors": self.listener_errors,
+                "last_error": self.last_error,
+            }
+
+
+quote_store = QuoteStore()
+quote_store.interval = float(os.getenv("QUOTE_FLUSH_SECONDS", "1"))
+
+
+@event.listens_for(QuoteLive, "after_insert")
+@event.listens_for(QuoteLive, "after_update")
+def _observe_orm_write(mapper, connection, target: QuoteLive) -> None:  # noqa: ANN001
+    # Rows written through the ORM (imports, scripts) are mirrored so reads stay coherent
+    if target.ltp is not None and target.ts is not None:
+        quote_store.put(target.security_id, target.ltp, target.ts, target.source or "yf", persist=False)
@@ -0,0 +1,240 @@
+"""Synthetic market and portfolio data for load testing and profiling.
+
+:func:`seed_database` writes securities with random-walk OHLCV history, portfolios
+with holdings and lots, and optionally one ``quotelive`` row per security, all with
+bulk inserts. Output is a pure function of :class:`SeedSpec`: every security draws
+from its own generator keyed by ``(seed, index)``, so the same spec gives the same
+bars whatever the batch size. Price snapshots and indicator states are computed from
+the generated arrays while they are still in memory rather than re-read from
+``priceeod``.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Optional
+
+import numpy as np
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from arthasutra.db.models import (
+    Holding,
+    IndicatorState,
+    Lot,
+    Portfolio,
+    PriceEOD,
+    PriceSnapshot,
+    QuoteLive,
+    Security,
+)
+from arthasutra.services.indicator_state import REBUILD_BARS, fold_history
+from arthasutra.services.price_cache import PriceHistory
+
+
+SECTORS = (
+    "Financials", "IT", "Energy", "FMCG", "Healthcare", "Auto", "Metals", "Telecom", "Industrials", "Realty",
+)
+TRADING_DAYS_PER_YEAR = 252
+
+# Securities generated and inserted per batch (~1.3M bars at 20 years)
+_SECURITY_BATCH = 250
+
+_PRICEEOD_COLS = ("security_id", "date", "open", "high", "low", "close", "volume")
+
+
+@dataclass(frozen=True)
+class SeedSpec:
+    securities: int = 500
+    years: int = 5
+    portfolios: int = 3
+    holdings: int = 40  # per portfolio, drawn from the generated universe
+    max_lots: int = 3  # lots per holding, 1..max_lots
+    quotes: bool = False  # also write a quotelive row per security
+    seed: int = 42
+    end: dt.date = field(default_factory=dt.date.today)
+    prefix: str = "SYN"
+    exchange: str = "NSE"
+    kite_token_base: Optional[int] = None  # security i gets kite_token base + i
+    derived: bool = True  # write price snapshots and indicator states
+
+
+@dataclass
+class SeedReport:
+    securities: int = 0
+    bars: int = 0
+    portfolios: int = 0
+    holdings: int = 0
+    lots: int = 0
+    quotes: int = 0
+    elapsed_s: float = 0.0
+    bars_per_sec: float = 0.0
+    security_ids: list[int] = field(default_factory=list, repr=False)
+    portfolio_ids: list[int] = field(default_factory=list, repr=False)
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d.pop("security_ids")
+        d.pop("portfolio_ids")
+        return d
+
+
+def trading_days(end: dt.date, years: int) -> np.ndarray:
+    """``years`` x 252 weekdays ending on or before ``end``, oldest first (datetime64[D])."""
+    n = max(int(years * TRADING_DAYS_PER_YEAR), 1)
+    return np.busday_offset(np.datetime64(end, "D"), -np.arange(n)[::-1], roll="backward")
+
+
+def random_walk(rng: np.random.Generator, n: int) -> tuple[np.ndarray, ...]:
+    """One security's daily ``(open, high, low, close, volume)``.
+
+    Closes follow a geometric random walk with per-security drift and volatility;
+    opens gap from the previous close and the high/low range scales with volatility.
+    """
+    start = float(np.exp(rng.uniform(np.log(20.0), np.log(5000.0))))
+    vol = rng.uniform(0.01, 0.035)
+    drift = rng.normal(0.0004, 0.0004)
+    close = start * np.exp(np.cumsum(rng.normal(drift - 0.5 * vol * vol, vol, n)))
+    prev = np.concatenate(([start], close[:-1]))
+    open_ = prev * np.exp(rng.normal(0.0, vol * 0.3, n))
+    wick = np.abs(rng.normal(0.0, vol * 0.5, (2, n)))
+    high = np.maximum(open_, close) * (1.0 + wick[0])
+    low = np.minimum(open_, close) * (1.0 - wick[1])
+    volume = np.round(rng.lognormal(np.log(2e5), 1.0) * rng.lognormal(0.0, 0.4, n))
+    return open_, high, low, close, volume
+
+
+def _insert_bars(session: Session, rows: list[tuple]) -> None:
+    conn = session.connection()
+    if conn.dialect.name == "sqlite":
+        # Positional executemany skips building a dict per bar; dates bind as ISO text
+        cols = ", ".join(_PRICEEOD_COLS)
+        conn.exec_driver_sql(f"INSERT INTO priceeod ({cols}) VALUES ({', '.join('?' * len(_PRICEEOD_COLS))})", rows)
+    else:
+        conn.execute(insert(PriceEOD.__table__), [dict(zip(_PRICEEOD_COLS, r)) for r in rows])
+
+
+def seed_database(
+    session: Session, spec: SeedSpec, progress: Optional[Callable[[int, int], None]] = None
+) -> SeedReport:
+    """Generate and bulk-insert a synthetic dataset; commits per batch of securities.
+
+    Raises ValueError when securities with ``spec.prefix`` already exist, so a second
+    run needs a different prefix rather than silently mixing datasets.
+    """
+    t0 = time.perf_counter()
+    if session.exec(select(Security.id).where(Security.symbol.like(f"{spec.prefix}%"), Security.exchange == spec.exchange).limit(1)).first() is not None:
+        raise ValueError(f"securities with prefix {spec.prefix!r} already exist; pick another prefix")
+    report = SeedReport()
+    days = trading_days(spec.end, spec.years)
+    iso = np.datetime_as_string(days, unit="D").tolist()
+    py_dates = days.astype(object).tolist()
+    sqlite = session.connection().dialect.name == "sqlite"
+    bar_dates = iso if sqlite else py_dates
+    width = max(len(str(spec.securities - 1)), 5)
+    now = dt.datetime.now(dt.UTC)
+    # Holdings are drawn up front so only held securities' closes stay in memory
+    rng = np.random.default_rng([spec.seed, spec.securities, 1])
+    picks = [
+        rng.choice(spec.securities, size=min(spec.holdings, spec.securities), replace=False).tolist() if spec.securities else []
+        for _ in range(spec.portfolios)
+    ]
+    held = {i for chosen in picks for i in chosen}
+    held_closes: dict[int, np.ndarray] = {}
+    last_close: list[float] = []
+    sids: list[int] = []
+
+    for lo in range(0, spec.securities, _SECURITY_BATCH):
+        idx = range(lo, min(lo + _SECURITY_BATCH, spec.securities))
+        secs = [
+            Security(
+                symbol=f"{spec.prefix}{i:0{width}d}",
+                exchange=spec.exchange,
+                name=f"Synthetic {i}",
+                sector=SECTORS[i % len(SECTORS)],
+                kite_token=None if spec.kite_token_base is None else spec.kite_token_base + i,
+            )
+            for i in idx
+        ]
+        session.add_all(secs)
+        session.flush()
+        rows: list[tuple] = []
+        snaps: list[dict] = []
+        states: list[dict] = []
+        for i, sec in zip(idx, secs):
+            o, h, l, c, v = random_walk(np.random.default_rng([spec.seed, i]), len(days))
+            rows.extend(zip([sec.id] * len(days), bar_dates, o.tolist(), h.tolist(), l.tolist(), c.tolist(), v.tolist()))
+            last_close.append(float(c[-1]))
+            if i in held:
+                held_closes[i] = c
+            if spec.derived:
+                snaps.append({
+                    "security_id": sec.id, "last_close": float(c[-1]), "last_date": py_dates[-1],
+                    "prev_close": float(c[-2]) if len(c) > 1 else None, "prev_date": py_dates[-2] if len(c) > 1 else None,
+                    "updated_at": now,
+                })
+                # Same window rebuild_states folds, so the state is current as written
+                state = fold_history(PriceHistory(days, o, h, l, c, v).tail(REBUILD_BARS))
+                states.append({
+                    "security_id": sec.id, "as_of": state.as_of, "bars": state.bars, "params": state.params,
+                    "state_json": state.to_json(), "updated_at": now,
+                })
+        _insert_bars(session, rows)
+        if snaps:
+            session.connection().execute(insert(PriceSnapshot.__table__), snaps)
+            session.connection().execute(insert(IndicatorState.__table__), states)
+        sids.extend(sec.id for sec in secs)
+        report.securities += len(secs)
+        report.bars += len(rows)
+        session.commit()
+        if progress is not None:
+            progress(report.securities, spec.securities)
+    report.security_ids = sids
+
+    for p, chosen in enumerate(picks):
+        pf = Portfolio(name=f"{spec.prefix} portfolio {p + 1}")
+        session.add(pf)
+        session.flush()
+        report.portfolio_ids.append(pf.id)
+        lots_by_holding: list[list[tuple[float, float, dt.datetime]]] = []
+        holdings: list[Holding] = []
+        for k in chosen:
+            c = held_closes[k]
+            lots = []
+            for at in sorted(rng.integers(0, len(c), size=int(rng.integers(1, spec.max_lots + 1))).tolist()):
+                when = dt.datetime.combine(py_dates[at], dt.time(4, 0), tzinfo=dt.UTC)
+                lots.append((float(rng.integers(1, 200)), round(float(c[at]), 2), when))
+            qty = sum(q for q, _, _ in lots)
+            holdings.append(Holding(
+                portfolio_id=pf.id, security_id=sids[k], qty_total=qty,
+                avg_price=round(sum(q * px for q, px, _ in lots) / qty, 4),
+            ))
+            lots_by_holding.append(lots)
+        session.add_all(holdings)
+        session.flush()
+        lot_rows = [
+            {"holding_id": h.id, "qty": q, "price": px, "date": when, "account": None, "tax_status": None}
+            for h, lots in zip(holdings, lots_by_holding)
+            for q, px, when in lots
+        ]
+        if lot_rows:
+            session.connection().execute(insert(Lot.__table__), lot_rows)
+        report.portfolios += 1
+        report.holdings += len(holdings)
+        report.lots += len(lot_rows)
+    session.commit()
+
+    if spec.quotes and sids:
+        jitter = rng.normal(0.0, 0.004, len(sids))
+        quote_rows = [
+            {"security_id": sid, "ts": now, "ltp": round(px * (1.0 + j), 2), "source": "seed", "updated_at": now}
+            for sid, px, j in zip(sids, last_close, jitter.tolist())
+        ]
+        session.connection().execute(insert(QuoteLive.__table__), quote_rows)
+        report.quotes = len(quote_rows)
+        session.commit()
+
+    report.elapsed_s = time.perf_counter() - t0
+    report.bars_per_sec = report.bars / report.elapsed_s if report.elapsed_s else 0.0
+    return report
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import datetime as dt
+import os
+import threading
+import time
+from typing import Callable, ContextManager, Iterable, Mapping, Optional
+
+from sqlmodel import Session, select
+
+from arthasutra.db.models import Security
+from arthasutra.services.live import upsert_ltps
+from arthasutra.services.metrics import track_job
+from arthasutra.services.quote_store import QuoteStore, quote_store
+
+
+Quote = tuple  # (ltp, ts)
+
+
+def load_token_map(session: Session) -> dict[int, int]:
+    """``{kite_token: security_id}`` for every mapped security."""
+    rows = session.exec(select(Security.kite_token, Security.id).where(Security.kite_token.is_not(None))).all()
+    return {int(tok): sid for tok, sid in rows if tok}
+
+
+class TickPipeline:
+    """Coalescing buffer between a tick feed and ``quotelive``.
+
+    :meth:`offer` runs on the feed's thread: it maps tokens through an in-memory table
+    and keeps only the latest quote per security, under a lock held for a dict update,
+    so it never waits on the database. Accepted quotes are published to ``store`` (if
+    given) immediately, for readers; ticks dropped on a full buffer are only counted. A flusher thread swaps the buffer out every
+    ``flush_interval`` seconds and writes it with one batched upsert.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], ContextManager[Session]],
+        flush_interval: float = 0.5,
+        max_pending: int = 20000,
+        source: str = "kite",
+        on_flush: Optional[Callable[[dict[int, Quote]], None]] = None,
+        store: Optional[QuoteStore] = None,
+    ) -> None:
+        self._session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.source = source
+        self.on_flush = on_flush
+        self.store = store
+        self._token_map: dict[int, int] = {}
+        self._pending: dict[int, Quote] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.ticks_in = 0
+        self.unmapped = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.errors = 0
+        self.last_flush_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    # -- token map -------------------------------------------------------
+    def set_token_map(self, token_map: Mapping[int, int]) -> None:
+        # Swap the reference; readers on the feed thread see either map, never a partial one
+        self._token_map = dict(token_map)
+
+    def refresh_token_map(self, session: Session) -> dict[int, int]:
+        self.set_token_map(load_token_map(session))
+        return self._token_map
+
+    @property
+    def tokens(self) -> list[int]:
+        return list(self._token_map)
+
+    # -- ingest ----------------------------------------------------------
+    def offer(self, ticks: Iterable[dict]) -> int:
+        """Buffer a tick batch; returns how many ticks were accepted."""
+        token_map = self._token_map
+        now = dt.datetime.now(dt.UTC)
+        staged: list[tuple[int, Quote]] = []
+        unmapped = 0
+        n = 0
+        for t in ticks:
+            n += 1
+            sid = token_map.get(t.get("instrument_token"))
+            ltp = t.get("last_price") or t.get("last_traded_price")
+            if sid is None or not ltp:
+                unmapped += 1
+                continue
+            staged.append((sid, (float(ltp), now)))
+        accepted: dict[int, Quote] = {}
+        n_accepted = 0
+        with self._lock:
+            self.ticks_in += n
+            self.unmapped += unmapped
+            pending = self._pending
+            for sid, quote in staged:
+                if sid not in pending and len(pending) >= self.max_pending:
+                    self.dropped += 1
+                    continue
+                pending[sid] = accepted[sid] = quote
+                n_accepted += 1
+        if self.store is not None and accepted:
+            # Only accepted quotes; persistence is this pipeline's job, so the store doesn't queue them
+            self.store.put_many(accepted, source=self.source, persist=False)
+        return n_accepted
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    # -- flushing --------------------------------------------------------
+    def flush(self) -> int:
+        """Write everything buffered so far; returns rows written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            t0 = time.perf_counter()
+            try:
+                with track_job("kite_tick_flush"), self._session_factory() as s:
+                    written = upsert_ltps(s, batch, source=self.source)
+            except Exception as e:
+                # Put the batch back unless newer quotes for the same securities arrived meanwhile
+                with self._lock:
+                    for sid, quote in batch.items():
+                        self._pending.setdefault(sid, quote)
+                    self.errors += 1
+                    self.last_error = str(e)
+                return 0
+            self.flushes += 1
+            self.rows_written += written
+            self.last_flush_ms = (time.perf_counter() - t0) * 1000.0
+        if self.on_flush:
+            self.on_flush(batch)
+        return written
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="tick-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> dict[str, object]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "tokens": len(self._token_map),
+            "pending": pending,
+            "ticks_in": self.ticks_in,
+            "unmapped": self.unmapped,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "errors": self.errors,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "last_error": self.last_error,
+        }
+
+
+def pipeline_from_env(session_factory: Callable[[], ContextManager[Session]]) -> TickPipeline:
+    return TickPipeline(
+        session_factory,
+        flush_interval=int(os.getenv("KITE_TICK_FLUSH_MS", "500")) / 1000.0,
+        max_pending=int(os.getenv("KITE_TICK_BUFFER_MAX", "20000")),
+        store=quote_store,
+    )
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import datetime as dt
+from dataclasses import dataclass, field
+
+from sqlmodel import Session, select
+
+from arthasutra.db.models import Holding, Security, PriceSnapshot
+from arthasutra.services.live import is_market_session
+from arthasutra.services.price_cache import PriceHistory, price_cache
+from arthasutra.services.price_snapshot import top_two_closes
+from arthasutra.services.quote_store import LiveQuote, quote_store
+
+
+# Enough bars for the 200-day SMA plus some slack; matches the decision engine's window
+HISTORY_BARS = 220
+
+
+@dataclass
+class ValuationContext:
+    """Everything needed to value and score one portfolio, loaded once per request.
+
+    ``closes`` holds up to ``history_bars`` closes per security in ascending date order,
+    so ``closes[-1]`` is the latest close and ``closes[-2]`` the previous one. ``history``
+    carries the full OHLCV arrays when more than two bars were requested.
+    """
+
+    portfolio_id: int
+    holdings: list[tuple[Holding, Security]] = field(default_factory=list)
+    closes: dict[int, list[float]] = field(default_factory=dict)
+    quotes: dict[int, LiveQuote] = field(default_factory=dict)
+    history: dict[int, PriceHistory] = field(default_factory=dict)
+    history_bars: int = 2
+    in_session: bool = False
+    now: dt.datetime = field(default_factory=lambda: dt.datetime.now(dt.UTC))
+
+    def latest_and_prev_close(self, security_id: int) -> tuple[float | None, float | None]:
+        cl = self.closes.get(security_id) or []
+        last = cl[-1] if cl else None
+        prev = cl[-2] if len(cl) > 1 else None
+        return last, prev
+
+
+def load_valuation_context(session: Session, portfolio_id: int, history_bars: int = 2) -> ValuationContext:
+    """Load holdings, securities, recent closes and live quotes for a portfolio in a few queries.
+
+    With ``history_bars <= 2`` closes are read from PriceSnapshot (joined onto the
+    holdings query); longer windows come from the shared price cache, which reads the
+    tail of PriceEOD with one windowed query on a miss.
+    """
+    ctx = ValuationContext(
+        portfolio_id=portfolio_id,
+        history_bars=max(int(history_bars), 2),
+        in_session=is_market_session(),
+    )
+    snapshots: dict[int, PriceSnapshot] = {}
+    for h, sec, snap in session.exec(
+        select(Holding, Security, PriceSnapshot)
+        .join(Security, Security.id == Holding.security_id)
+        .outerjoin(PriceSnapshot, PriceSnapshot.security_id == Security.id)
+        .where(Holding.portfolio_id == portfolio_id)
+        .order_by(Holding.id.asc())
+    ).all():
+        ctx.holdings.append((h, sec))
+        if snap is not None:
+            snapshots[sec.id] = snap
+    if not ctx.holdings:
+        return ctx
+
+    if ctx.history_bars <= 2:
+        # Last/prev closes come from the materialized snapshot; only securities
+        # without one (e.g. history loaded outside the ingest paths) hit PriceEOD.
+        for sid, snap in snapshots.items():
+            ctx.closes[sid] = [float(c) for c in (snap.prev_close, snap.last_close) if c is not None]
+        missing = [sec.id for _, sec in ctx.holdings if sec.id not in snapshots]
+        for sid, bars in top_two_closes(session, missing).items():
+            ctx.closes[sid] = [close for _, close in reversed(bars)]
+    else:
+        _load_history(session, ctx)
+
+    # Quotes are served from memory; SQL only on the store's first (warming) read
+    quote_store.ensure_warm(session)
+    ctx.quotes = quote_store.get_many(sec.id for _, sec in ctx.holdings)
+    return ctx
+
+
+def _load_history(session: Session, ctx: ValuationContext) -> None:
+    # Bounded, cached read: repeated requests are served from the in-process price cache
+    ids = [sec.id for _, sec in ctx.holdings]
+    ctx.history = price_cache.get_many(session, ids, ctx.history_bars)
+    for sid, hist in ctx.history.items():
+        if len(hist):
+            ctx.closes[sid] = hist.close.tolist()
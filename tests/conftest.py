@@ -0,0 +1,24 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# The engines in arthasutra.db.session bind DATABASE_URL when the module is first
+# imported, so the whole run shares one database: point it at a scratch directory
+# before any test module (some import the app at collection) is loaded.
+_DB_DIR = tempfile.mkdtemp(prefix="arthasutra-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def engine():
+    """The shared test database's write engine; tables are created first, the files removed at the end."""
+    import arthasutra.db.models  # noqa: F401  register tables before create_all
+    from arthasutra.db.session import create_db_and_tables, engine, read_engine
+
+    create_db_and_tables()
+    yield engine
+    engine.dispose()
+    read_engine.dispose()
+    shutil.rmtree(_DB_DIR, ignore_errors=True)
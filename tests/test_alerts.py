@@ -0,0 +1,106 @@
+import datetime as dt
+import random
+
+from sqlmodel import Session
+
+from arthasutra.db.models import PriceAlert
+from arthasutra.services.alerts import AlertEngine
+from arthasutra.services.quote_store import LiveQuote
+
+
+def test_level_index_fires_only_crossed_alerts():
+    rng = random.Random(3)
+    t0 = dt.datetime(2024, 5, 2, 4, 0, tzinfo=dt.UTC)
+    alerts = []
+    for i in range(20000):
+        direction = rng.choice(["up", "down"])
+        level = round(100.0 + rng.uniform(0, 20) * (1 if direction == "up" else -1), 2)
+        alerts.append(PriceAlert(id=i + 1, security_id=1 + i % 4, direction=direction, level=level))
+    engine = AlertEngine(max_events=50000)
+    assert engine.add(alerts, {sid: 100.0 for sid in range(1, 5)}) == 20000
+
+    # Reference: an alert fires on the first tick whose move from the previous price crosses its level
+    path = [100.0, 101.5, 101.5, 99.0, 104.2, 97.3, 112.0, 80.0, 100.0, 125.0]
+    expected = set()
+    for prev, px in zip(path, path[1:]):
+        for a in alerts:
+            if a.security_id == 2 and a.id not in expected and (
+                (a.direction == "up" and prev < a.level <= px) or (a.direction == "down" and px <= a.level < prev)
+            ):
+                expected.add(a.id)
+    for k, px in enumerate(path[1:]):
+        engine.on_quotes([LiveQuote(2, px, t0 + dt.timedelta(seconds=k), "kite", k)])
+    events = engine.events()
+    assert {e.alert_id for e in events} == expected
+    assert all(e.security_id == 2 for e in events)
+    assert [e.seq for e in events] == list(range(1, len(events) + 1))
+    assert len(engine) == 20000 - len(expected)
+
+    # A level touched exactly fires once; cancelled alerts never fire
+    engine.add([PriceAlert(id=90001, security_id=9, direction="up", level=50.0, ref_price=49.0),
+                PriceAlert(id=90002, security_id=9, direction="down", level=48.0)])
+    assert engine.remove(90002) and not engine.remove(90002)
+    assert engine.on_quotes([LiveQuote(9, 50.0, t0, "kite", 0)]) == 1
+    assert engine.on_quotes([LiveQuote(9, 47.0, t0, "kite", 1), LiveQuote(9, 51.0, t0, "kite", 2)]) == 0
+
+
+def test_alert_api_fires_from_quote_store_without_sql_and_persists(engine):
+    from fastapi.testclient import TestClient
+
+    from arthasutra.api.main import app
+    from arthasutra.bench import count_statements
+    from arthasutra.db.models import PriceSnapshot, Security
+    from arthasutra.db.session import session_scope
+    from arthasutra.services.alerts import alert_engine
+    from arthasutra.services.quote_store import quote_store
+
+    with Session(engine) as s:
+        sec = Security(symbol="ALRT", exchange="NSE")
+        other = Security(symbol="ALRT2", exchange="NSE")
+        s.add_all([sec, other])
+        s.flush()
+        s.add(PriceSnapshot(security_id=sec.id, last_close=200.0, last_date=dt.date(2024, 5, 1)))
+        s.commit()
+        sid, other_id = sec.id, other.id
+
+    client = TestClient(app)
+    r = client.post("/alerts", json={"symbol": "NSE:ALRT", "pct": 5, "note": "breakout"})
+    assert r.status_code == 200, r.text
+    up = r.json()[0]
+    assert (up["direction"], up["level"], up["ref_price"]) == ("up", 210.0, 200.0)
+    down = client.post("/alerts", json={"security_id": sid, "level": 190.0}).json()[0]
+    assert down["direction"] == "down"
+    assert client.post("/alerts", json={"symbol": "NSE:ALRT", "rule": "risk_limit"}).status_code == 400
+    assert client.post("/alerts", json={"security_id": other_id, "pct": 5}).status_code == 400
+    assert client.post("/alerts", json={"symbol": "NSE:NOPE", "level": 1}).status_code == 404
+    cancelled = client.post("/alerts", json={"security_id": sid, "level": 220.0}).json()[0]
+    assert client.delete(f"/alerts/{cancelled['id']}").json()["status"] == "cancelled"
+    assert {a["id"] for a in client.get("/alerts", params={"security_id": sid}).json()} == {up["id"], down["id"]}
+
+    seq0 = alert_engine.seq
+    quote_store.add_listener(alert_engine.on_quotes)
+    alert_engine.start(session_scope, interval=3600)
+    t0 = dt.datetime.now(dt.UTC)
+    try:
+        with count_statements() as statements:
+            for k in range(500):
+                quote_store.put(sid, 200.0 + (k % 20) * 0.25, t0 + dt.timedelta(milliseconds=k), persist=False)
+            quote_store.put(sid, 221.0, t0 + dt.timedelta(seconds=1), persist=False)
+    finally:
+        quote_store.remove_listener(alert_engine.on_quotes)
+    assert statements == []
+
+    body = client.get("/alerts/events", params={"after_seq": seq0}).json()
+    assert [(e["alert_id"], e["price"], e["note"]) for e in body["events"]] == [(up["id"], 221.0, "breakout")]
+    alert_engine.stop()
+    fired = client.get("/alerts", params={"status": "fired"}).json()
+    assert [(a["id"], a["fired_price"]) for a in fired] == [(up["id"], 221.0)]
+
+    # A deleted portfolio's alerts stop firing and their rows go with it
+    pid = client.post("/portfolios", json={"name": "Alert PF"}).json()["id"]
+    mine = client.post("/alerts", json={"security_id": sid, "level": 250.0, "portfolio_id": pid}).json()[0]
+    n = len(alert_engine)
+    assert client.delete(f"/portfolios/{pid}").status_code == 200
+    assert len(alert_engine) == n - 1
+    assert alert_engine.on_quotes([LiveQuote(sid, 260.0, dt.datetime.now(dt.UTC), "kite", 0)]) == 0
+    assert mine["id"] not in {a["id"] for a in client.get("/alerts", params={"status": ""}).json()}
@@ -0,0 +1,77 @@
+import datetime as dt
+import threading
+
+from sqlalchemy import event
+from sqlmodel import Session
+
+
+def test_hot_read_routes_await_the_database_when_async_drivers_are_installed(engine, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from arthasutra.api.main import app
+    from arthasutra.api.routers import portfolios
+    from arthasutra.db import async_session
+    from arthasutra.db.models import Holding, Portfolio, PriceSnapshot, Security
+    from arthasutra.db.session import read_engine
+
+    assert async_session.async_url("sqlite:///x.db") == "sqlite+aiosqlite:///x.db"
+    assert async_session.async_url("postgresql+psycopg2://u@h/db") == "postgresql+asyncpg://u@h/db"
+    assert async_session.async_url("postgres://u@h/db") == "postgresql+asyncpg://u@h/db"
+    assert async_session.async_url("mysql://u@h/db") is None
+    assert not async_session.async_available("sqlite://")
+
+    with Session(engine) as s:
+        pf = Portfolio(name="Async PF")
+        s.add(pf)
+        s.flush()
+        for i in range(3):
+            sec = Security(symbol=f"ASY{i}", exchange="NSE")
+            s.add(sec)
+            s.flush()
+            s.add(Holding(portfolio_id=pf.id, security_id=sec.id, qty_total=5, avg_price=50.0))
+            s.add(PriceSnapshot(security_id=sec.id, last_close=55.0, last_date=dt.date(2024, 5, 2)))
+        s.commit()
+        pid = pf.id
+
+    engines = {engine, read_engine}
+    if async_session.async_engine is not None:
+        engines |= {async_session.async_engine.sync_engine, async_session.async_read_engine.sync_engine}
+    threads: list[str] = []
+
+    def _record(*args) -> None:  # noqa: ANN002
+        threads.append(threading.current_thread().name)
+
+    for e in engines:
+        event.listen(e, "before_cursor_execute", _record)
+    computed: list[str] = []
+    build = portfolios._build_dashboard
+
+    def _build(*args):  # noqa: ANN002, ANN202
+        computed.append(threading.current_thread().name)
+        return build(*args)
+
+    monkeypatch.setattr(portfolios, "_build_dashboard", _build)
+    client = TestClient(app)
+    try:
+        dash = client.get(f"/portfolios/{pid}/dashboard")
+        assert dash.status_code == 200 and len(dash.json()["positions"]) == 3
+        pos = client.get(f"/portfolios/{pid}/positions")
+        assert sorted(p["symbol"] for p in pos.json()) == ["ASY0", "ASY1", "ASY2"]
+        assert "Async PF" in [p["name"] for p in client.get("/portfolios").json()]
+        quotes = client.get("/data/quotes", params={"symbols": "NSE:ASY1,NSE:NOPE"}).json()["quotes"]
+        assert set(quotes) == {"NSE:ASY1", "NSE:NOPE"} and quotes["NSE:NOPE"] is None
+        assert client.get("/portfolios/999999/dashboard").status_code == 404
+    finally:
+        for e in engines:
+            event.remove(e, "before_cursor_execute", _record)
+
+    assert threads
+    # Valuation and rules never run on the event loop
+    assert computed and all(t.startswith("AnyIO worker") for t in computed)
+    workers = [t for t in threads if t.startswith("AnyIO worker")]
+    if async_session.async_engine is None:
+        # Fallback: the same functions on a read session in the threadpool
+        assert workers == threads
+    else:
+        # Statements are issued from the event loop and awaited; no worker is held
+        assert workers == []
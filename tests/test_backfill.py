@@ -0,0 +1,84 @@
+import threading
+from datetime import date, timedelta
+
+from sqlmodel import Session, select
+
+
+class StubProvider:
+    """Daily bars for every calendar day in [start, end); the first call per symbol can fail."""
+
+    def __init__(self, fail_first=()):
+        self.calls = []
+        self.fail_first = set(fail_first)
+        self._lock = threading.Lock()
+
+    def fetch(self, symbol, exchange, start, end):
+        with self._lock:
+            self.calls.append((symbol, start, end))
+            if symbol in self.fail_first:
+                self.fail_first.discard(symbol)
+                raise ConnectionError("rate limited")
+        days = (end - start).days
+        return [(start + timedelta(days=i), 1.0, 2.0, 0.5, 100.0 + i, 1000.0) for i in range(days)]
+
+
+def test_backfill_fetches_only_missing_ranges_and_retries(engine):
+    from arthasutra.db.models import PriceEOD, Security
+    from arthasutra.services.backfill import plan_backfill, run_backfill
+    from arthasutra.services.eod_ingest import EODBar, upsert_eod_bars
+
+    start, end = date(2024, 1, 1), date(2024, 1, 11)
+    with Session(engine) as s:
+        fresh = Security(symbol="BFNEW", exchange="NSE")
+        partial = Security(symbol="BFPART", exchange="NSE")
+        full = Security(symbol="BFFULL", exchange="NSE")
+        s.add_all([fresh, partial, full])
+        s.flush()
+        upsert_eod_bars(s, [EODBar(partial.id, start + timedelta(days=i), 1, 2, 0.5, 50.0) for i in range(4)])
+        upsert_eod_bars(s, [EODBar(full.id, end - timedelta(days=1), 1, 2, 0.5, 50.0)])
+        s.commit()
+
+        tasks, skipped = plan_backfill(s, [fresh, partial, full], start, end)
+        assert [r.symbol for r in skipped] == ["BFFULL"]
+        assert {t.symbol: t.start for t in tasks} == {"BFNEW": start, "BFPART": date(2024, 1, 5)}
+
+        provider = StubProvider(fail_first={"BFNEW"})
+        results = run_backfill(s, tasks, provider=provider, max_workers=2, rate_per_sec=0, backoff=0)
+        by_symbol = {r.symbol: r for r in results}
+        assert by_symbol["BFNEW"].status == "ok" and by_symbol["BFNEW"].attempts == 2
+        assert by_symbol["BFNEW"].rows == 10
+        assert by_symbol["BFPART"].rows == 6
+
+        counts = {
+            sid: len(s.exec(select(PriceEOD).where(PriceEOD.security_id == sid)).all())
+            for sid in (fresh.id, partial.id, full.id)
+        }
+        assert counts == {fresh.id: 10, partial.id: 10, full.id: 1}
+
+        # A second run has nothing left to fetch
+        tasks, skipped = plan_backfill(s, [fresh, partial], start, end)
+        assert tasks == [] and len(skipped) == 2
+
+        # An explicit earlier start also plans the range before the first stored bar
+        early = date(2023, 12, 25)
+        tasks, skipped = plan_backfill(s, [partial, full], early, end, fill_head=True)
+        assert [(t.symbol, t.start, t.end) for t in tasks] == [("BFPART", early, start), ("BFFULL", early, end - timedelta(days=1))]
+        assert skipped == []
+        assert sum(r.rows for r in run_backfill(s, tasks, provider=StubProvider(), rate_per_sec=0)) == 7 + 16
+        tasks, skipped = plan_backfill(s, [partial, full], early, end, fill_head=True)
+        assert tasks == [] and len(skipped) == 2
+
+
+def test_backfill_gives_up_after_retries():
+    from arthasutra.services.backfill import BackfillTask, RateLimiter, _fetch_with_retry
+
+    class Down:
+        calls = 0
+
+        def fetch(self, *a):
+            Down.calls += 1
+            raise TimeoutError("down")
+
+    task = BackfillTask(1, "X", "NSE", date(2024, 1, 1), date(2024, 1, 2))
+    bars, res = _fetch_with_retry(Down(), task, RateLimiter(0), retries=2, backoff=0)
+    assert bars == [] and res.status == "error" and res.attempts == 3 and Down.calls == 3
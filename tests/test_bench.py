@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+
+def test_bench_suite_runs_every_scenario_and_flags_regressions():
+    from arthasutra import bench
+
+    tmp = tempfile.mkdtemp()
+    report_path, baseline_path = os.path.join(tmp, "report.json"), os.path.join(tmp, "baseline.json")
+    # Own process and database: the suite writes its dataset through the shared engine
+    args = ["--portfolios", "1", "--holdings", "6", "--years", "1", "--repeat", "3", "--baseline", baseline_path]
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(p for p in sys.path if p)}
+    env.pop("DATABASE_URL", None)
+    run = subprocess.run(
+        [sys.executable, "-m", "arthasutra.cli", "bench", *args, "--save", "--json", report_path],
+        capture_output=True, text=True, env=env, timeout=300,
+    )
+    assert run.returncode == 0, run.stderr
+    with open(report_path) as fh:
+        report = json.load(fh)
+    assert list(report["results"]) == list(bench.SCENARIOS)
+    for name, r in report["results"].items():
+        assert r["calls"] == 3 and 0 < r["p50_ms"] <= r["p95_ms"] <= r["max_ms"], name
+    # Reads are a fixed number of statements regardless of holdings
+    assert 0 < report["results"]["dashboard"]["queries"] <= 6
+    assert report["results"]["quotes"]["queries"] <= 2
+
+    baseline = bench.load_baseline(baseline_path)
+    assert bench.compare(report, baseline) == []
+    worse = {**report, "results": {k: dict(v) for k, v in report["results"].items()}}
+    worse["results"]["dashboard"]["queries"] += 3
+    worse["results"]["positions"]["p95_ms"] = report["results"]["positions"]["p95_ms"] * 2 + 10
+    problems = bench.compare(worse, baseline)
+    assert [p.split(":")[0] for p in problems] == ["dashboard", "positions"]
+    # Baselines from another scale are not compared
+    assert bench.compare({**worse, "scale_key": "other"}, baseline) == []
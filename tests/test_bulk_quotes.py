@@ -0,0 +1,46 @@
+from datetime import date
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+
+def test_bulk_quotes_resolve_in_chunked_joined_queries(engine):
+    from arthasutra.api.main import app
+    from arthasutra.bench import count_statements
+    from arthasutra.db.models import PriceSnapshot, Security
+    from arthasutra.services.quote_store import quote_store
+
+    n = 900
+    with Session(engine) as s:
+        secs = [Security(symbol=f"BQ{i}", exchange="NSE" if i % 2 else "BSE") for i in range(n)]
+        s.add_all(secs)
+        s.flush()
+        for i, sec in enumerate(secs):
+            s.add(PriceSnapshot(security_id=sec.id, last_close=100.0, last_date=date(2024, 1, 2), prev_close=80.0 if i % 3 else None))
+        s.commit()
+        ids = [sec.id for sec in secs]
+        quote_store.ensure_warm(s)
+    for sid in ids[: n // 2]:
+        quote_store.put(sid, 120.0, source="kite", persist=False)
+
+    tokens = [f"{'NSE' if i % 2 else 'BSE'}:BQ{i}" for i in range(n)] + ["NSE:NOSUCH", "BQ1"]
+    client = TestClient(app)
+    # Counted on every engine the route may use (read pool, async engines)
+    with count_statements() as statements:
+        r = client.post("/data/quotes", json={"symbols": tokens, "include_prev": True})
+    assert r.status_code == 200
+    # ~900 pairs in chunks of 400; quotes themselves are served from memory
+    assert 1 <= len(statements) <= 3
+    quotes = r.json()["quotes"]
+    assert quotes["NSE:NOSUCH"] is None
+    assert quotes["BQ1"]["ltp"] == 120.0  # bare symbol defaults to NSE
+    assert quotes["NSE:BQ1"] == {
+        "ltp": 120.0, "ts": quotes["NSE:BQ1"]["ts"], "prev_close": 80.0, "change": 40.0, "pct_change": 50.0,
+    }
+    # No prev_close in the snapshot: falls back to the last close, as the dashboard does
+    assert quotes["BSE:BQ0"]["prev_close"] == 100.0
+    assert quotes[f"NSE:BQ{n - 1}"]["ltp"] is None and quotes[f"NSE:BQ{n - 1}"]["pct_change"] is None
+
+    r = client.get("/data/quotes", params={"symbols": "NSE:BQ1,NSE:BQ899"})
+    assert r.json()["quotes"]["NSE:BQ1"]["ltp"] == 120.0
+    assert r.json()["quotes"]["NSE:BQ899"] is None
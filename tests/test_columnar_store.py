@@ -0,0 +1,99 @@
+import os
+import tempfile
+from datetime import date, timedelta
+
+import numpy as np
+from sqlmodel import Session
+
+
+def test_columnar_store_appends_merges_and_reads_ranges():
+    from arthasutra.services.columnar_store import ColumnarPriceStore
+
+    store = ColumnarPriceStore(tempfile.mkdtemp())
+    d0 = date(2020, 1, 1)
+    bars = [(d0 + timedelta(days=i), 1.0, 2.0, 0.5, float(i), 100.0) for i in range(10)]
+    assert store.append(7, bars[5:]) == 5
+    # Older bars force a merge; overwrite=False keeps what is stored
+    assert store.append(7, bars[:6] + [(d0 + timedelta(days=5), 1, 1, 1, 555.0, None)], overwrite=False) == 5
+    assert store.append(7, [(d0 + timedelta(days=10), 1, 1, 1, 10.0, None)]) == 1
+
+    full = store.read(7)
+    assert len(full) == 11 and full.complete
+    np.testing.assert_array_equal(full.close, np.arange(11, dtype=float))
+    assert np.isnan(full.volume[-1])
+    # Column views share the mapped buffer rather than copying it
+    assert not full.close.flags.owndata
+
+    window = store.read(7, start=d0 + timedelta(days=3), end=d0 + timedelta(days=4))
+    assert window.dates.tolist() == [d0 + timedelta(days=3), d0 + timedelta(days=4)]
+    tail = store.read_tail(7, 3)
+    assert tail.close.tolist() == [8.0, 9.0, 10.0] and not tail.complete
+    assert store.read(8) is None
+
+
+def test_ingest_mirrors_into_columnar_store_and_cache_reads_from_it(engine):
+    from arthasutra.db.models import Security
+    from arthasutra.services.eod_ingest import EODBar, upsert_eod_bars
+    from arthasutra.services.price_cache import price_cache
+
+    store_dir = tempfile.mkdtemp()
+    os.environ["COLUMNAR_STORE_DIR"] = store_dir
+    try:
+        from arthasutra.services.columnar_store import get_columnar_store
+
+        d0 = date(2021, 6, 1)
+        with Session(engine) as s:
+            sec = Security(symbol="COLS", exchange="NSE")
+            s.add(sec)
+            s.flush()
+            upsert_eod_bars(s, [EODBar(security_id=sec.id, date=d0 + timedelta(days=i), open=1, high=1, low=1, close=float(i)) for i in range(30)])
+            # Nothing reaches the store before commit
+            assert get_columnar_store().read(sec.id) is None
+            s.commit()
+            sid = sec.id
+
+        assert len(get_columnar_store().read(sid)) == 30
+        price_cache.invalidate([sid])
+        with Session(engine) as s:
+            hist = price_cache.get_many(s, [sid], 10)[sid]
+        assert hist.close.tolist() == [float(i) for i in range(20, 30)]
+    finally:
+        del os.environ["COLUMNAR_STORE_DIR"]
+        price_cache.invalidate()
+
+
+def test_first_mirrored_ingest_exports_history_already_in_sql(engine):
+    from arthasutra.db.models import PriceEOD, Security
+    from arthasutra.services.backtest import load_price_matrix
+    from arthasutra.services.eod_ingest import EODBar, upsert_eod_bars
+    from arthasutra.services.price_cache import price_cache
+
+    d0 = date(2019, 1, 1)
+    with Session(engine) as s:
+        sec = Security(symbol="COLH", exchange="NSE")
+        s.add(sec)
+        s.flush()
+        # History stored before the columnar store was enabled
+        for i in range(220):
+            s.add(PriceEOD(security_id=sec.id, date=d0 + timedelta(days=i), open=1, high=1, low=1, close=float(i)))
+        s.commit()
+        s.refresh(sec)
+
+    os.environ["COLUMNAR_STORE_DIR"] = tempfile.mkdtemp()
+    try:
+        from arthasutra.services.columnar_store import get_columnar_store
+
+        with Session(engine) as s:
+            upsert_eod_bars(s, [EODBar(security_id=sec.id, date=d0 + timedelta(days=220), open=1, high=1, low=1, close=220.0)])
+            s.commit()
+
+        assert len(get_columnar_store().read(sec.id)) == 221
+        price_cache.invalidate([sec.id])
+        with Session(engine) as s:
+            hist = price_cache.get_many(s, [sec.id], 500)[sec.id]
+            matrix = load_price_matrix(s, [sec], d0, d0 + timedelta(days=220))
+        assert hist.complete and hist.close.tolist() == [float(i) for i in range(221)]
+        assert matrix.close[0].tolist() == [float(i) for i in range(221)]
+    finally:
+        del os.environ["COLUMNAR_STORE_DIR"]
+        price_cache.invalidate()
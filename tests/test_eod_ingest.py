@@ -0,0 +1,87 @@
+from datetime import date, timedelta
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+
+def test_upsert_eod_bars_is_idempotent_and_counts_duplicates(engine):
+    from arthasutra.db.models import Security, PriceEOD, PriceSnapshot
+    from arthasutra.services.eod_ingest import EODBar, upsert_eod_bars
+
+    d0 = date(2023, 3, 1)
+    with Session(engine) as s:
+        sec = Security(symbol="UPS", exchange="NSE")
+        s.add(sec)
+        s.flush()
+        bars = [EODBar(security_id=sec.id, date=d0 + timedelta(days=i), open=1, high=2, low=0.5, close=10.0 + i) for i in range(10)]
+
+        first = upsert_eod_bars(s, bars, batch_size=3)
+        assert (first.rows, first.written, first.duplicates) == (10, 10, 0)
+
+        again = upsert_eod_bars(s, bars[-4:] + [EODBar(security_id=sec.id, date=d0 + timedelta(days=10), open=1, high=1, low=1, close=99.0)], on_conflict="nothing")
+        assert (again.rows, again.written, again.duplicates) == (5, 1, 4)
+
+        # Update mode overwrites the stored bar instead of duplicating it
+        upsert_eod_bars(s, [EODBar(security_id=sec.id, date=d0, open=1, high=1, low=1, close=5.0)])
+        s.commit()
+
+        n = s.exec(select(func.count()).select_from(PriceEOD).where(PriceEOD.security_id == sec.id)).one()
+        assert n == 11
+        assert s.exec(select(PriceEOD.close).where(PriceEOD.security_id == sec.id, PriceEOD.date == d0)).one() == 5.0
+        snap = s.get(PriceSnapshot, sec.id)
+        assert (snap.last_close, snap.prev_close) == (99.0, 19.0)
+
+
+def test_eod_csv_reimport_does_not_duplicate_bars(engine):
+    from fastapi.testclient import TestClient
+
+    from arthasutra.api.main import app
+    from arthasutra.db.models import Security, PriceEOD
+
+    csv_content = "symbol,exchange,date,open,high,low,close,volume\n" + "".join(
+        f"REIMP,NSE,2024-01-{d:02d},1,1,1,{100 + d},10\n" for d in range(1, 11)
+    )
+    client = TestClient(app)
+    # Identical uploads are skipped by content hash; force the second one through the upsert
+    for force in (False, True):
+        r = client.post(
+            "/data/prices-eod/import-csv",
+            params={"force": force},
+            files={"file": ("eod.csv", csv_content.encode(), "text/csv")},
+        )
+        assert r.status_code == 200
+        assert r.json()["rows"] == 10
+
+    with Session(engine) as s:
+        sec = s.exec(select(Security).where(Security.symbol == "REIMP")).one()
+        n = s.exec(select(func.count()).select_from(PriceEOD).where(PriceEOD.security_id == sec.id)).one()
+        assert n == 10
+
+
+def test_price_cache_serves_repeat_reads_and_invalidates_on_ingest(engine):
+    from arthasutra.bench import count_statements
+    from arthasutra.db.models import Security
+    from arthasutra.services.eod_ingest import EODBar, upsert_eod_bars
+    from arthasutra.services.price_cache import price_cache
+
+    d0 = date(2022, 1, 3)
+    with Session(engine) as s:
+        sec = Security(symbol="CACHE", exchange="NSE")
+        s.add(sec)
+        s.flush()
+        upsert_eod_bars(s, [EODBar(security_id=sec.id, date=d0 + timedelta(days=i), open=1, high=1, low=1, close=float(i)) for i in range(300)])
+        s.commit()
+        sid = sec.id
+
+    with Session(engine) as s, count_statements() as statements:
+        first = price_cache.get_many(s, [sid], 220)[sid]
+        n_first = len(statements)
+        again = price_cache.get_many(s, [sid], 50)[sid]
+    assert n_first == 1 and len(statements) == 1
+    assert len(first) == 220 and first.close[-1] == 299.0 and first.close[0] == 80.0
+    assert len(again) == 50 and again.close[0] == 250.0
+
+    with Session(engine) as s:
+        upsert_eod_bars(s, [EODBar(security_id=sid, date=d0 + timedelta(days=300), open=1, high=1, low=1, close=1000.0)])
+        s.commit()
+        assert price_cache.get_many(s, [sid], 220)[sid].close[-1] == 1000.0
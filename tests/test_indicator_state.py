@@ -0,0 +1,103 @@
+import math
+from datetime import date, timedelta
+
+import numpy as np
+from sqlmodel import Session
+
+from arthasutra.services import indicators as ind
+from arthasutra.services.indicator_state import IncrementalIndicators
+
+
+def _walk(n: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return 100.0 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+
+
+def _close(a, b) -> bool:  # noqa: ANN001
+    return (a is None and (b is None or np.isnan(b))) or (a is not None and math.isclose(a, b, rel_tol=1e-9))
+
+
+def test_incremental_state_matches_vectorized_indicators():
+    close = _walk(650, 11)
+    high, low = close * 1.01, close * 0.985
+    full = ind.compute_indicators(close, high=high, low=low, ema_spans=(20,))
+    d0 = date(2020, 1, 1)
+
+    state = IncrementalIndicators()
+    for t in range(len(close)):
+        if t in (10, 199, 400):
+            # A provisional bar gives what folding it in would
+            peek = state.provisional(close[t], high[t], low[t])
+        state.update(d0 + timedelta(days=t), close[t], high[t], low[t])
+        if t in (10, 199, 400):
+            got = state.values()
+            assert all(_close(v, np.nan if got[k] is None else got[k]) for k, v in peek.items())
+        if t == 300:
+            # Persisted state picks up where it left off
+            state = IncrementalIndicators.from_json(state.to_json())
+        if t in (0, 13, 19, 49, 199, 200, 399, 649):
+            got = state.values()
+            for key in ("sma50", "sma200", "ema20", "atr14"):
+                assert _close(got[key], full[key][0, t]), (t, key, got[key], full[key][0, t])
+
+
+def test_ingest_advances_state_incrementally_and_rebuilds_on_corrections(engine):
+    from arthasutra.db.models import IndicatorState, PriceEOD, Security
+    from arthasutra.services.eod_ingest import EODBar, upsert_eod_bars
+    from arthasutra.services.indicator_state import load_indicator_states
+
+    closes = _walk(260, 5)
+    d0 = date(2022, 1, 3)
+
+    def bar(sid, i, c):  # noqa: ANN001
+        return EODBar(security_id=sid, date=d0 + timedelta(days=i), open=c, high=c * 1.01, low=c * 0.99, close=c)
+
+    with Session(engine) as s:
+        sec = Security(symbol="IST", exchange="NSE")
+        orm = Security(symbol="ISTORM", exchange="NSE")
+        s.add_all([sec, orm])
+        s.flush()
+        upsert_eod_bars(s, [bar(sec.id, i, closes[i]) for i in range(250)])
+        s.commit()
+        row = s.get(IndicatorState, sec.id)
+        assert (row.as_of, row.bars) == (d0 + timedelta(days=249), 250)
+
+        # New bars fold into the stored state
+        for i in range(250, 260):
+            upsert_eod_bars(s, [bar(sec.id, i, closes[i])])
+            s.commit()
+        state = load_indicator_states(s, [sec.id])[sec.id]
+        assert state.bars == 260
+        assert math.isclose(state.values()["sma50"], closes[-50:].mean(), rel_tol=1e-9)
+        assert math.isclose(state.values()["sma200"], closes[-200:].mean(), rel_tol=1e-9)
+
+        # Correcting a bar inside the window rebuilds from PriceEOD
+        upsert_eod_bars(s, [bar(sec.id, 255, 1.0)])
+        s.commit()
+        fixed = closes.copy()
+        fixed[255] = 1.0
+        state = load_indicator_states(s, [sec.id])[sec.id]
+        assert state.bars == 260
+        assert math.isclose(state.values()["sma50"], fixed[-50:].mean(), rel_tol=1e-9)
+
+        # A backfilled gap rebuilds even when conflicting bars are kept
+        gap = Security(symbol="ISTGAP", exchange="NSE")
+        s.add(gap)
+        s.flush()
+        upsert_eod_bars(s, [bar(gap.id, i, closes[i]) for i in range(260) if not 200 <= i < 240])
+        s.commit()
+        upsert_eod_bars(s, [bar(gap.id, i, closes[i]) for i in range(195, 260)], on_conflict="nothing")
+        s.commit()
+        assert s.get(IndicatorState, gap.id).bars == 260
+        state = load_indicator_states(s, [gap.id])[gap.id]
+        assert math.isclose(state.values()["sma50"], closes[-50:].mean(), rel_tol=1e-9)
+
+        # Bars written outside the ingest path are folded on read, without writing
+        for i in range(60):
+            s.add(PriceEOD(security_id=orm.id, date=d0 + timedelta(days=i), open=1, high=1, low=1, close=float(i)))
+        s.commit()
+        states = load_indicator_states(s, [orm.id])
+        assert math.isclose(states[orm.id].values()["sma50"], np.arange(10, 60).mean())
+        assert states[orm.id].values()["sma200"] is None
+        assert not s.new and not s.dirty
+        assert s.get(IndicatorState, orm.id) is None
@@ -0,0 +1,55 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from arthasutra.services import indicators as ind
+
+
+def _walk(n: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return 100.0 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+
+
+def test_sma_matches_python_reference_with_ragged_histories():
+    series = [list(_walk(250, 1)), list(_walk(120, 2)), list(_walk(30, 3)), []]
+    m = ind.close_matrix(series, length=220)
+    got50 = ind.last_values(ind.sma(m, 50))
+    got200 = ind.last_values(ind.sma(m, 200))
+
+    for s, g50, g200 in zip(series, got50, got200):
+        tail = s[-220:]
+        exp50 = sum(tail[-50:]) / 50 if len(tail) >= 50 else None
+        exp200 = sum(tail[-200:]) / 200 if len(tail) >= 200 else None
+        assert (g50 is None) == (exp50 is None) and (g50 is None or math.isclose(g50, exp50, rel_tol=1e-12))
+        assert (g200 is None) == (exp200 is None) and (g200 is None or math.isclose(g200, exp200, rel_tol=1e-12))
+
+
+def test_ema_rsi_atr_and_ranges_match_pandas():
+    close = _walk(300, 7)
+    high = close * 1.01
+    low = close * 0.99
+    out = ind.compute_indicators(close, high=high, low=low, ema_spans=(20,), range_window=20)
+
+    c = pd.Series(close)
+    # EMA seeded with SMA(span): same as pandas ewm(adjust=False) over the seeded series
+    seeded = c.copy()
+    seeded.iloc[:19] = np.nan
+    seeded.iloc[19] = c.iloc[:20].mean()
+    exp_ema = seeded.ewm(span=20, adjust=False).mean()
+    np.testing.assert_allclose(out["ema20"][0, 19:], exp_ema.iloc[19:].to_numpy(), rtol=1e-10)
+    assert np.isnan(out["ema20"][0, :19]).all()
+
+    np.testing.assert_allclose(out["high20"][0, 19:], c.rolling(20).max().iloc[19:] * 1.01, rtol=1e-12)
+    np.testing.assert_allclose(out["low20"][0, 19:], c.rolling(20).min().iloc[19:] * 0.99, rtol=1e-12)
+    np.testing.assert_allclose(out["ret1"][0, 1:], c.pct_change().iloc[1:], rtol=1e-10)
+
+    rsi = out["rsi14"][0]
+    assert np.isnan(rsi[:14]).all() and ((rsi[14:] >= 0) & (rsi[14:] <= 100)).all()
+
+    tr = np.maximum(high[1:] - low[1:], np.maximum(abs(high[1:] - close[:-1]), abs(low[1:] - close[:-1])))
+    tr = np.concatenate([[high[0] - low[0]], tr])
+    exp_atr = tr[:14].mean()
+    for v in tr[14:]:
+        exp_atr += (v - exp_atr) / 14
+    assert math.isclose(out["atr14"][0, -1], exp_atr, rel_tol=1e-10)
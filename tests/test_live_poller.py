@@ -0,0 +1,91 @@
+import datetime as dt
+from zoneinfo import ZoneInfo
+
+from sqlmodel import Session, select
+
+
+IST = ZoneInfo("Asia/Kolkata")
+
+
+class StubLTP:
+    def __init__(self, missing=()):
+        self.missing = set(missing)
+        self.calls = []
+
+    def fetch(self, pairs):
+        self.calls.append(list(pairs))
+        return {p: 100.0 for p in pairs if p[0] not in self.missing}
+
+
+def _setup(engine, n, prefix):
+    from arthasutra.db.models import Holding, Portfolio, Security
+
+    with Session(engine) as s:
+        pf = Portfolio(name="Poller PF")
+        s.add(pf)
+        s.flush()
+        ids = []
+        for i in range(n):
+            sec = Security(symbol=f"{prefix}{i}", exchange="NSE")
+            s.add(sec)
+            s.flush()
+            s.add(Holding(portfolio_id=pf.id, security_id=sec.id, qty_total=1, avg_price=1.0))
+            ids.append(sec.id)
+        s.commit()
+    return ids
+
+
+def test_poller_polls_in_session_then_once_after_close(engine):
+    from arthasutra.db.models import QuoteLive
+    from arthasutra.db.session import session_scope
+    from arthasutra.services.live_poller import LivePoller
+
+    ids = _setup(engine, 5, "POLLA")
+    provider = StubLTP()
+    poller = LivePoller(session_scope, provider=provider, chunk_size=2)
+
+    monday = dt.datetime(2024, 1, 8, tzinfo=IST)
+    assert poller.tick(monday.replace(hour=8)) is None  # before open
+    cycle = poller.tick(monday.replace(hour=10))
+    assert cycle is not None and not cycle.final
+    assert cycle.chunks >= 3 and all(len(c) <= 2 for c in provider.calls)
+    assert cycle.quotes >= 5 and cycle.duration_ms >= 0
+
+    closing = poller.tick(monday.replace(hour=15, minute=35))
+    assert closing is not None and closing.final
+    assert poller.tick(monday.replace(hour=16)) is None
+    assert poller.tick(dt.datetime(2024, 1, 13, 11, tzinfo=IST)) is None  # Saturday
+    assert poller.stats()["cycles"] == 2
+
+    with Session(engine) as s:
+        rows = s.exec(select(QuoteLive).where(QuoteLive.security_id.in_(ids))).all()
+    assert {r.security_id for r in rows} == set(ids)
+
+
+def test_poller_backs_off_tickers_that_return_nothing(engine):
+    from arthasutra.db.session import session_scope
+    from arthasutra.services.live_poller import LivePoller
+
+    _setup(engine, 3, "POLLB")
+    provider = StubLTP(missing={"POLLB1"})
+    poller = LivePoller(session_scope, provider=provider, chunk_size=100, max_backoff_cycles=4)
+
+    def polled_poll1():
+        # Calls made during the latest cycle
+        calls, provider.calls = provider.calls, []
+        return any(p[0] == "POLLB1" for chunk in calls for p in chunk)
+
+    skipped = []
+    for _ in range(8):
+        poller.poll_once()
+        skipped.append(not polled_poll1())
+    # Misses 1, 2, 3 -> skip 1, 2, 4 cycles: polled on cycles 1, 3, 6
+    assert skipped == [False, True, False, True, True, False, True, True]
+    assert poller.stats()["in_backoff"] == 1
+
+    # Successful fetch clears the backoff
+    provider.missing.clear()
+    for _ in range(5):
+        provider.calls = []
+        poller.poll_once()
+    assert polled_poll1() and poller.stats()["in_backoff"] == 0
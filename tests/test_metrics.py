@@ -0,0 +1,68 @@
+import datetime as dt
+
+from sqlmodel import Session
+
+
+def _sample(text: str, name: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(name + " ") or line.startswith(name + "{") and line.rsplit(" ", 1)[0] == name:
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{name} not in metrics")
+
+
+def test_metrics_record_routes_sql_and_jobs(engine):
+    from fastapi.testclient import TestClient
+
+    from arthasutra.api.main import app
+    from arthasutra.db.models import Holding, Portfolio, PriceSnapshot, Security
+    from arthasutra.db.session import session_scope
+    from arthasutra.services import metrics
+    from arthasutra.services.quote_store import QuoteStore
+
+    with Session(engine) as s:
+        pf = Portfolio(name="Metrics PF")
+        s.add(pf)
+        s.flush()
+        for i in range(5):
+            sec = Security(symbol=f"MET{i}", exchange="NSE")
+            s.add(sec)
+            s.flush()
+            s.add(Holding(portfolio_id=pf.id, security_id=sec.id, qty_total=10, avg_price=100.0))
+            s.add(PriceSnapshot(security_id=sec.id, last_close=101.0, last_date=dt.date(2024, 5, 2)))
+        s.commit()
+        pid, sid = pf.id, sec.id
+
+    route = ("GET", "/portfolios/{portfolio_id}/positions")
+    before = (metrics.HTTP_LATENCY.count(route), metrics.HTTP_SQL.count(route), metrics.HTTP_SQL.sum(route))
+    client = TestClient(app)
+    for _ in range(3):
+        assert client.get(f"/portfolios/{pid}/positions").status_code == 200
+    assert client.get("/portfolios/999999/positions").status_code == 404
+    assert client.get("/no/such/path").status_code == 404
+    assert client.get("/portfolios").status_code == 200
+
+    # Requests are labelled by route template, so four calls share one series
+    assert metrics.HTTP_LATENCY.count(route) - before[0] == 4
+    assert metrics.HTTP_SQL.count(route) - before[1] == 4
+    per_request = (metrics.HTTP_SQL.sum(route) - before[2]) / 4
+    assert 1 <= per_request <= 4
+    assert metrics.HTTP_REQUESTS.value((*route, "404")) >= 1
+    assert metrics.HTTP_REQUESTS.value(("GET", "<unmatched>", "404")) >= 1
+    assert metrics.HTTP_REQUESTS.value(("GET", "/portfolios", "200")) >= 1
+
+    # Background writes are attributed to their job
+    store = QuoteStore()
+    store.put(sid, 102.0, dt.datetime.now(dt.UTC))
+    runs = metrics.JOB_DURATION.count(("quote_store_flush",))
+    store.start(session_scope, interval=3600)
+    store.stop()
+    assert metrics.JOB_DURATION.count(("quote_store_flush",)) == runs + 1
+    assert metrics.JOB_SQL.value(("quote_store_flush",)) >= 1
+
+    text = client.get("/metrics").text
+    assert "# TYPE arthasutra_http_request_duration_seconds histogram" in text
+    assert 'arthasutra_http_sql_statements_count{method="GET",route="/portfolios/{portfolio_id}/positions"}' in text
+    assert 'arthasutra_http_request_duration_seconds_bucket{method="GET",route="/portfolios/{portfolio_id}/positions",le="+Inf"}' in text
+    assert 'arthasutra_job_sql_statements_total{job="quote_store_flush"}' in text
+    # /metrics itself is not recorded
+    assert "route=\"/metrics\"" not in text
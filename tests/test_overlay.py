@@ -0,0 +1,140 @@
+import datetime as dt
+
+from sqlmodel import Session
+
+from arthasutra.services.overlay import OverlayEngine, OverlayParams, OverlayState, parse_overlay_config
+
+
+def test_overlay_state_machine_trims_buys_back_and_stops():
+    t0 = dt.datetime(2024, 5, 2, 4, 0, tzinfo=dt.UTC)
+    params = OverlayParams(enabled=True, tp1_percent=8, tp1_trim_pct=20, buyback_percent=-3, buyback_add_pct=20, atr_mult_stop=2.0, atr_mult_tp=None)
+    st = OverlayState(1, 7, units=100, anchor=100.0, params=params, atr=5.0)
+    assert (st.tp_px, st.stop_px) == (108.0, 90.0)
+
+    fired = [(px, st.on_price(px, t0 + dt.timedelta(minutes=i))) for i, px in enumerate([104, 107.9, 108.5, 110, 106, 105.2, 108, 109, 91, 89.5, 80])]
+    hits = [(px, h[0], h[1]) for px, h in fired if h is not None]
+    # Trim at +8%, buy back 3% under the trim, re-trim only above the last trim, then the ATR stop
+    assert hits == [
+        (108.5, "TRIM", 20.0), (105.2, "BUYBACK", 20.0), (109, "TRIM", 20.0), (91, "BUYBACK", 20.0), (89.5, "STOP", 100.0),
+    ]
+    assert st.phase == "stopped"
+
+    # Net-units stabilizer: at most 30 units net short within the window
+    capped = OverlayState(1, 8, units=100, anchor=100.0, params=OverlayParams(enabled=True, tp1_trim_pct=20, buyback_add_pct=5, net_units_target=30, atr_mult_stop=None))
+    kinds = [h[0] for px in [109, 105, 112, 108, 120] if (h := capped.on_price(px, t0)) is not None]
+    assert kinds == ["TRIM", "BUYBACK"]
+    assert capped.net_units == -15.0
+
+    cfg = parse_overlay_config("overlay:\n  enabled: true\n  anchor: {type: manual, value: 2700, values: {'nse:bse': 2650}}\n  tp1_percent: 6\n  restoration: flexible\n")
+    assert cfg.tp1_percent == 6 and cfg.anchor_for("NSE:BSE", 2500, 2800) == 2650 and cfg.anchor_for("NSE:X", 1, 1) == 2700
+    assert parse_overlay_config("overlay:\n  enabled: false\n") is None
+
+
+def test_overlay_engine_runs_off_quote_store_without_sql_and_checkpoints(engine):
+    from arthasutra.bench import count_statements
+    from arthasutra.db.models import ConfigText, Holding, OverlayCheckpoint, Portfolio, PriceSnapshot, Security
+    from arthasutra.db.session import session_scope
+    from arthasutra.services.quote_store import LiveQuote, QuoteStore
+
+    with Session(engine) as s:
+        pf = Portfolio(name="Overlay PF")
+        off = Portfolio(name="No overlay")
+        s.add_all([pf, off])
+        s.flush()
+        s.add(ConfigText(portfolio_id=pf.id, yaml_text="overlay:\n  enabled: true\n  anchor: {type: avg_price}\n"))
+        s.add(ConfigText(portfolio_id=off.id, yaml_text="overlay:\n  enabled: false\n"))
+        secs = [Security(symbol=f"OVL{i}", exchange="NSE") for i in range(3)]
+        s.add_all(secs)
+        s.flush()
+        for i, sec in enumerate(secs):
+            s.add(Holding(portfolio_id=pf.id, security_id=sec.id, qty_total=50, avg_price=100.0 + i))
+            s.add(Holding(portfolio_id=off.id, security_id=sec.id, qty_total=10, avg_price=100.0))
+            s.add(PriceSnapshot(security_id=sec.id, last_close=100.0, last_date=dt.date(2024, 5, 1)))
+        s.commit()
+        pid, ids = pf.id, [sec.id for sec in secs]
+
+    overlay = OverlayEngine()
+    with session_scope() as s:
+        assert overlay.reload(s) == 3
+    overlay.start(session_scope, interval=3600)
+    store = QuoteStore()
+    store.add_listener(overlay.on_quotes)
+
+    t0 = dt.datetime.now(dt.UTC)
+    with count_statements() as statements:
+        for k in range(2000):
+            px = 100.0 + (k % 50) * 0.1
+            store.put_many({sid: (px, t0 + dt.timedelta(milliseconds=k)) for sid in ids}, persist=False)
+        store.put(ids[0], 108.5, t0 + dt.timedelta(seconds=5), persist=False)
+    assert statements == []
+    assert overlay.ticks == 6001
+
+    events = overlay.events(pid)
+    assert [(e.security_id, e.kind, e.qty) for e in events] == [(ids[0], "TRIM", 10.0)]
+    assert overlay.events(pid, after_seq=events[-1].seq) == []
+
+    overlay.stop()
+    assert overlay.checkpoints == 1
+    with Session(engine) as s:
+        assert s.get(OverlayCheckpoint, (pid, ids[0])) is not None
+
+    # A fresh engine resumes from the checkpoint
+    resumed = OverlayEngine()
+    with session_scope() as s:
+        resumed.reload(s)
+    by_sid = {row["security_id"]: row for row in resumed.states(pid)}
+    assert by_sid[ids[0]]["phase"] == "trimmed" and by_sid[ids[1]]["phase"] == "armed"
+    assert resumed.on_quotes([LiveQuote(ids[0], 105.0, t0, "kite", 0)]) == 1
+
+    # Deleting the portfolio drops its checkpoints and the live engine's states
+    from fastapi.testclient import TestClient
+
+    from arthasutra.api.main import app
+    from arthasutra.services.overlay import overlay_engine
+
+    with session_scope() as s:
+        assert overlay_engine.reload(s) >= 3
+    try:
+        assert TestClient(app).delete(f"/portfolios/{pid}").status_code == 200
+        assert overlay_engine.states(pid) == []
+        with Session(engine) as s:
+            assert s.get(OverlayCheckpoint, (pid, ids[0])) is None
+    finally:
+        overlay_engine.load([])
+
+
+def test_positions_import_reloads_the_portfolios_overlay_states(engine):
+    from fastapi.testclient import TestClient
+
+    from arthasutra.api.main import app
+    from arthasutra.db.models import ConfigText
+    from arthasutra.services.overlay import overlay_engine
+    from arthasutra.services.quote_store import LiveQuote
+
+    client = TestClient(app)
+    pid = client.post("/portfolios", json={"name": "Overlay import PF"}).json()["id"]
+    with Session(engine) as s:
+        s.add(ConfigText(portfolio_id=pid, yaml_text="overlay:\n  enabled: true\n  anchor: {type: avg_price}\n  atr_mult_stop: null\n"))
+        s.commit()
+
+    def upload(text):
+        files = {"file": ("pos.csv", text.encode(), "text/csv")}
+        assert client.post(f"/portfolios/{pid}/import-csv", files=files).status_code == 200
+        return {row["symbol"]: row for row in overlay_engine.states(pid)}
+
+    try:
+        states = upload("symbol,exchange,qty,avg_price\nOVIMP,NSE,50,100\n")
+        assert states["NSE:OVIMP"]["units"] == 50 and states["NSE:OVIMP"]["anchor"] == 100
+        sid = states["NSE:OVIMP"]["security_id"]
+        t0 = dt.datetime.now(dt.UTC)
+        assert overlay_engine.on_quotes([LiveQuote(sid, 108.5, t0, "kite", 0)]) == 1
+        assert overlay_engine.events(pid)[-1].qty == 10.0
+
+        # New quantities and anchors apply at once; the trimmed phase carries over
+        states = upload("symbol,exchange,qty,avg_price\nOVIMP,NSE,100,110\n")
+        assert states["NSE:OVIMP"]["units"] == 100 and states["NSE:OVIMP"]["anchor"] == 110
+        assert states["NSE:OVIMP"]["phase"] == "trimmed"
+        assert overlay_engine.on_quotes([LiveQuote(sid, 105.0, t0, "kite", 0)]) == 1
+        assert [(e.kind, e.qty) for e in overlay_engine.events(pid)] == [("TRIM", 10.0), ("BUYBACK", 20.0)]
+    finally:
+        overlay_engine.load([])
@@ -0,0 +1,52 @@
+from datetime import date, timedelta
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+
+def test_stream_sends_snapshot_then_coalesced_deltas(engine):
+    from arthasutra.api.main import app
+    from arthasutra.db.models import Holding, Portfolio, Security
+    from arthasutra.services.eod_ingest import EODBar, upsert_eod_bars
+    from arthasutra.services.portfolio_stream import stream_hub
+    from arthasutra.services.quote_store import quote_store
+
+    with Session(engine) as s:
+        pf = Portfolio(name="Stream PF")
+        a, b = Security(symbol="STRA", exchange="NSE"), Security(symbol="STRB", exchange="NSE")
+        s.add_all([pf, a, b])
+        s.flush()
+        s.add(Holding(portfolio_id=pf.id, security_id=a.id, qty_total=10, avg_price=100.0))
+        s.add(Holding(portfolio_id=pf.id, security_id=b.id, qty_total=5, avg_price=50.0))
+        d = date(2024, 1, 1)
+        upsert_eod_bars(s, [EODBar(a.id, d, 1, 1, 1, 100.0), EODBar(a.id, d + timedelta(days=1), 1, 1, 1, 110.0)])
+        upsert_eod_bars(s, [EODBar(b.id, d + timedelta(days=1), 1, 1, 1, 60.0)])
+        s.commit()
+        pid, a_id, b_id = pf.id, a.id, b.id
+
+    stream_hub.poll_interval = 0.01
+    client = TestClient(app)
+    with client.websocket_connect(f"/portfolios/{pid}/stream?min_interval_ms=0") as ws:
+        snap = ws.receive_json()
+        assert snap["type"] == "snapshot"
+        rows = {r["security_id"]: r for r in snap["positions"]}
+        assert rows[a_id]["last_price"] == 110.0 and rows[a_id]["pnl_inr"] == 100.0
+        assert snap["equity_value"] == 10 * 110.0 + 5 * 60.0
+
+        # Two updates for the same security collapse; the other security is untouched
+        quote_store.put(a_id, 120.0, source="kite", persist=False)
+        quote_store.put(a_id, 121.0, source="kite", persist=False)
+        delta = ws.receive_json()
+        assert delta["type"] == "delta"
+        assert [r["security_id"] for r in delta["positions"]] == [a_id]
+        assert delta["positions"][0]["last_price"] == 121.0
+        assert delta["positions"][0]["pnl_inr"] == 210.0
+        assert delta["totals"]["equity_value"] == 10 * 121.0 + 5 * 60.0
+        assert stream_hub.stats() == {"portfolios": 1, "clients": 1}
+
+
+def test_stream_unknown_portfolio_is_404():
+    from arthasutra.api.main import app
+
+    client = TestClient(app)
+    assert client.get("/portfolios/999999/stream").status_code == 404
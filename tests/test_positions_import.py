@@ -0,0 +1,75 @@
+import time
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, func, select
+
+
+def _lots(pid):
+    from arthasutra.db.models import Holding, Lot
+    from arthasutra.db.session import engine
+
+    with Session(engine) as s:
+        return s.exec(
+            select(Lot.qty).join(Holding, Holding.id == Lot.holding_id).where(Holding.portfolio_id == pid).order_by(Lot.qty)
+        ).all()
+
+
+def test_reimport_is_a_noop_and_changes_replace_lots():
+    from arthasutra.api.main import app
+
+    client = TestClient(app)
+    pid = client.post("/portfolios", json={"name": "Diff PF"}).json()["id"]
+
+    def upload(text, **params):
+        files = {"file": ("pos.csv", text.encode(), "text/csv")}
+        return client.post(f"/portfolios/{pid}/import-csv", files=files, params=params).json()
+
+    csv1 = "Instrument,Exchange,Qty.,Avg. cost\nPIA,NSE,10,100\nPIB,NSE,5,200\nPIC,BSE,1,50\n"
+    first = upload(csv1)
+    assert first["rows"] == 3 and first["holdings_created"] == 3 and first["lots_created"] == 3
+    assert _lots(pid) == [1.0, 5.0, 10.0]
+
+    again = upload(csv1)
+    assert again["holdings_unchanged"] == 3
+    assert again["lots_created"] == again["lots_removed"] == again["holdings_created"] == 0
+    assert _lots(pid) == [1.0, 5.0, 10.0]
+
+    # PIA changes, PIC disappears (kept without prune), PID is new
+    csv2 = "symbol,exchange,qty,avg_price\nPIA,NSE,12,105\nPIB,NSE,5,200\nPID,NSE,7,70\n"
+    changed = upload(csv2)
+    assert changed["holdings_updated"] == 1 and changed["holdings_created"] == 1
+    assert changed["lots_removed"] == 1 and changed["lots_created"] == 2
+    assert _lots(pid) == [1.0, 5.0, 7.0, 12.0]
+
+    pruned = upload(csv2, prune="true")
+    assert pruned["holdings_removed"] == 1 and pruned["lots_removed"] == 1
+    assert _lots(pid) == [5.0, 7.0, 12.0]
+    rows = client.get(f"/portfolios/{pid}/positions").json()
+    assert sorted(r["symbol"] for r in rows) == ["PIA", "PIB", "PID"]
+
+
+def test_large_positions_import_uses_bulk_statements(engine):
+    from arthasutra.bench import count_statements
+    from arthasutra.db.models import Holding, Portfolio
+    from arthasutra.services.csv_importer import CSVRow
+    from arthasutra.services.positions_import import import_positions
+
+    n = 3000
+    rows = [CSVRow(symbol=f"PIBULK{i}", exchange="NSE", qty=i + 1, avg_price=10.0, ltp=11.0) for i in range(n)]
+    with Session(engine) as s:
+        pf = Portfolio(name="Bulk PF")
+        s.add(pf)
+        s.commit()
+        with count_statements() as statements:
+            t0 = time.perf_counter()
+            res = import_positions(s, pf.id, rows)
+            s.commit()
+            elapsed = time.perf_counter() - t0
+        assert res.holdings_created == n and res.lots_created == n and res.securities_created == n
+        assert s.exec(select(func.count()).select_from(Holding).where(Holding.portfolio_id == pf.id)).one() == n
+        # Statement count is independent of row count (chunked IN lookups + batched writes)
+        assert len(statements) < 100
+        assert elapsed < 10
+
+        again = import_positions(s, pf.id, rows)
+        assert again.holdings_unchanged == n and again.lots_created == 0
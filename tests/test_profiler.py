@@ -0,0 +1,84 @@
+import datetime as dt
+import re
+import tempfile
+from pathlib import Path
+
+import pytest
+from sqlmodel import Session
+
+
+def test_flagged_request_is_profiled_and_replayable_from_cli(engine, capsys):
+    from fastapi.testclient import TestClient
+
+    from arthasutra import cli
+    from arthasutra.api.main import app
+    from arthasutra.db.models import Holding, Portfolio, PriceSnapshot, Security
+    from arthasutra.services.profiler import normalize_sql, profiler
+
+    with Session(engine) as s:
+        pf = Portfolio(name="Profiled PF")
+        s.add(pf)
+        s.flush()
+        for i in range(30):
+            sec = Security(symbol=f"PRF{i}", exchange="NSE")
+            s.add(sec)
+            s.flush()
+            s.add(Holding(portfolio_id=pf.id, security_id=sec.id, qty_total=10, avg_price=100.0))
+            s.add(PriceSnapshot(security_id=sec.id, last_close=101.0, last_date=dt.date(2024, 5, 2)))
+        s.commit()
+        pid = pf.id
+
+    saved = dict(vars(profiler))
+    profiler.enabled, profiler.interval = True, 0.0005
+    profiler.directory = Path(tempfile.mkdtemp())
+    profiler.admin_token = None
+    client = TestClient(app)
+    try:
+        # Without ADMIN_TOKEN, the flag is ignored and /admin stays closed
+        assert "x-profile-id" not in client.get(f"/portfolios/{pid}/positions", params={"profile": "1"}).headers
+        assert client.get("/admin/profiles").status_code == 403
+
+        profiler.admin_token = "s3cret"
+        client.headers["x-admin-token"] = "s3cret"
+        assert "x-profile-id" not in client.get(f"/portfolios/{pid}/positions").headers
+        resp = client.get(f"/portfolios/{pid}/positions", params={"profile": "1", "limit": "5"})
+        assert resp.status_code == 200
+        prof_id = resp.headers["x-profile-id"]
+
+        listed = client.get("/admin/profiles").json()
+        assert [p["id"] for p in listed] == [prof_id]
+        data = client.get(f"/admin/profiles/{prof_id}").json()
+        assert data["request"] == {"method": "GET", "path": f"/portfolios/{pid}/positions", "query": "limit=5"}
+        assert data["status"] == 200 and data["duration_ms"] > 0
+        assert data["sql_statements"] >= 1 and data["top_sql"][0]["statement"].startswith("SELECT")
+        folded = client.get(f"/admin/profiles/{prof_id}/folded").text
+        assert sum(int(line.rsplit(" ", 1)[1]) for line in folded.splitlines()) == data["samples"]
+        assert all(re.match(r"^(event-loop|threadpool);.+ \d+$", line) for line in folded.splitlines())
+        assert client.get("/admin/profiles/..%2Fetc").status_code == 404
+        assert normalize_sql("SELECT a FROM t\n WHERE id IN (?, ?, ?)") == "SELECT a FROM t WHERE id IN (...)"
+
+        # A wrong or missing token is refused
+        del client.headers["x-admin-token"]
+        assert "x-profile-id" not in client.get(f"/portfolios/{pid}/positions", headers={"x-profile": "1"}).headers
+        assert client.get("/admin/profiles").status_code == 403
+        assert client.get("/admin/profiles", headers={"x-admin-token": "wrong"}).status_code == 403
+        assert client.get("/admin/profiles", headers={"x-admin-token": "s3cret"}).status_code == 200
+
+        # The recorded request replays from the CLI into a new profile, even without ADMIN_TOKEN
+        profiler.admin_token = None
+        cli.main(["profile", "--from", prof_id, "--dir", str(profiler.directory)])
+        out = capsys.readouterr().out
+        assert f"GET /portfolios/{pid}/positions?limit=5 -> 200" in out
+        assert len(profiler.list()) == 2
+
+        # A request that saved no profile is reported, not a traceback
+        saved_dir, profiler.directory = profiler.directory, Path(tempfile.mkstemp()[1])
+        with pytest.raises(SystemExit, match="no profile was saved"):
+            cli.main(["profile", f"/portfolios/{pid}/positions"])
+        profiler.directory = saved_dir
+
+        profiler.enabled = False
+        assert "x-profile-id" not in client.get(f"/portfolios/{pid}/positions", headers={"x-profile": "1"}).headers
+        assert client.get("/admin/profiles").status_code == 404
+    finally:
+        vars(profiler).update(saved)
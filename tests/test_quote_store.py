@@ -0,0 +1,78 @@
+import datetime as dt
+
+from sqlmodel import Session, select
+
+
+def test_quote_store_warms_serves_reads_and_writes_behind(engine):
+    from arthasutra.bench import count_statements
+    from arthasutra.db.models import QuoteLive, Security
+    from arthasutra.db.session import session_scope
+    from arthasutra.services.quote_store import QuoteStore
+
+    with Session(engine) as s:
+        a, b = Security(symbol="QSA", exchange="NSE"), Security(symbol="QSB", exchange="NSE")
+        s.add_all([a, b])
+        s.flush()
+        s.add(QuoteLive(security_id=a.id, ltp=100.0, source="yf"))
+        s.commit()
+        a_id, b_id = a.id, b.id
+
+    store = QuoteStore()
+    with Session(engine) as s:
+        store.ensure_warm(s)
+        store.ensure_warm(s)  # second call is a no-op
+    assert store.warmed and store.get(a_id).ltp == 100.0
+
+    with count_statements() as statements:
+        first = store.put(b_id, 50.0, source="kite")
+        second = store.put(b_id, 51.0, source="kite")
+        # Out-of-order writes never replace a newer quote
+        assert store.put(b_id, 1.0, ts=first.ts - dt.timedelta(seconds=5)) is None
+        assert second.seq > first.seq and store.seq == second.seq
+        assert {sid: q.ltp for sid, q in store.get_many([a_id, b_id, 999]).items()} == {a_id: 100.0, b_id: 51.0}
+    assert statements == []
+
+    store.start(session_scope, interval=60)
+    try:
+        assert store.stats()["dirty"] == 1
+        assert store.flush() == 1
+        assert store.flush() == 0
+    finally:
+        store.stop()
+    with Session(engine) as s:
+        row = s.exec(select(QuoteLive).where(QuoteLive.security_id == b_id)).one()
+    assert (row.ltp, row.source) == (51.0, "kite")
+
+
+def test_orm_writes_and_upsert_ltp_keep_global_store_coherent(engine, monkeypatch):
+    from arthasutra.db.models import QuoteLive, Security
+    from arthasutra.services.live import get_fresh_ltp, upsert_ltp, upsert_ltps
+    from arthasutra.services.quote_store import quote_store
+
+    with Session(engine) as s:
+        sec = Security(symbol="QSC", exchange="NSE")
+        s.add(sec)
+        s.flush()
+        s.add(QuoteLive(security_id=sec.id, ltp=10.0))
+        s.commit()
+        assert quote_store.get(sec.id).ltp == 10.0
+
+        # Without a write-behind thread the quote is upserted on the caller's session
+        upsert_ltp(s, sec.id, 12.5, source="kite")
+        s.commit()
+        assert get_fresh_ltp(s, sec.id) == 12.5
+        row = s.exec(select(QuoteLive).where(QuoteLive.security_id == sec.id)).one()
+        s.refresh(row)
+        assert row.ltp == 12.5
+
+        # Dialects without ON CONFLICT update or insert rows without re-entering upsert_ltp
+        other = Security(symbol="QSC2", exchange="NSE")
+        s.add(other)
+        s.flush()
+        ts = dt.datetime.now(dt.UTC)
+        monkeypatch.setattr(engine.dialect, "name", "generic")
+        assert upsert_ltps(s, {sec.id: (13.0, ts), other.id: (7.0, ts)}, source="kite") == 2
+        monkeypatch.undo()
+        s.commit()
+        rows = s.exec(select(QuoteLive.security_id, QuoteLive.ltp).where(QuoteLive.security_id.in_([sec.id, other.id]))).all()
+        assert sorted(rows) == sorted([(sec.id, 13.0), (other.id, 7.0)])
@@ -0,0 +1,62 @@
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import event, text
+from sqlmodel import SQLModel, Session, select
+
+
+def test_production_profile_tunes_sqlite_and_routes_reads_to_their_own_pool():
+    from arthasutra.db.models import Portfolio
+    from arthasutra.db.session import ReadSession, create_engines, storage_profile
+
+    with pytest.raises(ValueError):
+        storage_profile("turbo")
+    os.environ["SQLITE_PRAGMAS"] = "mmap_size=0"
+    try:
+        prod = storage_profile("production")
+    finally:
+        del os.environ["SQLITE_PRAGMAS"]
+    assert prod.pragmas["journal_mode"] == "WAL" and prod.pragmas["mmap_size"] == "0" and prod.read_pool_size > 0
+
+    tmpdb = tempfile.NamedTemporaryFile(delete=False, suffix=".db")
+    tmpdb.close()
+    url = f"sqlite:///{tmpdb.name}"
+    write, read = create_engines(url, prod)
+    assert read is not write
+    w, r = create_engines(url, storage_profile("default"))
+    assert w is r
+    w, r = create_engines("sqlite://", prod)
+    assert w is r  # in-memory: readers must share the one database
+
+    SQLModel.metadata.create_all(write)
+    with write.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    with read.connect() as conn:
+        assert conn.execute(text("PRAGMA query_only")).scalar() == 1
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == prod.pragmas["cache_size"]
+
+    reads = []
+    event.listen(read, "before_cursor_execute", lambda *a: reads.append(a[2]))
+    with Session(write) as s:
+        s.add(Portfolio(name="Committed"))
+        s.commit()
+
+    # An open ingest transaction does not hold up readers, who see the last commit
+    with Session(write) as writer:
+        writer.add(Portfolio(name="Uncommitted"))
+        writer.flush()
+        with ReadSession(write, read) as rs:
+            assert [p.name for p in rs.exec(select(Portfolio)).all()] == ["Committed"]
+        writer.commit()
+    assert reads
+
+    # A read session that writes sends the flush to the write engine, then reads its own write
+    with ReadSession(write, read) as rs:
+        rs.add(Portfolio(name="Lazy"))
+        rs.commit()
+        n = len(reads)
+        assert "Lazy" in [p.name for p in rs.exec(select(Portfolio)).all()]
+        assert len(reads) == n
@@ -0,0 +1,47 @@
+import datetime as dt
+import math
+
+import pytest
+from sqlmodel import Session, func, select
+
+
+def test_seed_is_reproducible_and_derived_tables_are_current(engine):
+    from arthasutra.db.models import Holding, IndicatorState, Lot, PriceEOD, PriceSnapshot, QuoteLive
+    from arthasutra.services.indicator_state import load_indicator_states, rebuild_states
+    from arthasutra.services.synthetic import SeedSpec, seed_database
+
+    spec = SeedSpec(securities=12, years=1, portfolios=2, holdings=5, quotes=True, seed=9, end=dt.date(2024, 6, 28), prefix="SYNA")
+    with Session(engine) as s:
+        rep = seed_database(s, spec)
+        assert (rep.securities, rep.bars, rep.portfolios, rep.holdings, rep.quotes) == (12, 12 * 252, 2, 10, 12)
+        twin = seed_database(s, SeedSpec(**{**spec.__dict__, "prefix": "SYNB"}))
+        with pytest.raises(ValueError):
+            seed_database(s, spec)
+
+        def closes(sid):  # noqa: ANN001, ANN202
+            return s.exec(select(PriceEOD.date, PriceEOD.close).where(PriceEOD.security_id == sid).order_by(PriceEOD.date)).all()
+
+        # Same spec, same data; bars end on the last weekday on or before ``end``
+        a, b = closes(rep.security_ids[3]), closes(twin.security_ids[3])
+        assert a == b and len(a) == 252 and a[-1][0] == dt.date(2024, 6, 28)
+        assert all(d.weekday() < 5 for d, _ in a)
+        bars = s.exec(select(PriceEOD).where(PriceEOD.security_id == rep.security_ids[0])).all()
+        assert all(bar.low <= min(bar.open, bar.close) and bar.high >= max(bar.open, bar.close) for bar in bars)
+
+        # Holdings match their lots
+        for h in s.exec(select(Holding).where(Holding.portfolio_id.in_(rep.portfolio_ids))).all():
+            lots = s.exec(select(Lot).where(Lot.holding_id == h.id)).all()
+            assert 1 <= len(lots) <= spec.max_lots and sum(lot.qty for lot in lots) == h.qty_total
+            assert math.isclose(sum(lot.qty * lot.price for lot in lots) / h.qty_total, h.avg_price, abs_tol=1e-4)
+
+        # Snapshots and indicator states are written current, matching a rebuild from priceeod
+        sid = rep.security_ids[5]
+        snap = s.get(PriceSnapshot, sid)
+        assert snap.last_date == a[-1][0] and snap.prev_date == a[-2][0]
+        stored = load_indicator_states(s, [sid])[sid].values()
+        assert not s.new and not s.dirty  # nothing was stale
+        rebuilt = rebuild_states(s, [sid], rows={})[sid].values()
+        assert all(math.isclose(stored[k], rebuilt[k], rel_tol=1e-9) for k in ("sma50", "sma200", "ema20", "atr14"))
+        s.rollback()
+        assert s.exec(select(func.count()).select_from(IndicatorState).where(IndicatorState.security_id.in_(rep.security_ids))).one() == 12
+        assert s.exec(select(func.count()).select_from(QuoteLive).where(QuoteLive.security_id.in_(rep.security_ids))).one() == 12
@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+
+from sqlmodel import Session, select
+
+
+def test_tick_pipeline_coalesces_and_flushes_batches(engine):
+    from arthasutra.db.models import QuoteLive, Security
+    from arthasutra.db.session import session_scope
+    from arthasutra.services.quote_store import QuoteStore
+    from arthasutra.services.tick_pipeline import TickPipeline
+
+    with Session(engine) as s:
+        secs = [Security(symbol=f"TICK{i}", exchange="NSE", kite_token=1000 + i) for i in range(3)]
+        s.add_all(secs)
+        s.commit()
+        ids = [sec.id for sec in secs]
+        s.add(QuoteLive(security_id=ids[0], ltp=1.0))
+        s.commit()
+
+    flushed = []
+    store = QuoteStore()
+    pipe = TickPipeline(session_scope, max_pending=2, on_flush=flushed.append, store=store)
+    with Session(engine) as s:
+        assert pipe.refresh_token_map(s) == {1000: ids[0], 1001: ids[1], 1002: ids[2]}
+
+    # Several ticks per instrument collapse to the last one; unknown tokens are ignored
+    pipe.offer([{"instrument_token": 1000, "last_price": 10.0}, {"instrument_token": 1001, "last_price": 20.0}])
+    pipe.offer([{"instrument_token": 1000, "last_price": 11.0}, {"instrument_token": 9999, "last_price": 5.0}])
+    # Buffer is full (2 securities); a third security is dropped, existing ones still update
+    pipe.offer([{"instrument_token": 1002, "last_price": 30.0}, {"instrument_token": 1001, "last_price": 21.0}])
+    assert pipe.pending_count() == 2
+    # Readers see what will be persisted, not the dropped tick
+    assert {sid: q.ltp for sid, q in store.get_many(ids).items()} == {ids[0]: 11.0, ids[1]: 21.0}
+    assert pipe.flush() == 2
+    assert pipe.flush() == 0
+    assert {sid: q[0] for sid, q in flushed[0].items()} == {ids[0]: 11.0, ids[1]: 21.0}
+    st = pipe.stats()
+    assert (st["ticks_in"], st["unmapped"], st["dropped"], st["flushes"]) == (6, 1, 1, 1)
+
+    with Session(engine) as s:
+        rows = {q.security_id: q for q in s.exec(select(QuoteLive).where(QuoteLive.security_id.in_(ids))).all()}
+    assert {sid: q.ltp for sid, q in rows.items()} == {ids[0]: 11.0, ids[1]: 21.0}
+    assert rows[ids[0]].source == "kite"
+
+
+def test_tick_pipeline_keeps_batch_when_flush_fails():
+    from arthasutra.services.tick_pipeline import TickPipeline
+
+    @contextmanager
+    def broken():
+        raise RuntimeError("db down")
+        yield
+
+    pipe = TickPipeline(broken)
+    pipe.set_token_map({1: 7})
+    pipe.offer([{"instrument_token": 1, "last_price": 5.0}])
+    assert pipe.flush() == 0
+    assert pipe.pending_count() == 1 and pipe.stats()["errors"] == 1
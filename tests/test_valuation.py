@@ -0,0 +1,109 @@
+from datetime import date, timedelta
+
+from sqlmodel import Session, select
+
+
+def test_value_portfolio_matches_per_holding_stats_in_constant_queries(engine):
+    from arthasutra.bench import count_statements
+    from arthasutra.db.models import Portfolio, Security, Holding, PriceEOD, QuoteLive
+    from arthasutra.services.analytics import compute_position_stats, value_portfolio
+
+    with Session(engine) as s:
+        pf = Portfolio(name="Valuation PF")
+        s.add(pf)
+        s.flush()
+        for i in range(12):
+            sec = Security(symbol=f"VAL{i}", exchange="NSE")
+            s.add(sec)
+            s.flush()
+            s.add(Holding(portfolio_id=pf.id, security_id=sec.id, qty_total=10 + i, avg_price=100.0))
+            # Mix of: no prices, one close, several closes, and a quotes_live snapshot
+            for d in range(i % 4):
+                s.add(PriceEOD(security_id=sec.id, date=date.today() - timedelta(days=d), open=1, high=1, low=1, close=100.0 + i + d))
+            if i % 3 == 0:
+                s.add(QuoteLive(security_id=sec.id, ltp=120.0 + i))
+        s.commit()
+        pid = pf.id
+
+    with Session(engine) as s:
+        holdings = s.exec(select(Holding).where(Holding.portfolio_id == pid).order_by(Holding.id)).all()
+        expected = [compute_position_stats(s, h) for h in holdings]
+
+        with count_statements() as statements:
+            valuation = value_portfolio(s, pid)
+
+    assert valuation.positions == expected
+    assert valuation.equity_value == sum(p.qty * p.last_price for p in expected)
+    assert valuation.pnl_inr == sum(p.pnl_inr for p in expected)
+    assert len(statements) <= 3
+
+
+def test_dashboard_loads_portfolio_data_once(engine):
+    from fastapi.testclient import TestClient
+
+    from arthasutra.api.main import app
+    from arthasutra.bench import count_statements
+    from arthasutra.db.models import Portfolio, Security, Holding, PriceEOD
+    from arthasutra.services.indicator_state import rebuild_states
+    from arthasutra.services.price_snapshot import refresh_snapshots
+
+    with Session(engine) as s:
+        pf = Portfolio(name="Context PF")
+        s.add(pf)
+        s.flush()
+        for i in range(8):
+            sec = Security(symbol=f"CTX{i}", exchange="NSE")
+            s.add(sec)
+            s.flush()
+            s.add(Holding(portfolio_id=pf.id, security_id=sec.id, qty_total=5, avg_price=100.0))
+            for d in range(60):
+                s.add(PriceEOD(security_id=sec.id, date=date.today() - timedelta(days=d), open=1, high=1, low=1, close=100.0 + d))
+        s.commit()
+        pid = pf.id
+        # Snapshots and indicator states as the ingest paths leave them
+        ids = list(s.exec(select(Holding.security_id).where(Holding.portfolio_id == pid)).all())
+        refresh_snapshots(s, ids)
+        rebuild_states(s, ids)
+        s.commit()
+
+    client = TestClient(app)
+    # Counted on every engine the route may use (read pool, async engines)
+    with count_statements() as statements:
+        resp = client.get(f"/portfolios/{pid}/dashboard")
+
+    assert resp.status_code == 200
+    body = resp.json()
+    assert len(body["positions"]) == 8
+    assert len(body["actions"]) == 8
+    # portfolio lookup + holdings/securities/snapshots + indicator states
+    assert 1 <= len(statements) <= 4
+
+
+def test_price_snapshot_tracks_ingest_and_rebuild(engine):
+    from arthasutra.db.models import Security, PriceEOD, PriceSnapshot
+    from arthasutra.services.price_snapshot import apply_bars, rebuild_snapshots
+
+    d0 = date(2024, 1, 1)
+    with Session(engine) as s:
+        sec = Security(symbol="SNAP", exchange="NSE")
+        s.add(sec)
+        s.flush()
+        # History that predates the snapshot table
+        for i in range(5):
+            s.add(PriceEOD(security_id=sec.id, date=d0 + timedelta(days=i), open=1, high=1, low=1, close=10.0 + i))
+        s.flush()
+        apply_bars(s, {sec.id: [(d0 + timedelta(days=4), 14.0)]})
+        s.commit()
+        snap = s.get(PriceSnapshot, sec.id)
+        assert (snap.last_close, snap.prev_close) == (14.0, 13.0)
+
+        # Incremental merge: a newer bar rolls last -> prev without reading PriceEOD
+        s.add(PriceEOD(security_id=sec.id, date=d0 + timedelta(days=5), open=1, high=1, low=1, close=20.0))
+        apply_bars(s, {sec.id: [(d0 + timedelta(days=5), 20.0)]})
+        s.commit()
+        snap = s.get(PriceSnapshot, sec.id)
+        assert (snap.last_date, snap.last_close, snap.prev_close) == (d0 + timedelta(days=5), 20.0, 14.0)
+
+        rebuild_snapshots(s)
+        snap = s.get(PriceSnapshot, sec.id)
+        assert (snap.last_close, snap.prev_close, snap.prev_date) == (20.0, 14.0, d0 + timedelta(days=4))